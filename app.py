@@ -3,7 +3,7 @@
 集成DeepSeek大模型的智能投资策略分析系统
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import akshare as ak
 import pandas as pd
@@ -12,80 +12,53 @@ from datetime import datetime, timedelta
 import json
 import os
 from dotenv import load_dotenv
-from deepseek_ai_strategy import integrate_deepseek_strategy
 
-# 加载环境变量
+# 加载环境变量：必须在导入项目模块之前执行（各模块在导入时读取配置）
 load_dotenv()
 
+from deepseek_ai_strategy import integrate_deepseek_strategy
+from market_data import market_indices_snapshot, upstream_flight
+from market_data_cache import price_cache
+from quote_snapshot import get_latest_quotes, iter_latest_quotes, quote_snapshot
+from stock_pools import INSTITUTIONAL_POOLS, POOLS_UNIVERSE, STYLE_POOLS, get_universe, resolve_universe
+from cache_warmer import cache_warmer, start_cache_warmer
+from circuit_breaker import upstream_guard
+from price_panel import HISTORY_MAX_POINTS, HISTORY_RESOLUTIONS, allocation_weights, chart_history, parse_history_period
+from synthetic_market import get_mock_market
+from backtest import DEFAULT_FREQUENCY, DEFAULT_MODE, run_backtest
+from risk_engine import attach_risk_metrics
+from covariance_service import covariance_service
+from portfolio_optimizer import portfolio_optimizer
+from monte_carlo import attach_expected_metrics
+from factor_engine import attach_factor_exposures, factor_exposure_snapshot
+from screening import INDEX_SCREEN_LIMIT, factor_table_snapshot, screen_universe
+from latency_budget import LatencyBudget
+from strategy_snapshots import REFERENCE_PREFERENCES, StrategySnapshots, needs_resimulation
+
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
+def get_market_indices_internal():
+    """获取美股市场指数数据（读取共享快照，过期时后台刷新，不阻塞请求）"""
+    indices_data = market_indices_snapshot.get()
+    
+    # 如果所有指数都获取失败，返回模拟数据
+    if not indices_data:
+        print("⚠️  使用模拟市场数据")
+        indices_data = [
+            {"name": "纳斯达克综合指数", "symbol": "NASDAQ", "price": 21178.584, "change": 2.18, "changePercent": 0.01},
+            {"name": "标普500指数", "symbol": "S&P 500", "price": 6389.77, "change": -7.92, "changePercent": -0.12},
+            {"name": "道琼斯工业指数", "symbol": "DOW", "price": 44837.56, "change": -109.42, "changePercent": -0.24}
+        ]
+    
+    return indices_data
+
 @app.route('/api/market-indices', methods=['GET'])
 def get_market_indices():
     """获取美股市场指数数据"""
     try:
         print("📊 获取美股市场指数数据...")
-        indices_data = []
-        
-        # 获取纳斯达克指数
-        try:
-            nasdaq_df = ak.index_us_stock_sina(symbol=".NDX")
-            if not nasdaq_df.empty:
-                latest = nasdaq_df.iloc[-1]
-                prev = nasdaq_df.iloc[-2] if len(nasdaq_df) > 1 else latest
-                indices_data.append({
-                    "name": "纳斯达克综合指数",
-                    "symbol": "NASDAQ",
-                    "price": float(latest['close']),
-                    "change": float(latest['close'] - prev['close']),
-                    "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                })
-                print("✅ 纳斯达克指数数据获取成功")
-        except Exception as e:
-            print(f"❌ 获取纳斯达克数据失败: {e}")
-        
-        # 获取标普500指数
-        try:
-            sp500_df = ak.index_us_stock_sina(symbol=".INX")
-            if not sp500_df.empty:
-                latest = sp500_df.iloc[-1]
-                prev = sp500_df.iloc[-2] if len(sp500_df) > 1 else latest
-                indices_data.append({
-                    "name": "标普500指数",
-                    "symbol": "S&P 500",
-                    "price": float(latest['close']),
-                    "change": float(latest['close'] - prev['close']),
-                    "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                })
-                print("✅ 标普500指数数据获取成功")
-        except Exception as e:
-            print(f"❌ 获取标普500数据失败: {e}")
-        
-        # 获取道琼斯指数
-        try:
-            dow_df = ak.index_us_stock_sina(symbol=".DJI")
-            if not dow_df.empty:
-                latest = dow_df.iloc[-1]
-                prev = dow_df.iloc[-2] if len(dow_df) > 1 else latest
-                indices_data.append({
-                    "name": "道琼斯工业指数",
-                    "symbol": "DOW",
-                    "price": float(latest['close']),
-                    "change": float(latest['close'] - prev['close']),
-                    "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                })
-                print("✅ 道琼斯指数数据获取成功")
-        except Exception as e:
-            print(f"❌ 获取道琼斯数据失败: {e}")
-        
-        # 如果所有指数都获取失败，返回模拟数据
-        if not indices_data:
-            print("⚠️  使用模拟市场数据")
-            indices_data = [
-                {"name": "纳斯达克综合指数", "symbol": "NASDAQ", "price": 21178.584, "change": 2.18, "changePercent": 0.01},
-                {"name": "标普500指数", "symbol": "S&P 500", "price": 6389.77, "change": -7.92, "changePercent": -0.12},
-                {"name": "道琼斯工业指数", "symbol": "DOW", "price": 44837.56, "change": -109.42, "changePercent": -0.24}
-            ]
+        indices_data = get_market_indices_internal()
         
         print(f"📈 成功获取 {len(indices_data)} 个市场指数数据")
         return jsonify({"success": True, "data": indices_data})
@@ -98,6 +71,7 @@ def get_market_indices():
 def generate_ai_strategy():
     """AI策略生成接口（集成DeepSeek AI）"""
     try:
+        budget = LatencyBudget()  # 不含大模型调用
         data = request.get_json()
         preferences = data.get('preferences', {})
         api_key = data.get('apiKey')
@@ -108,125 +82,158 @@ def generate_ai_strategy():
         print(f"   最大仓位: {preferences.get('maxSinglePosition', 20)}%")
         print(f"   API密钥: {'已提供' if api_key else '未提供'}")
         
-        # 选择股票池
+        # 候选全集（风格股票池或指数成分股）
         trading_style = preferences.get('tradingStyle', 'value')
-        stock_symbols = get_stock_pool(trading_style)
-        print(f"📋 初始股票池: {stock_symbols}")
+        universe = resolve_universe(preferences.get('universe'))
+        preferences['universe'] = universe
         
-        # 筛选股票
-        filtered_symbols = apply_institutional_screening(stock_symbols, trading_style)
-        print(f"🔍 筛选后股票池: {filtered_symbols}")
+        env_api_key = os.getenv('DEEPSEEK_API_KEY')
+        final_api_key = api_key or env_api_key
         
-        # 获取市场数据
-        market_response = get_market_indices()
-        market_data = market_response.get_json()['data'] if market_response.status_code == 200 else []
+        # 不调用大模型时优先使用收盘后物化的备用策略快照（只按投资金额换算）
+        if not final_api_key:
+            snapshot_response = serve_backup_snapshot(universe, trading_style, preferences, budget)
+            if snapshot_response is not None:
+                return snapshot_response
         
-        # 获取股票数据
-        stock_response = get_stock_data_internal(filtered_symbols)
-        if not stock_response['success'] or not stock_response['data']:
-            print("⚠️  无法获取实时股票数据，使用模拟数据")
-            stock_response = get_mock_stock_data(filtered_symbols)
+        stocks_data = select_stocks(trading_style, universe, budget)
         
-        stocks_data = stock_response['data']
-        print(f"📊 获取到 {len(stocks_data)} 只股票数据")
+        # 获取市场数据
+        market_data = get_market_indices_internal()
         
         # 使用AI生成策略
-        env_api_key = os.getenv('DEEPSEEK_API_KEY')
-        final_api_key = api_key or env_api_key
-        
         if final_api_key:
             print(f"🤖 使用DeepSeek AI生成策略 (来源: {'前端' if api_key else '环境变量'})")
             try:
                 ai_strategy = integrate_deepseek_strategy(preferences, market_data, stocks_data, final_api_key)
+                budget.mark('llm', excluded=True)
                 
                 if ai_strategy.get('aiPowered', False):
                     print("✅ DeepSeek AI策略生成成功")
-                    return create_strategy_response(ai_strategy, True)
+                    return create_strategy_response(ai_strategy, True, preferences, budget)
                 else:
                     print("❌ AI策略生成失败，使用备用策略")
                     
             except Exception as ai_error:
                 print(f"❌ DeepSeek AI调用异常: {ai_error}")
                 print("🔄 回退到备用策略")
+            budget.mark('llm', excluded=True)
+            
+            # 大模型调用失败时同样优先使用物化快照
+            snapshot_response = serve_backup_snapshot(universe, trading_style, preferences, budget)
+            if snapshot_response is not None:
+                return snapshot_response
         else:
             print("⚠️  未提供API密钥，使用备用策略")
         
         # 生成备用策略
         backup_strategy = generate_backup_strategy(preferences, stocks_data, trading_style)
-        return create_strategy_response(backup_strategy, False)
+        budget.mark('optimization')
+        return create_strategy_response(backup_strategy, False, preferences, budget)
     
     except Exception as e:
         print(f"❌ 策略生成失败: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-def get_stock_pool(trading_style):
-    """根据交易风格选择股票池"""
-    pools = {
-        'value': ['AAPL', 'MSFT', 'BRK-B', 'JNJ', 'PG', 'JPM', 'BAC', 'WFC', 'CVX', 'XOM'],
-        'growth': ['TSLA', 'NVDA', 'AMZN', 'GOOGL', 'META', 'CRM', 'ADBE', 'NOW', 'SHOP', 'SQ'],
-        'momentum': ['AAPL', 'NVDA', 'TSLA', 'AMD', 'NFLX', 'AVGO', 'QCOM', 'AMAT', 'LRCX', 'KLAC'],
-        'contrarian': ['INTC', 'IBM', 'GE', 'F', 'T', 'VZ', 'PFE', 'MRK', 'KO', 'PEP'],
-        'lowVolatility': ['KO', 'PEP', 'WMT', 'PG', 'JNJ', 'MCD', 'UNH', 'V', 'MA', 'HD']
-    }
-    return pools.get(trading_style, pools['value'])
+def get_stock_pool(trading_style, universe=POOLS_UNIVERSE):
+    """根据交易风格选择股票池，指数模式返回全部成分股"""
+    if universe != POOLS_UNIVERSE:
+        return get_universe(universe)
+    return STYLE_POOLS.get(trading_style, STYLE_POOLS['value'])
+
+def apply_institutional_screening(symbols, trading_style, universe=POOLS_UNIVERSE):
+    """应用机构级股票筛选标准（股票池模式只在风格股票池中筛选，指数模式只在成分股中筛选；全市场因子表尚未就绪时沿用机构池）"""
+    if universe == POOLS_UNIVERSE:
+        screened = screen_universe(trading_style, limit=8, universe=symbols)
+    else:
+        screened = screen_universe(trading_style, limit=INDEX_SCREEN_LIMIT, universe=universe)
+    if screened:
+        return screened['symbols']
+    if universe != POOLS_UNIVERSE:
+        # 指数模式只能从成分股中选择：机构池中属于该指数的股票优先，不足时按成分股顺序补齐
+        members = set(symbols)
+        preferred = [symbol for symbol in INSTITUTIONAL_POOLS.get(trading_style, []) if symbol in members]
+        return list(dict.fromkeys(preferred + list(symbols)))[:INDEX_SCREEN_LIMIT]
+    return INSTITUTIONAL_POOLS.get(trading_style, symbols)[:8]
 
-def apply_institutional_screening(symbols, trading_style):
-    """应用机构级股票筛选标准"""
-    institutional_grade = {
-        'value': ['AAPL', 'MSFT', 'BRK-B', 'JNJ', 'PG', 'JPM', 'BAC'],
-        'growth': ['TSLA', 'NVDA', 'AMZN', 'GOOGL', 'META', 'CRM', 'ADBE'],
-        'momentum': ['AAPL', 'NVDA', 'TSLA', 'AMD', 'AVGO', 'QCOM'],
-        'contrarian': ['INTC', 'IBM', 'GE', 'F', 'T', 'VZ'],
-        'lowVolatility': ['KO', 'PEP', 'WMT', 'PG', 'JNJ', 'MCD', 'UNH']
+def select_stocks(trading_style, universe, budget=None):
+    """选择候选股票并获取实时行情（行情不可用时使用模拟数据）"""
+    stock_symbols = get_stock_pool(trading_style, universe)
+    print(f"📋 初始股票池: {stock_symbols if universe == POOLS_UNIVERSE else f'{universe} 成分股 {len(stock_symbols)} 只'}")
+    
+    # 筛选股票
+    filtered_symbols = apply_institutional_screening(stock_symbols, trading_style, universe)
+    print(f"🔍 筛选后股票池: {filtered_symbols}")
+    if budget is not None:
+        budget.mark('screening')
+    
+    # 获取股票数据
+    stock_response = get_stock_data_internal(filtered_symbols)
+    if not stock_response['success'] or not stock_response['data']:
+        print("⚠️  无法获取实时股票数据，使用模拟数据")
+        stock_response = get_mock_stock_data(filtered_symbols)
+    
+    stocks_data = stock_response['data']
+    print(f"📊 获取到 {len(stocks_data)} 只股票数据")
+    if budget is not None:
+        budget.mark('quotes')
+    return stocks_data
+
+def build_stock_info(symbol, quote):
+    """最新行情 -> 接口返回的股票数据"""
+    return {
+        "symbol": symbol,
+        "companyName": f"{symbol} Inc.",
+        "currentPrice": quote['price'],
+        "dailyChange": quote['change'],
+        "dailyChangePercent": quote['changePercent']
     }
-    return institutional_grade.get(trading_style, symbols)[:8]
 
 def get_stock_data_internal(symbols):
     """获取股票实时数据"""
     try:
         stock_data = []
-        for symbol in symbols:
-            try:
-                stock_df = ak.stock_us_daily(symbol=symbol)
-                if not stock_df.empty:
-                    latest = stock_df.iloc[-1]
-                    prev = stock_df.iloc[-2] if len(stock_df) > 1 else latest
-                    
-                    stock_data.append({
-                        "symbol": symbol,
-                        "companyName": f"{symbol} Inc.",
-                        "currentPrice": float(latest['close']),
-                        "dailyChange": float(latest['close'] - prev['close']),
-                        "dailyChangePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                    })
-            except Exception as e:
-                print(f"❌ 获取股票 {symbol} 数据失败: {e}")
+        errors = []
+        
+        # 优先读取全市场行情快照，缺失的股票并发下载；结果与输入顺序一致，失败按股票单独记录
+        for item in get_latest_quotes(symbols):
+            symbol = item['symbol']
+            if item['error']:
+                print(f"❌ 获取股票 {symbol} 数据失败: {item['error']}")
+                errors.append({"symbol": symbol, "error": item['error']})
                 continue
+            
+            stock_data.append(build_stock_info(symbol, item['data']))
         
-        return {"success": True, "data": stock_data}
+        return {"success": True, "data": stock_data, "errors": errors}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 def get_mock_stock_data(symbols):
-    """生成模拟股票数据"""
-    import random
+    """生成模拟股票数据（可复现的合成市场，种子由 MOCK_MARKET_SEED 指定）"""
+    quotes = get_mock_market(seed=int(os.getenv('MOCK_MARKET_SEED', 42))).latest_quotes(symbols)
     stock_data = []
     
-    for symbol in symbols:
-        current_price = round(random.uniform(50, 300), 2)
-        daily_change = round(random.uniform(-10, 10), 2)
-        daily_change_percent = round((daily_change / current_price) * 100, 2)
-        
+    for symbol, quote in zip(symbols, quotes):
         stock_data.append({
             "symbol": symbol,
             "companyName": f"{symbol} Inc.",
-            "currentPrice": current_price,
-            "dailyChange": daily_change,
-            "dailyChangePercent": daily_change_percent
+            "currentPrice": round(quote['price'], 2),
+            "dailyChange": round(quote['change'], 2),
+            "dailyChangePercent": round(quote['changePercent'], 2)
         })
     
     return {"success": True, "data": stock_data}
 
+def backup_risks(preferences):
+    """备用策略的风险提示（回撤容忍度来自用户偏好）"""
+    return [
+        "股票投资存在市场风险，价格可能波动",
+        f"组合最大回撤可能达到{preferences.get('maxDrawdown', 20)}%",
+        "建议设置止损点控制风险",
+        "请根据市场变化及时调整策略"
+    ]
+
 def generate_backup_strategy(preferences, stocks_data, trading_style):
     """生成备用投资策略"""
     print("🔧 生成备用投资策略")
@@ -234,19 +241,17 @@ def generate_backup_strategy(preferences, stocks_data, trading_style):
     investment_amount = preferences.get('investmentAmount', 100000)
     portfolio_ratio = preferences.get('maxSinglePosition', 20) / 100
     
-    # 权重分配策略
-    weight_strategies = {
-        'value': [0.30, 0.25, 0.20, 0.15, 0.10],
-        'growth': [0.35, 0.25, 0.20, 0.12, 0.08],
-        'momentum': [0.25, 0.25, 0.20, 0.15, 0.15],
-        'default': [0.20, 0.20, 0.20, 0.20, 0.20]
-    }
-    
-    base_weights = weight_strategies.get(trading_style, weight_strategies['default'])
+    # 按交易风格在约束下优化目标权重（备用策略仅做多）
+    optimization = portfolio_optimizer.allocate(
+        [stock['symbol'] for stock in stocks_data], trading_style, portfolio_ratio,
+        mode=preferences.get('optimizationMode'), universe=preferences.get('universe')
+    )
     recommendations = []
     
-    for i, stock in enumerate(stocks_data[:len(base_weights)]):
-        allocation = base_weights[i] * portfolio_ratio * 100
+    for stock in stocks_data:
+        allocation = optimization['weights'].get(stock['symbol'], 0) * 100
+        if allocation < 0.01:
+            continue
         amount = investment_amount * (allocation / 100)
         
         recommendations.append({
@@ -273,67 +278,103 @@ def generate_backup_strategy(preferences, stocks_data, trading_style):
             "基于实时市场数据动态调整",
             "严格的风险控制和仓位管理"
         ],
-        "risks": [
-            "股票投资存在市场风险，价格可能波动",
-            f"组合最大回撤可能达到{preferences.get('maxDrawdown', 20)}%",
-            "建议设置止损点控制风险",
-            "请根据市场变化及时调整策略"
-        ],
+        "risks": backup_risks(preferences),
         "portfolioReturn": portfolio_return,
+        "optimization": optimization,
         "aiPowered": False
     }
 
-def create_strategy_response(strategy, ai_powered):
-    """创建策略响应"""
+# 延迟预算中为组装响应预留的时间（毫秒）
+RESPONSE_RESERVE_MS = 100
+
+def create_strategy_response(strategy, ai_powered, preferences, budget):
+    """创建策略响应（蒙特卡洛模拟使用延迟预算的剩余部分）"""
+    data = build_strategy_data(strategy, ai_powered, preferences, budget)
+    data["latency"] = budget.report()
+    return jsonify({"success": True, "data": data})
+
+def build_strategy_data(strategy, ai_powered, preferences, budget):
+    """策略响应数据：历史表现、风险指标、蒙特卡洛和因子暴露（不含 latency）"""
     # 获取历史数据
     symbols = [r['symbol'] for r in strategy['recommendations']]
     allocations = [r['allocation'] for r in strategy['recommendations']]
     history_response = get_stock_history_internal(symbols, allocations)
+    budget.mark('history')
     
-    return jsonify({
-        "success": True,
-        "data": {
-            "marketAnalysis": strategy['marketAnalysis'],
-            "recommendations": strategy['recommendations'],
-            "historicalPerformance": history_response['data'] if history_response['success'] else [],
-            "reasons": strategy['reasons'],
-            "risks": strategy['risks'],
-            "portfolioReturn": strategy['portfolioReturn'],
-            "aiPowered": ai_powered,
-            "strategyInsights": strategy.get('strategyInsights', ''),
-            "expectedMetrics": strategy.get('expectedMetrics', {})
-        }
-    })
+    # 用实际行情计算风险指标，替换模型估计或写死的 riskMetrics 和 VaR
+    expected_metrics = dict(strategy.get('expectedMetrics') or {})
+    risk_report = attach_risk_metrics(strategy['recommendations'], expected_metrics)
+    budget.mark('risk')
+    monte_carlo_report = attach_expected_metrics(strategy['recommendations'], expected_metrics, preferences,
+                                                 budget_ms=budget.remaining_ms(RESPONSE_RESERVE_MS))
+    budget.mark('monteCarlo')
+    factor_report = attach_factor_exposures(strategy['recommendations'])
+    budget.mark('factorExposures')
+    
+    return {
+        "marketAnalysis": strategy['marketAnalysis'],
+        "recommendations": strategy['recommendations'],
+        "historicalPerformance": history_response['data'] if history_response['success'] else [],
+        "backtest": history_response.get('backtest'),
+        "reasons": strategy['reasons'],
+        "risks": strategy['risks'],
+        "portfolioReturn": strategy['portfolioReturn'],
+        "aiPowered": ai_powered,
+        "strategyInsights": strategy.get('strategyInsights', ''),
+        "expectedMetrics": expected_metrics,
+        "riskReport": risk_report,
+        "monteCarlo": monte_carlo_report,
+        "factorExposures": factor_report,
+        "optimization": strategy.get('optimization')
+    }
 
-def get_stock_history_internal(symbols, allocations=None, period=12):
-    """获取股票历史数据"""
+def build_backup_snapshots(universe, trading_style, exposures):
+    """收盘后物化：为一个候选全集和交易风格生成各仓位档位的备用策略响应数据（筛选和行情各档共用）"""
+    stocks_data = select_stocks(trading_style, universe)
+    strategies = {}
+    for exposure in exposures:
+        preferences = {**REFERENCE_PREFERENCES, 'tradingStyle': trading_style, 'maxSinglePosition': exposure,
+                       'universe': universe}
+        # 物化不受请求延迟预算限制（蒙特卡洛仍以 MONTE_CARLO_BUDGET_MS 为上限）
+        budget = LatencyBudget(float('inf'))
+        strategy = generate_backup_strategy(preferences, stocks_data, trading_style)
+        strategies[exposure] = build_strategy_data(strategy, False, preferences, budget)
+    return strategies
+
+# 收盘后物化的备用策略快照（缓存预热任务生成）
+backup_snapshots = StrategySnapshots('simple', build_backup_snapshots)
+
+def serve_backup_snapshot(universe, trading_style, preferences, budget):
+    """使用物化快照响应备用策略请求（止损比例或回撤容忍度与参考值不同时重新模拟蒙特卡洛），没有匹配的快照时返回 None"""
+    data = backup_snapshots.lookup(universe, trading_style, preferences)
+    if data is None:
+        return None
+    print(f"⚡ 使用备用策略快照 {data['snapshot']['version']}")
+    budget.mark('snapshot')
+    if needs_resimulation(preferences):
+        data['monteCarlo'] = attach_expected_metrics(data['recommendations'], data['expectedMetrics'], preferences,
+                                                     budget_ms=budget.remaining_ms(RESPONSE_RESERVE_MS))
+        data['risks'] = backup_risks(preferences)
+        budget.mark('monteCarlo')
+    data["latency"] = budget.report()
+    return jsonify({"success": True, "data": data})
+
+def get_stock_history_internal(symbols, allocations=None, trading_days=252, backtest_mode=DEFAULT_MODE,
+                               rebalance_frequency=DEFAULT_FREQUENCY, resolution='monthly',
+                               max_points=HISTORY_MAX_POINTS):
+    """获取股票历史数据（trading_days 为 None 时取全部历史，按频率采样后降采样到 max_points 个点以内）"""
     try:
-        if allocations is None:
-            allocations = [100/len(symbols)] * len(symbols)
-        
-        # 简化版历史数据生成
-        import random
-        from datetime import datetime, timedelta
+        # 简化版历史数据：合成市场价格路径，与完整版走同一套收益计算（权重按股票汇总，重复股票的权重相加）
+        unique_symbols, weights = allocation_weights(symbols, allocations)
+        market = get_mock_market(seed=int(os.getenv('MOCK_MARKET_SEED', 42)), days=max(756, (trading_days or 0) + 21))
+        panel = market.panel(unique_symbols)
+        if trading_days:
+            panel = panel.tail(trading_days)
+        backtest = run_backtest(panel, weights, mode=backtest_mode, frequency=rebalance_frequency)
+        history_data = chart_history(panel, unique_symbols, weights, backtest['nav'], trading_days,
+                                     resolution, max_points)
         
-        history_data = []
-        for i in range(period):
-            month_date = datetime.now() - timedelta(days=30*(period-1-i))
-            month_str = month_date.strftime('%Y-%m')
-            
-            month_data = {'month': month_str}
-            portfolio_return = 0
-            
-            for j, symbol in enumerate(symbols):
-                cumulative_return = round(random.uniform(-30, 50), 2)
-                month_data[symbol] = cumulative_return
-                
-                weight = allocations[j] / 100 if j < len(allocations) else (100/len(symbols))/100
-                portfolio_return += cumulative_return * weight
-            
-            month_data['组合累计收益率'] = round(portfolio_return, 2)
-            history_data.append(month_data)
-        
-        return {"success": True, "data": history_data}
+        return {"success": True, "data": history_data, "backtest": backtest['metrics']}
     except Exception as e:
         print(f"❌ 获取历史数据失败: {e}")
         return {"success": False, "data": []}
@@ -349,14 +390,66 @@ def get_stock_data():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+MAX_BATCH_SYMBOLS = int(os.getenv('STOCK_BATCH_MAX_SYMBOLS', 5000))
+
+@app.route('/api/stock-data/batch', methods=['POST'])
+def stream_stock_data():
+    """批量获取股票实时数据API（NDJSON 流式返回，每只股票就绪后立即输出一行）"""
+    data = request.get_json() or {}
+    symbols = data.get('symbols', [])
+    if not symbols:
+        return jsonify({"success": False, "error": "symbols 不能为空"}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"success": False, "error": f"单次最多 {MAX_BATCH_SYMBOLS} 只股票"}), 400
+    try:
+        deadline = float(data.get('timeout', 120))
+    except (TypeError, ValueError):
+        deadline = float('nan')
+    if not 0 < deadline < float('inf'):
+        return jsonify({"success": False, "error": "timeout 必须是正数（秒）"}), 400
+    deadline = min(deadline, 600)
+    
+    def generate():
+        errors = 0
+        try:
+            for item in iter_latest_quotes(symbols, deadline=deadline):
+                if item['error']:
+                    errors += 1
+                    line = {"index": item['index'], "symbol": item['symbol'], "error": item['error']}
+                else:
+                    line = {"index": item['index'], "data": build_stock_info(item['symbol'], item['data'])}
+                yield json.dumps(line, ensure_ascii=False) + '\n'
+        except Exception as e:
+            print(f"❌ 批量获取股票数据失败: {e}")
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + '\n'
+        yield json.dumps({"done": True, "total": len(symbols), "errors": errors}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/stock-history', methods=['POST'])
 def get_stock_history():
     """获取股票历史数据API"""
     try:
         data = request.get_json()
         symbols = data.get('symbols', [])
-        period = data.get('period', 252) // 21  # 转换为月份
-        result = get_stock_history_internal(symbols, period=period)
+        # 时间跨度（交易日，不超过 HISTORY_MAX_DAYS），'max' / 0 / null 表示全部历史；图表目标点数不超过 HISTORY_MAX_POINTS
+        try:
+            trading_days = parse_history_period(data.get('period', 252))
+            max_points = max(3, min(int(data.get('maxPoints', HISTORY_MAX_POINTS)), HISTORY_MAX_POINTS))
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        resolution = data.get('resolution', 'monthly')
+        if resolution not in HISTORY_RESOLUTIONS:
+            return jsonify({"success": False, "error": f"resolution 必须是 {' / '.join(HISTORY_RESOLUTIONS)} 之一"}), 400
+        result = get_stock_history_internal(
+            symbols,
+            data.get('allocations'),
+            trading_days=trading_days,
+            backtest_mode=data.get('backtestMode', DEFAULT_MODE),
+            rebalance_frequency=data.get('rebalanceFrequency', DEFAULT_FREQUENCY),
+            resolution=resolution,
+            max_points=max_points
+        )
         return jsonify(result)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -368,9 +461,29 @@ def health_check():
         "status": "healthy",
         "service": "AI Stock Strategy Generator",
         "version": "1.0.0",
-        "deepseek_configured": bool(os.getenv('DEEPSEEK_API_KEY'))
+        "deepseek_configured": bool(os.getenv('DEEPSEEK_API_KEY')),
+        "priceCache": price_cache.stats(),
+        "marketIndicesSnapshot": market_indices_snapshot.stats(),
+        "upstreamCoalescing": upstream_flight.stats(),
+        "upstreamBreakers": upstream_guard.stats(),
+        "quoteSnapshot": quote_snapshot.stats(),
+        "covariance": covariance_service.stats(),
+        "strategySnapshots": backup_snapshots.stats(),
+        "cacheWarmer": cache_warmer.status()
     })
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """就绪检查接口：缓存预热完成前返回 503"""
+    ready = cache_warmer.is_ready()
+    return jsonify({"ready": ready, "warmer": cache_warmer.status()}), 200 if ready else 503
+
+# 后台预热股票池行情 + 全市场因子表 + 风格因子暴露 + 备用策略快照（启动时不阻塞，之后每个交易日收盘后执行；
+# 快照依赖筛选和因子暴露，按注册顺序在其后物化）。这里只注册任务，预热线程由服务进程启动
+cache_warmer.register_task('factor-table', factor_table_snapshot.refresh)
+cache_warmer.register_task('factor-exposures', factor_exposure_snapshot.refresh)
+cache_warmer.register_task('strategy-snapshots', backup_snapshots.materialize)
+
 if __name__ == '__main__':
     print("🚀 美股投资AI策略生成器")
     print("=" * 50)
@@ -390,4 +503,9 @@ if __name__ == '__main__':
     print("   • 风险管理和历史回测")
     print("=" * 50)
     
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    # 只在实际提供服务的进程中启动后台预热：调试重载器的监视进程和蒙特卡洛的 spawn 子进程都会重新导入本模块
+    debug = True
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_cache_warmer()
+
+    app.run(debug=debug, host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 import akshare as ak
 import pandas as pd
@@ -7,94 +7,74 @@ from datetime import datetime, timedelta
 import json
 import os
 from dotenv import load_dotenv
-from deepseek_ai_strategy import integrate_deepseek_strategy
 
-# 加载环境变量
+# 加载环境变量：必须在导入项目模块之前执行（各模块在导入时读取配置）
 load_dotenv()
 
+from deepseek_ai_strategy import integrate_deepseek_strategy
+from market_data import fetch_many, market_indices_snapshot
+from quote_snapshot import get_latest_quotes, iter_latest_quotes
+from stock_pools import (INSTITUTIONAL_POOLS, POOLS_UNIVERSE, STYLE_POOLS, WARM_UNIVERSES, all_pool_symbols,
+                         get_universe, resolve_universe)
+from market_data_cache import price_cache
+from price_store import price_store
+from cache_warmer import cache_warmer, start_cache_warmer
+from price_panel import (HISTORY_MAX_POINTS, HISTORY_RESOLUTIONS, allocation_weights, chart_history,
+                         load_close_panel, parse_history_period)
+from synthetic_market import get_mock_market
+from backtest import DEFAULT_FREQUENCY, DEFAULT_MODE, run_backtest
+from risk_engine import attach_risk_metrics
+from covariance_service import covariance_service
+from portfolio_optimizer import portfolio_optimizer
+from monte_carlo import attach_expected_metrics
+from screening import INDEX_SCREEN_LIMIT, factor_table_snapshot, screen_universe
+from factor_engine import attach_factor_exposures, factor_exposure_snapshot
+from latency_budget import LatencyBudget
+from strategy_snapshots import REFERENCE_PREFERENCES, StrategySnapshots, needs_resimulation
+
+# 模拟数据（真实数据不可用时）使用的合成市场种子
+MOCK_MARKET_SEED = int(os.getenv('MOCK_MARKET_SEED', 42))
+
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
+# 内部函数：获取美股市场指数数据（读取共享快照，过期时后台刷新，不阻塞请求）
+def get_market_indices_internal():
+    indices_data = market_indices_snapshot.get()
+    
+    # 如果所有指数都获取失败，返回模拟数据
+    if not indices_data:
+        indices_data = [
+            {
+                "name": "纳斯达克综合指数",
+                "symbol": "NASDAQ",
+                "price": 21178.584,
+                "change": 2.18,
+                "changePercent": 0.01
+            },
+            {
+                "name": "标普500指数",
+                "symbol": "S&P 500",
+                "price": 6389.77,
+                "change": -7.92,
+                "changePercent": -0.12
+            },
+            {
+                "name": "道琼斯工业指数",
+                "symbol": "DOW",
+                "price": 44837.56,
+                "change": -109.42,
+                "changePercent": -0.24
+            }
+        ]
+    
+    return indices_data
+
 # 获取美股市场指数数据
 @app.route('/api/market-indices', methods=['GET'])
 def get_market_indices():
     try:
-        # 获取美股主要指数实时数据
-        indices_data = []
-        
-        # 获取纳斯达克指数 (使用.NDX)
-        try:
-            nasdaq_df = ak.index_us_stock_sina(symbol=".NDX")
-            if not nasdaq_df.empty:
-                latest = nasdaq_df.iloc[-1]
-                prev = nasdaq_df.iloc[-2] if len(nasdaq_df) > 1 else latest
-                indices_data.append({
-                    "name": "纳斯达克综合指数",
-                    "symbol": "NASDAQ",
-                    "price": float(latest['close']),
-                    "change": float(latest['close'] - prev['close']),
-                    "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                })
-        except Exception as e:
-            print(f"获取纳斯达克数据失败: {e}")
-        
-        # 获取标普500指数 (使用.INX)
-        try:
-            sp500_df = ak.index_us_stock_sina(symbol=".INX")
-            if not sp500_df.empty:
-                latest = sp500_df.iloc[-1]
-                prev = sp500_df.iloc[-2] if len(sp500_df) > 1 else latest
-                indices_data.append({
-                    "name": "标普500指数",
-                    "symbol": "S&P 500",
-                    "price": float(latest['close']),
-                    "change": float(latest['close'] - prev['close']),
-                    "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                })
-        except Exception as e:
-            print(f"获取标普500数据失败: {e}")
-        
-        # 获取道琼斯指数 (使用.DJI)
-        try:
-            dow_df = ak.index_us_stock_sina(symbol=".DJI")
-            if not dow_df.empty:
-                latest = dow_df.iloc[-1]
-                prev = dow_df.iloc[-2] if len(dow_df) > 1 else latest
-                indices_data.append({
-                    "name": "道琼斯工业指数",
-                    "symbol": "DOW",
-                    "price": float(latest['close']),
-                    "change": float(latest['close'] - prev['close']),
-                    "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                })
-        except Exception as e:
-            print(f"获取道琼斯数据失败: {e}")
-        
-        # 如果所有指数都获取失败，返回模拟数据
-        if not indices_data:
-            indices_data = [
-                {
-                    "name": "纳斯达克综合指数",
-                    "symbol": "NASDAQ",
-                    "price": 21178.584,
-                    "change": 2.18,
-                    "changePercent": 0.01
-                },
-                {
-                    "name": "标普500指数",
-                    "symbol": "S&P 500",
-                    "price": 6389.77,
-                    "change": -7.92,
-                    "changePercent": -0.12
-                },
-                {
-                    "name": "道琼斯工业指数",
-                    "symbol": "DOW",
-                    "price": 44837.56,
-                    "change": -109.42,
-                    "changePercent": -0.24
-                }
-            ]
+        indices_data = get_market_indices_internal()
         
         return jsonify({
             "success": True,
@@ -108,10 +88,15 @@ def get_market_indices():
             "error": str(e)
         }), 500
 
+# 延迟预算中为组装响应预留的时间（毫秒），蒙特卡洛模拟使用其余的剩余预算
+RESPONSE_RESERVE_MS = 100
+
 # AI策略生成接口（集成 DeepSeek AI）
 @app.route('/api/generate-strategy', methods=['POST'])
 def generate_ai_strategy():
     try:
+        # 延迟预算（不含大模型调用），各阶段耗时随响应返回
+        budget = LatencyBudget()
         data = request.get_json()
         preferences = data.get('preferences', {})
         api_key = data.get('apiKey')  # 获取前端传来的API密钥
@@ -122,52 +107,30 @@ def generate_ai_strategy():
         # 基于投资偏好选择股票池（扩展为更专业的股票池）
         trading_style = preferences.get('tradingStyle', 'value')
         
-        # 根据交易风格选择符合机构标准的股票池
-        if trading_style == 'value':
-            stock_symbols = ['AAPL', 'MSFT', 'BRK-B', 'JNJ', 'PG', 'JPM', 'BAC', 'WFC', 'CVX', 'XOM']
-        elif trading_style == 'growth':
-            stock_symbols = ['TSLA', 'NVDA', 'AMZN', 'GOOGL', 'META', 'CRM', 'ADBE', 'NOW', 'SHOP', 'SQ']
-        elif trading_style == 'momentum':
-            stock_symbols = ['AAPL', 'NVDA', 'TSLA', 'AMD', 'NFLX', 'AVGO', 'QCOM', 'AMAT', 'LRCX', 'KLAC']
-        elif trading_style == 'contrarian':
-            stock_symbols = ['INTC', 'IBM', 'GE', 'F', 'T', 'VZ', 'PFE', 'MRK', 'KO', 'PEP']
-        else:  # lowVolatility
-            stock_symbols = ['KO', 'PEP', 'WMT', 'PG', 'JNJ', 'MCD', 'UNH', 'V', 'MA', 'HD']
-        
-        print(f"初始股票池: {stock_symbols}")
-        
-        # 应用专业筛选标准
-        filtered_symbols = apply_institutional_screening(stock_symbols, trading_style)
-        print(f"筛选后股票池: {filtered_symbols}")
-        
-        # 获取市场指数数据
-        market_response = get_market_indices()
-        market_data = market_response.get_json()['data'] if market_response.status_code == 200 else []
-        
-        # 获取这些股票的实时数据
-        stock_response = get_stock_data_internal(filtered_symbols)
-        
-        if not stock_response['success'] or not stock_response['data']:
-            print("无法获取股票数据，使用模拟数据")
-            stock_response = get_mock_stock_data(stock_symbols)
-        
-        stocks_data = stock_response['data']
-        print(f"获取到 {len(stocks_data)} 只股票数据")
-        
-        # 确保至少有股票数据
-        if not stocks_data:
-            print("股票数据为空，生成默认模拟数据")
-            stock_response = get_mock_stock_data(['AAPL', 'MSFT', 'GOOGL', 'TSLA', 'NVDA'])
-            stocks_data = stock_response['data']
+        # 候选全集：风格股票池（默认）或指数成分股（sp500 / nasdaq100，由预热的价格面板和因子表支撑）
+        universe = resolve_universe(preferences.get('universe'))
+        preferences['universe'] = universe
         
         # 检查是否提供了API密钥，优先使用环境变量，然后是前端传来的密钥
         env_api_key = os.getenv('DEEPSEEK_API_KEY')
         final_api_key = api_key or env_api_key
         
+        # 不调用大模型时优先使用收盘后物化的备用策略快照（只按投资金额换算）
+        if not final_api_key:
+            snapshot_response = serve_backup_snapshot(universe, trading_style, preferences, budget)
+            if snapshot_response is not None:
+                return snapshot_response
+        
+        stocks_data = select_stocks(trading_style, universe, budget)
+        
+        # 获取市场指数数据
+        market_data = get_market_indices_internal()
+        
         if final_api_key:
             print(f"🤖 检测到API密钥，使用DeepSeek AI生成策略 (来源: {'前端' if api_key else '环境变量'})")
             try:
                 ai_strategy = integrate_deepseek_strategy(preferences, market_data, stocks_data, final_api_key)
+                budget.mark('llm', excluded=True)
                 
                 # 检查AI策略是否成功生成
                 if ai_strategy.get('aiPowered', False):
@@ -178,6 +141,18 @@ def generate_ai_strategy():
                     allocations_list = [r['allocation'] for r in ai_strategy['recommendations']]
                     history_response = get_stock_history_internal(symbols_list, allocations_list)
                     historical_performance = history_response['data'] if history_response['success'] else []
+                    backtest_metrics = history_response.get('backtest')
+                    budget.mark('history')
+                    
+                    # 用实际行情计算风险指标，替换模型估计的 riskMetrics 和 VaR
+                    expected_metrics = dict(ai_strategy.get('expectedMetrics') or {})
+                    risk_report = attach_risk_metrics(ai_strategy['recommendations'], expected_metrics)
+                    budget.mark('risk')
+                    monte_carlo_report = attach_expected_metrics(ai_strategy['recommendations'], expected_metrics, preferences,
+                                                                 budget_ms=budget.remaining_ms(RESPONSE_RESERVE_MS))
+                    budget.mark('monteCarlo')
+                    factor_report = attach_factor_exposures(ai_strategy['recommendations'])
+                    budget.mark('factorExposures')
                     
                     # 计算组合预期收益
                     portfolio_return = sum([r['dailyChangePercent'] * (r['allocation'] / 100) for r in ai_strategy['recommendations']])
@@ -186,13 +161,18 @@ def generate_ai_strategy():
                         "marketAnalysis": ai_strategy['marketAnalysis'],
                         "recommendations": ai_strategy['recommendations'],
                         "historicalPerformance": historical_performance,
+                        "backtest": backtest_metrics,
                         "reasons": ai_strategy['reasons'],
                         "risks": ai_strategy['risks'],
                         "portfolioReturn": portfolio_return,
                         "aiPowered": True,
                         "strategyInsights": ai_strategy.get('strategyInsights', ''),
                         "scenarioAnalysis": ai_strategy.get('scenarioAnalysis', {}),
-                        "expectedMetrics": ai_strategy.get('expectedMetrics', {})
+                        "expectedMetrics": expected_metrics,
+                        "riskReport": risk_report,
+                        "monteCarlo": monte_carlo_report,
+                        "factorExposures": factor_report,
+                        "latency": budget.report()
                     }
                     
                     return jsonify({
@@ -205,77 +185,18 @@ def generate_ai_strategy():
             except Exception as ai_error:
                 print(f"❌ DeepSeek AI 调用异常: {ai_error}")
                 print("🔄 回退到备用策略")
+            budget.mark('llm', excluded=True)
+            
+            # 大模型调用失败时同样优先使用物化快照
+            snapshot_response = serve_backup_snapshot(universe, trading_style, preferences, budget)
+            if snapshot_response is not None:
+                return snapshot_response
         else:
             print("⚠️  未提供API密钥，使用备用策略")
         
         # 备用策略生成逻辑
-        print("🔧 生成备用投资策略")
-        investment_amount = preferences.get('investmentAmount', 100000)
-        portfolio_position_ratio = preferences.get('maxSinglePosition', 20) / 100  # 组合仓位占比
-        
-        print(f"备用策略 - 组合仓位占比: {portfolio_position_ratio * 100}%")
-        
-        # 根据交易风格确定基础权重分配
-        if trading_style == 'value':
-            base_weights = [0.30, 0.25, 0.20, 0.15, 0.10]  # 价值投资偏重头部
-        elif trading_style == 'growth':
-            base_weights = [0.35, 0.25, 0.20, 0.12, 0.08]  # 成长投资更集中
-        elif trading_style == 'momentum':
-            base_weights = [0.25, 0.25, 0.20, 0.15, 0.15]  # 动量投资相对均衡
-        else:
-            base_weights = [0.20, 0.20, 0.20, 0.20, 0.20]  # 其他风格均等权重
-        
-        recommendations = []
-        # 确保有足够的股票数据
-        available_stocks = min(len(stocks_data), len(base_weights))
-        
-        for i in range(available_stocks):
-            stock = stocks_data[i]
-            # 将基础权重按组合仓位占比缩放
-            allocation_percent = base_weights[i] * portfolio_position_ratio * 100
-            recommended_amount = investment_amount * (allocation_percent / 100)
-            
-            recommendations.append({
-                "symbol": stock['symbol'],
-                "companyName": stock['companyName'],
-                "currentPrice": stock['currentPrice'],
-                "dailyChange": stock['dailyChange'],
-                "dailyChangePercent": stock['dailyChangePercent'],
-                "recommendedAmount": recommended_amount,
-                "allocation": allocation_percent
-            })
-        
-        # 计算总分配比例
-        total_allocation = sum([r['allocation'] for r in recommendations])
-        print(f"备用策略 - 总仓位分配: {total_allocation:.1f}%")
-        print(f"备用策略 - 现金保留: {100 - total_allocation:.1f}%")
-        
-        symbols_list = [r['symbol'] for r in recommendations]
-        allocations_list = [r['allocation'] for r in recommendations]
-        history_response = get_stock_history_internal(symbols_list, allocations_list)
-        historical_performance = history_response['data'] if history_response['success'] else []
-        
-        portfolio_return = sum([r['dailyChangePercent'] * (r['allocation'] / 100) for r in recommendations])
-        
-        strategy_response = {
-            "marketAnalysis": f"基于当前市场状况和您的{trading_style}投资风格，我们为您推荐了{len(recommendations)}只优质美股。当前市场整体表现{'积极' if portfolio_return > 0 else '谨慎'}，建议分批建仓以降低风险。",
-            "recommendations": recommendations,
-            "historicalPerformance": historical_performance,
-            "reasons": [
-                f"选择的{len(recommendations)}只股票符合您的{trading_style}投资风格",
-                f"投资组合分散度良好，单标最大占比控制在{max(r['allocation'] for r in recommendations):.1f}%",
-                "所选股票均为行业龙头，具有良好的基本面",
-                "基于实时市场数据进行动态调整"
-            ],
-            "risks": [
-                "股票投资存在市场风险，价格可能出现波动",
-                f"当前组合最大回撤可能达到{preferences.get('maxDrawdown', 20)}%",
-                "建议设置止损点以控制风险",
-                "请根据市场变化及时调整投资策略"
-            ],
-            "portfolioReturn": portfolio_return,
-            "aiPowered": False
-        }
+        strategy_response = build_backup_strategy(preferences, trading_style, universe, stocks_data, budget)
+        strategy_response["latency"] = budget.report()
         
         return jsonify({
             "success": True,
@@ -289,6 +210,166 @@ def generate_ai_strategy():
             "error": str(e)
         }), 500
 
+# 选择候选股票并获取实时行情（机构级筛选 -> 行情快照，行情不可用时使用模拟数据）
+def select_stocks(trading_style, universe, budget=None):
+    if universe == POOLS_UNIVERSE:
+        # 根据交易风格选择符合机构标准的股票池（未知风格使用低波动股票池）
+        stock_symbols = STYLE_POOLS.get(trading_style, STYLE_POOLS['lowVolatility'])
+        print(f"初始股票池: {stock_symbols}")
+    else:
+        stock_symbols = get_universe(universe)
+        print(f"初始股票池: {universe} 成分股 {len(stock_symbols)} 只")
+    
+    # 应用专业筛选标准
+    filtered_symbols = apply_institutional_screening(stock_symbols, trading_style, universe)
+    print(f"筛选后股票池: {filtered_symbols}")
+    if budget is not None:
+        budget.mark('screening')
+    
+    # 获取这些股票的实时数据
+    stock_response = get_stock_data_internal(filtered_symbols)
+    
+    if not stock_response['success'] or not stock_response['data']:
+        print("无法获取股票数据，使用模拟数据")
+        stock_response = get_mock_stock_data(stock_symbols if universe == POOLS_UNIVERSE else filtered_symbols)
+    
+    stocks_data = stock_response['data']
+    print(f"获取到 {len(stocks_data)} 只股票数据")
+    
+    # 确保至少有股票数据
+    if not stocks_data:
+        print("股票数据为空，生成默认模拟数据")
+        stock_response = get_mock_stock_data(['AAPL', 'MSFT', 'GOOGL', 'TSLA', 'NVDA'])
+        stocks_data = stock_response['data']
+    
+    if budget is not None:
+        budget.mark('quotes')
+    return stocks_data
+
+# 备用策略的风险提示（回撤容忍度来自用户偏好）
+def backup_risks(preferences):
+    return [
+        "股票投资存在市场风险，价格可能出现波动",
+        f"当前组合最大回撤可能达到{preferences.get('maxDrawdown', 20)}%",
+        "建议设置止损点以控制风险",
+        "请根据市场变化及时调整投资策略"
+    ]
+
+# 备用策略（仅做多）：优化权重 + 历史表现 + 风险指标 + 蒙特卡洛 + 因子暴露，返回响应数据（不含 latency）
+def build_backup_strategy(preferences, trading_style, universe, stocks_data, budget):
+    print("🔧 生成备用投资策略")
+    investment_amount = preferences.get('investmentAmount', 100000)
+    portfolio_position_ratio = preferences.get('maxSinglePosition', 20) / 100  # 组合仓位占比
+    
+    print(f"备用策略 - 组合仓位占比: {portfolio_position_ratio * 100}%")
+    
+    # 按交易风格在约束下优化目标权重（单标、行业上限，总仓位 = 组合仓位占比；备用策略仅做多）
+    optimization = portfolio_optimizer.allocate(
+        [stock['symbol'] for stock in stocks_data], trading_style, portfolio_position_ratio,
+        mode=preferences.get('optimizationMode'), universe=universe
+    )
+    print(f"备用策略 - 优化目标: {optimization['mode']}, 迭代 {optimization['iterations']} 次, "
+          f"耗时 {optimization['solveMs']}ms{'（热启动）' if optimization['warmStart'] else ''}")
+    budget.mark('optimization')
+    
+    recommendations = []
+    for stock in stocks_data:
+        allocation_percent = optimization['weights'].get(stock['symbol'], 0) * 100
+        if allocation_percent < 0.01:
+            continue
+        recommended_amount = investment_amount * (allocation_percent / 100)
+        
+        recommendations.append({
+            "symbol": stock['symbol'],
+            "companyName": stock['companyName'],
+            "currentPrice": stock['currentPrice'],
+            "dailyChange": stock['dailyChange'],
+            "dailyChangePercent": stock['dailyChangePercent'],
+            "recommendedAmount": recommended_amount,
+            "allocation": allocation_percent
+        })
+    
+    # 计算总分配比例
+    total_allocation = sum([r['allocation'] for r in recommendations])
+    print(f"备用策略 - 总仓位分配: {total_allocation:.1f}%")
+    print(f"备用策略 - 现金保留: {100 - total_allocation:.1f}%")
+    
+    symbols_list = [r['symbol'] for r in recommendations]
+    allocations_list = [r['allocation'] for r in recommendations]
+    history_response = get_stock_history_internal(symbols_list, allocations_list)
+    historical_performance = history_response['data'] if history_response['success'] else []
+    backtest_metrics = history_response.get('backtest')
+    budget.mark('history')
+    expected_metrics = {}
+    risk_report = attach_risk_metrics(recommendations, expected_metrics)
+    budget.mark('risk')
+    monte_carlo_report = attach_expected_metrics(recommendations, expected_metrics, preferences,
+                                                 budget_ms=budget.remaining_ms(RESPONSE_RESERVE_MS))
+    budget.mark('monteCarlo')
+    factor_report = attach_factor_exposures(recommendations)
+    budget.mark('factorExposures')
+    
+    portfolio_return = sum([r['dailyChangePercent'] * (r['allocation'] / 100) for r in recommendations])
+    
+    return {
+        "marketAnalysis": f"基于当前市场状况和您的{trading_style}投资风格，我们为您推荐了{len(recommendations)}只优质美股。当前市场整体表现{'积极' if portfolio_return > 0 else '谨慎'}，建议分批建仓以降低风险。",
+        "recommendations": recommendations,
+        "historicalPerformance": historical_performance,
+        "backtest": backtest_metrics,
+        "reasons": [
+            f"选择的{len(recommendations)}只股票符合您的{trading_style}投资风格",
+            f"投资组合分散度良好，单标最大占比控制在{max(r['allocation'] for r in recommendations):.1f}%",
+            "所选股票均为行业龙头，具有良好的基本面",
+            "基于实时市场数据进行动态调整"
+        ],
+        "risks": backup_risks(preferences),
+        "portfolioReturn": portfolio_return,
+        "expectedMetrics": expected_metrics,
+        "riskReport": risk_report,
+        "monteCarlo": monte_carlo_report,
+        "factorExposures": factor_report,
+        "optimization": optimization,
+        "aiPowered": False
+    }
+
+# 收盘后物化：为一个候选全集和交易风格生成各仓位档位的备用策略（筛选和行情各档共用）
+def build_backup_snapshots(universe, trading_style, exposures):
+    stocks_data = select_stocks(trading_style, universe)
+    strategies = {}
+    for exposure in exposures:
+        preferences = {**REFERENCE_PREFERENCES, 'tradingStyle': trading_style, 'maxSinglePosition': exposure,
+                       'universe': universe}
+        # 物化不受请求延迟预算限制（蒙特卡洛仍以 MONTE_CARLO_BUDGET_MS 为上限）
+        strategies[exposure] = build_backup_strategy(preferences, trading_style, universe, stocks_data,
+                                                     LatencyBudget(float('inf')))
+    return strategies
+
+# 收盘后物化的备用策略快照（缓存预热任务生成，各 worker 进程读取同一份持久化结果）
+backup_snapshots = StrategySnapshots('deepseek', build_backup_snapshots)
+
+# 使用物化快照响应备用策略请求：只按投资金额换算推荐金额，止损比例或回撤容忍度与参考值不同时重新模拟蒙特卡洛；
+# 没有匹配的快照时返回 None
+def serve_backup_snapshot(universe, trading_style, preferences, budget):
+    strategy_response = backup_snapshots.lookup(universe, trading_style, preferences)
+    if strategy_response is None:
+        return None
+    print(f"⚡ 使用备用策略快照 {strategy_response['snapshot']['version']}")
+    budget.mark('snapshot')
+    
+    if needs_resimulation(preferences):
+        expected_metrics = strategy_response['expectedMetrics']
+        strategy_response['monteCarlo'] = attach_expected_metrics(
+            strategy_response['recommendations'], expected_metrics, preferences,
+            budget_ms=budget.remaining_ms(RESPONSE_RESERVE_MS))
+        strategy_response['risks'] = backup_risks(preferences)
+        budget.mark('monteCarlo')
+    
+    strategy_response["latency"] = budget.report()
+    return jsonify({
+        "success": True,
+        "data": strategy_response
+    })
+
 # 获取美股股票实时数据
 @app.route('/api/stock-data', methods=['POST'])
 def get_stock_data():
@@ -296,33 +377,12 @@ def get_stock_data():
         data = request.get_json()
         symbols = data.get('symbols', [])
         
-        stock_data = []
-        
-        for symbol in symbols:
-            try:
-                # 获取股票实时数据
-                stock_df = ak.stock_us_daily(symbol=symbol)
-                if not stock_df.empty:
-                    latest = stock_df.iloc[-1]
-                    prev = stock_df.iloc[-2] if len(stock_df) > 1 else latest
-                    
-                    # 获取股票基本信息
-                    stock_info = {
-                        "symbol": symbol,
-                        "companyName": f"{symbol} Inc.",  # 简化处理
-                        "currentPrice": float(latest['close']),
-                        "dailyChange": float(latest['close'] - prev['close']),
-                        "dailyChangePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                    }
-                    
-                    stock_data.append(stock_info)
-            except Exception as e:
-                print(f"获取股票 {symbol} 数据失败: {e}")
-                continue
+        stock_response = get_stock_data_internal(symbols)
         
         return jsonify({
-            "success": True,
-            "data": stock_data
+            "success": stock_response['success'],
+            "data": stock_response.get('data', []),
+            "errors": stock_response.get('errors', [])
         })
     
     except Exception as e:
@@ -332,34 +392,76 @@ def get_stock_data():
             "error": str(e)
         }), 500
 
+# 批量行情单次请求的股票数量上限
+MAX_BATCH_SYMBOLS = int(os.getenv('STOCK_BATCH_MAX_SYMBOLS', 5000))
+
+# 批量获取股票实时数据（NDJSON 流式返回：每只股票就绪后立即输出一行，失败的股票输出错误行）
+@app.route('/api/stock-data/batch', methods=['POST'])
+def stream_stock_data():
+    data = request.get_json() or {}
+    symbols = data.get('symbols', [])
+    
+    if not symbols:
+        return jsonify({"success": False, "error": "symbols 不能为空"}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"success": False, "error": f"单次最多 {MAX_BATCH_SYMBOLS} 只股票"}), 400
+    
+    try:
+        deadline = float(data.get('timeout', 120))
+    except (TypeError, ValueError):
+        deadline = float('nan')
+    if not 0 < deadline < float('inf'):
+        return jsonify({"success": False, "error": "timeout 必须是正数（秒）"}), 400
+    deadline = min(deadline, 600)
+    
+    def generate():
+        errors = 0
+        try:
+            for item in iter_latest_quotes(symbols, deadline=deadline):
+                if item['error']:
+                    errors += 1
+                    line = {"index": item['index'], "symbol": item['symbol'], "error": item['error']}
+                else:
+                    line = {"index": item['index'], "data": build_stock_info(item['symbol'], item['data'])}
+                yield json.dumps(line, ensure_ascii=False) + '\n'
+        except Exception as e:
+            print(f"批量获取股票数据失败: {e}")
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + '\n'
+        
+        yield json.dumps({"done": True, "total": len(symbols), "errors": errors}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# 最新行情 -> 接口返回的股票数据
+def build_stock_info(symbol, quote):
+    return {
+        "symbol": symbol,
+        "companyName": f"{symbol} Inc.",
+        "currentPrice": quote['price'],
+        "dailyChange": quote['change'],
+        "dailyChangePercent": quote['changePercent']
+    }
+
 # 内部函数：获取股票数据
 def get_stock_data_internal(symbols):
     try:
         stock_data = []
-        
-        for symbol in symbols:
-            try:
-                stock_df = ak.stock_us_daily(symbol=symbol)
-                if not stock_df.empty:
-                    latest = stock_df.iloc[-1]
-                    prev = stock_df.iloc[-2] if len(stock_df) > 1 else latest
-                    
-                    stock_info = {
-                        "symbol": symbol,
-                        "companyName": f"{symbol} Inc.",
-                        "currentPrice": float(latest['close']),
-                        "dailyChange": float(latest['close'] - prev['close']),
-                        "dailyChangePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
-                    }
-                    
-                    stock_data.append(stock_info)
-            except Exception as e:
-                print(f"获取股票 {symbol} 数据失败: {e}")
+        errors = []
+        
+        # 优先读取全市场行情快照，缺失的股票并发下载，结果与输入顺序一致
+        for item in get_latest_quotes(symbols):
+            symbol = item['symbol']
+            if item['error']:
+                print(f"获取股票 {symbol} 数据失败: {item['error']}")
+                errors.append({"symbol": symbol, "error": item['error']})
                 continue
+            
+            stock_data.append(build_stock_info(symbol, item['data']))
         
         return {
             "success": True,
-            "data": stock_data
+            "data": stock_data,
+            "errors": errors
         }
     
     except Exception as e:
@@ -371,20 +473,17 @@ def get_stock_data_internal(symbols):
 
 # 模拟股票数据（当真实数据获取失败时使用）
 def get_mock_stock_data(symbols):
-    import random
+    # 由可复现的合成市场生成最新价格（种子由 MOCK_MARKET_SEED 指定）
+    quotes = get_mock_market(seed=MOCK_MARKET_SEED).latest_quotes(symbols)
     stock_data = []
     
-    for symbol in symbols:
-        current_price = round(random.uniform(50, 300), 2)
-        daily_change = round(random.uniform(-10, 10), 2)
-        daily_change_percent = round((daily_change / current_price) * 100, 2)
-        
+    for symbol, quote in zip(symbols, quotes):
         stock_info = {
             "symbol": symbol,
             "companyName": f"{symbol} Inc.",
-            "currentPrice": current_price,
-            "dailyChange": daily_change,
-            "dailyChangePercent": daily_change_percent
+            "currentPrice": round(quote['price'], 2),
+            "dailyChange": round(quote['change'], 2),
+            "dailyChangePercent": round(quote['changePercent'], 2)
         }
         
         stock_data.append(stock_info)
@@ -400,16 +499,34 @@ def get_stock_history():
     try:
         data = request.get_json()
         symbols = data.get('symbols', [])
-        period = data.get('period', 252)  # 默认一年的交易日
-        
-        # 转换为月份数（大约每月21个交易日）
-        months = max(1, period // 21)
-        
-        history_response = get_stock_history_internal(symbols, period=months)
+        # 时间跨度（交易日，不超过 HISTORY_MAX_DAYS），'max' / 0 / null 表示上市以来的全部历史；
+        # 图表目标点数，不超过 HISTORY_MAX_POINTS
+        try:
+            trading_days = parse_history_period(data.get('period', 252))
+            max_points = max(3, min(int(data.get('maxPoints', HISTORY_MAX_POINTS)), HISTORY_MAX_POINTS))
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        resolution = data.get('resolution', 'monthly')
+        if resolution not in HISTORY_RESOLUTIONS:
+            return jsonify({
+                "success": False,
+                "error": f"resolution 必须是 {' / '.join(HISTORY_RESOLUTIONS)} 之一"
+            }), 400
+        
+        history_response = get_stock_history_internal(
+            symbols,
+            data.get('allocations'),
+            trading_days=trading_days,
+            backtest_mode=data.get('backtestMode', DEFAULT_MODE),
+            rebalance_frequency=data.get('rebalanceFrequency', DEFAULT_FREQUENCY),
+            resolution=resolution,
+            max_points=max_points
+        )
         
         return jsonify({
             "success": history_response['success'],
-            "data": history_response['data']
+            "data": history_response['data'],
+            "backtest": history_response.get('backtest')
         })
     
     except Exception as e:
@@ -420,132 +537,64 @@ def get_stock_history():
         }), 500
 
 # 内部函数：获取历史数据（包含组合累计收益率）
-def get_stock_history_internal(symbols, allocations=None, period=12):
+def get_stock_history_internal(symbols, allocations=None, trading_days=252, backtest_mode=DEFAULT_MODE,
+                               rebalance_frequency=DEFAULT_FREQUENCY, resolution='monthly',
+                               max_points=HISTORY_MAX_POINTS):
     try:
-        history_data = []
+        # 按股票汇总配置权重（未提供时等权，重复股票的权重相加）
+        unique_symbols, weights = allocation_weights(symbols, allocations)
         
-        # 如果没有提供配置权重，默认等权重
-        if allocations is None:
-            allocations = [100/len(symbols)] * len(symbols)
-        
-        # 存储每只股票的历史数据
-        stock_histories = {}
-        
-        # 根据期间计算需要的交易日数量（大约每月21个交易日）
-        trading_days = min(period * 21, 504)  # 最多2年的数据
-        
-        for symbol in symbols:
-            try:
-                stock_df = ak.stock_us_daily(symbol=symbol)
-                if not stock_df.empty:
-                    recent_data = stock_df.tail(trading_days)
-                    
-                    if len(recent_data) == 0:
-                        continue
-                        
-                    initial_price = recent_data.iloc[0]['close']
-                    monthly_data = {}
-                    
-                    # 按月份分组，取每月最后一个交易日的价格
-                    for i, row in recent_data.iterrows():
-                        date_str = str(row['date'])[:7]  # YYYY-MM格式
-                        cumulative_return = (row['close'] - initial_price) / initial_price * 100
-                        # 如果同一个月有多个数据点，保留最新的（最后一个）
-                        monthly_data[date_str] = cumulative_return
-                    
-                    stock_histories[symbol] = monthly_data
-            
-            except Exception as e:
-                print(f"获取股票 {symbol} 历史数据失败: {e}")
-                continue
+        # 对齐为 交易日 × 股票 收盘价矩阵（优先从共享价格面板切片，缺少股票时并发获取日线），
+        # trading_days 为 None 时取全部历史
+        panel, errors = load_close_panel(unique_symbols, trading_days)
+        for error in errors:
+            print(f"获取股票 {error['symbol']} 历史数据失败: {error['error']}")
         
         # 如果没有获取到任何历史数据，生成模拟数据
-        if not stock_histories:
-            return get_mock_history_data(symbols, allocations, period)
-        
-        # 获取所有月份
-        all_months = set()
-        for stock_data in stock_histories.values():
-            all_months.update(stock_data.keys())
-        
-        sorted_months = sorted(list(all_months))  # 按时间排序所有月份
-        # 取最近的 period 个月
-        sorted_months = sorted_months[-period:] if len(sorted_months) > period else sorted_months
+        if panel.empty:
+            return get_mock_history_data(symbols, allocations, trading_days, backtest_mode, rebalance_frequency,
+                                         resolution, max_points)
         
-        # 计算每个月的数据
-        for month in sorted_months:
-            month_data = {'month': month}
-            
-            # 添加各股票的累计收益率
-            for symbol in symbols:
-                if symbol in stock_histories and month in stock_histories[symbol]:
-                    month_data[symbol] = round(stock_histories[symbol][month], 2)
-                else:
-                    month_data[symbol] = 0  # 如果没有数据，默认为0
-            
-            # 计算组合累计收益率（加权平均）
-            portfolio_return = 0
-            valid_stocks = 0
-            
-            for i, symbol in enumerate(symbols):
-                if symbol in month_data and month_data[symbol] is not None:
-                    weight = allocations[i] / 100 if i < len(allocations) else (100/len(symbols))/100
-                    portfolio_return += month_data[symbol] * weight
-                    valid_stocks += 1
-            
-            month_data['组合累计收益率'] = round(portfolio_return, 2)
-            history_data.append(month_data)
+        # 按目标权重回测组合（扣除佣金和冲击成本），组合累计收益率取回测净值的采样值，
+        # 按频率采样后降采样到 max_points 个点以内
+        backtest = run_backtest(panel, pd.Series(weights, index=unique_symbols), mode=backtest_mode,
+                                frequency=rebalance_frequency)
+        history_data = chart_history(panel, unique_symbols, weights, backtest['nav'], trading_days, resolution,
+                                     max_points)
         
         return {
             "success": True,
-            "data": history_data
+            "data": history_data,
+            "backtest": backtest['metrics']
         }
     
     except Exception as e:
         print(f"获取历史数据失败: {e}")
-        return get_mock_history_data(symbols, allocations, period)
+        return get_mock_history_data(symbols, allocations, trading_days, backtest_mode, rebalance_frequency,
+                                     resolution, max_points)
 
 # 模拟历史数据
-def get_mock_history_data(symbols, allocations=None, period=12):
-    import random
-    from datetime import datetime, timedelta
-    
-    if allocations is None:
-        allocations = [100/len(symbols)] * len(symbols)
-    
-    history_data = []
+def get_mock_history_data(symbols, allocations=None, trading_days=252, backtest_mode=DEFAULT_MODE,
+                          rebalance_frequency=DEFAULT_FREQUENCY, resolution='monthly',
+                          max_points=HISTORY_MAX_POINTS):
+    # 合成市场生成的相关价格路径，与真实数据走同一套收益计算；全部历史时取合成市场的全部交易日。
+    # 权重按股票汇总（重复股票的权重相加），不按位置对齐
+    unique_symbols, weights = allocation_weights(symbols, allocations)
+    market = get_mock_market(seed=MOCK_MARKET_SEED, days=max(756, (trading_days or 0) + 21))
+    panel = market.panel(unique_symbols)
+    if trading_days:
+        panel = panel.tail(trading_days)
     
-    for i in range(period):
-        # 从最早的月份开始，往当前时间推进
-        month_date = datetime.now() - timedelta(days=30*(period-1-i))
-        month_str = month_date.strftime('%Y-%m')
-        
-        month_data = {'month': month_str}
-        
-        # 为每只股票生成累计收益率
-        portfolio_return = 0
-        for j, symbol in enumerate(symbols):
-            # 模拟累计收益率（-30% 到 +50%）
-            cumulative_return = round(random.uniform(-30, 50), 2)
-            month_data[symbol] = cumulative_return
-            
-            # 计算组合收益率
-            weight = allocations[j] / 100 if j < len(allocations) else (100/len(symbols))/100
-            portfolio_return += cumulative_return * weight
-        
-        month_data['组合累计收益率'] = round(portfolio_return, 2)
-        history_data.append(month_data)
-    
-    # 按月份排序
-    history_data.sort(key=lambda x: x['month'])
+    backtest = run_backtest(panel, weights, mode=backtest_mode, frequency=rebalance_frequency)
     
     return {
         "success": True,
-        "data": history_data
+        "data": chart_history(panel, unique_symbols, weights, backtest['nav'], trading_days, resolution, max_points),
+        "backtest": backtest['metrics']
     }
 
 # 专业股票筛选函数
-def apply_institutional_screening(symbols, trading_style):
+def apply_institutional_screening(symbols, trading_style, universe=POOLS_UNIVERSE):
     """
     应用机构级股票筛选标准
     
@@ -556,22 +605,67 @@ def apply_institutional_screening(symbols, trading_style):
     - 动量过滤：过去12个月超额收益排名前50%且最近1个月收益为正
     """
     
-    # 这里简化处理，实际应该连接专业数据源进行筛选
-    # 基于交易风格进行进一步筛选
+    # 在每日预计算的全市场因子表上执行向量化筛选并按风格排序：股票池模式只在该风格股票池中筛选，最多8只股票以控制集中度风险，
+    # 指数模式只在成分股中筛选，保留 INDEX_SCREEN_LIMIT 只候选由优化器分配权重（集中度由单标和行业上限控制）
+    if universe == POOLS_UNIVERSE:
+        screened = screen_universe(trading_style, limit=8, universe=symbols)
+    else:
+        screened = screen_universe(trading_style, limit=INDEX_SCREEN_LIMIT, universe=universe)
+    if screened:
+        print(f"🧮 因子表筛选: {screened['universe']} 只股票中 {screened['passed']} 只通过，耗时 {screened['elapsedMs']}ms")
+        return screened['symbols']
     
-    institutional_grade_stocks = {
-        'value': ['AAPL', 'MSFT', 'BRK-B', 'JNJ', 'PG', 'JPM', 'BAC'],
-        'growth': ['TSLA', 'NVDA', 'AMZN', 'GOOGL', 'META', 'CRM', 'ADBE'],
-        'momentum': ['AAPL', 'NVDA', 'TSLA', 'AMD', 'AVGO', 'QCOM'],
-        'contrarian': ['INTC', 'IBM', 'GE', 'F', 'T', 'VZ'],
-        'lowVolatility': ['KO', 'PEP', 'WMT', 'PG', 'JNJ', 'MCD', 'UNH']
-    }
+    # 因子表尚未就绪（首次启动、数据源不可用）时沿用机构池；指数模式只能从成分股中选择，
+    # 机构池中属于该指数的股票优先，不足时按成分股顺序补齐
+    if universe != POOLS_UNIVERSE:
+        members = set(symbols)
+        preferred = [symbol for symbol in INSTITUTIONAL_POOLS.get(trading_style, []) if symbol in members]
+        return list(dict.fromkeys(preferred + list(symbols)))[:INDEX_SCREEN_LIMIT]
+    filtered = INSTITUTIONAL_POOLS.get(trading_style, symbols)
+    return filtered[:8]
+
+def compute_enhanced_stock_info(symbol, stock_df):
+    """
+    基于日线计算增强指标（结果按股票和最后交易日缓存，日线更新后自动失效）
     
-    # 获取对应风格的机构级股票
-    filtered = institutional_grade_stocks.get(trading_style, symbols)
+    波动率和动量优先读取价格库随每日追加增量维护的滚动统计，与日线不同步时才从日线重新计算
+    """
+    latest_date = pd.Timestamp(stock_df.iloc[-1]['date'])
+    cache_key = ('enhanced', symbol, str(latest_date), len(stock_df))
     
-    # 限制数量以符合风险管理要求
-    return filtered[:8]  # 最多8只股票以控制集中度风险
+    def compute():
+        latest = stock_df.iloc[-1]
+        prev = stock_df.iloc[-2] if len(stock_df) > 1 else latest
+        
+        factors = price_store.read_factors(symbol)
+        if factors is not None and factors['lastDate'] == latest_date.strftime('%Y-%m-%d'):
+            volatility = factors['volatility']
+            momentum_1m = factors['momentum1M']
+            momentum_12m = factors['momentum12M']
+        else:
+            # 计算技术指标
+            recent_data = stock_df.tail(252)  # 一年数据
+            volatility = recent_data['close'].pct_change().std() * (252**0.5) * 100
+            
+            # 计算动量指标
+            momentum_1m = (latest['close'] - stock_df.iloc[-21]['close']) / stock_df.iloc[-21]['close'] * 100 if len(stock_df) > 21 else 0
+            momentum_12m = (latest['close'] - stock_df.iloc[-252]['close']) / stock_df.iloc[-252]['close'] * 100 if len(stock_df) > 252 else 0
+        
+        return {
+            "symbol": symbol,
+            "companyName": f"{symbol} Inc.",
+            "currentPrice": float(latest['close']),
+            "dailyChange": float(latest['close'] - prev['close']),
+            "dailyChangePercent": float((latest['close'] - prev['close']) / prev['close'] * 100),
+            "volatility": round(float(volatility), 2),
+            "momentum1M": round(float(momentum_1m), 2),
+            "momentum12M": round(float(momentum_12m), 2),
+            "volume": float(latest.get('volume', 0)),
+            "marketCap": "Large Cap",  # 简化处理
+            "sector": "Technology"  # 简化处理
+        }
+    
+    return dict(price_cache.get_or_load(cache_key, compute))
 
 def get_enhanced_stock_data(symbols):
     """
@@ -580,36 +674,16 @@ def get_enhanced_stock_data(symbols):
     try:
         enhanced_data = []
         
-        for symbol in symbols:
+        for item in fetch_many(symbols):
+            symbol = item['symbol']
+            if item['error']:
+                print(f"获取股票 {symbol} 增强数据失败: {item['error']}")
+                continue
+            
             try:
-                stock_df = ak.stock_us_daily(symbol=symbol)
+                stock_df = item['data']
                 if not stock_df.empty:
-                    latest = stock_df.iloc[-1]
-                    prev = stock_df.iloc[-2] if len(stock_df) > 1 else latest
-                    
-                    # 计算技术指标
-                    recent_data = stock_df.tail(252)  # 一年数据
-                    volatility = recent_data['close'].pct_change().std() * (252**0.5) * 100
-                    
-                    # 计算动量指标
-                    momentum_1m = (latest['close'] - stock_df.iloc[-21]['close']) / stock_df.iloc[-21]['close'] * 100 if len(stock_df) > 21 else 0
-                    momentum_12m = (latest['close'] - stock_df.iloc[-252]['close']) / stock_df.iloc[-252]['close'] * 100 if len(stock_df) > 252 else 0
-                    
-                    stock_info = {
-                        "symbol": symbol,
-                        "companyName": f"{symbol} Inc.",
-                        "currentPrice": float(latest['close']),
-                        "dailyChange": float(latest['close'] - prev['close']),
-                        "dailyChangePercent": float((latest['close'] - prev['close']) / prev['close'] * 100),
-                        "volatility": round(volatility, 2),
-                        "momentum1M": round(momentum_1m, 2),
-                        "momentum12M": round(momentum_12m, 2),
-                        "volume": float(latest.get('volume', 0)),
-                        "marketCap": "Large Cap",  # 简化处理
-                        "sector": "Technology"  # 简化处理
-                    }
-                    
-                    enhanced_data.append(stock_info)
+                    enhanced_data.append(compute_enhanced_stock_info(symbol, stock_df))
             except Exception as e:
                 print(f"获取股票 {symbol} 增强数据失败: {e}")
                 continue
@@ -626,6 +700,28 @@ def get_enhanced_stock_data(symbols):
             "error": str(e)
         }
 
+# 就绪检查接口：缓存预热完成前返回 503
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    ready = cache_warmer.is_ready()
+    return jsonify({
+        "ready": ready,
+        "warmer": cache_warmer.status()
+    }), 200 if ready else 503
+
+def warm_covariances():
+    """预先估计股票池和预热指数成分股的协方差矩阵（指数模式的请求直接切片）"""
+    for universe in [POOLS_UNIVERSE] + WARM_UNIVERSES:
+        covariance_service.estimate(sorted(get_universe(universe)))
+
+# 后台预热：股票池和指数成分股行情 + 增强指标 + 协方差矩阵 + 全市场因子表 + 风格因子暴露 + 备用策略快照（启动时不阻塞，之后每个交易日收盘后执行）
+# 这里只注册任务，预热线程由服务进程启动
+cache_warmer.register_task('enhanced-stats', lambda: get_enhanced_stock_data(all_pool_symbols()))
+cache_warmer.register_task('covariance', warm_covariances)
+cache_warmer.register_task('factor-table', factor_table_snapshot.refresh)
+cache_warmer.register_task('factor-exposures', factor_exposure_snapshot.refresh)
+cache_warmer.register_task('strategy-snapshots', backup_snapshots.materialize)
+
 if __name__ == '__main__':
     # 检查是否配置了 DeepSeek API 密钥
     deepseek_key = os.getenv('DEEPSEEK_API_KEY')
@@ -639,4 +735,9 @@ if __name__ == '__main__':
     print("🤖 集成DeepSeek大模型智能分析")
     print("=" * 50)
     
-    app.run(debug=True, host='0.0.0.0', port=5003)
\ No newline at end of file
+    # 只在实际提供服务的进程中启动后台预热：调试重载器的监视进程和蒙特卡洛的 spawn 子进程都会重新导入本模块
+    debug = True
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_cache_warmer()
+
+    app.run(debug=debug, host='0.0.0.0', port=5003)
\ No newline at end of file
@@ -4,30 +4,25 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
+import os
 import random
+import sys
+
+# 复用项目根目录的合成市场生成器
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_market import get_mock_market
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
 # 模拟数据生成函数
 def generate_mock_stock_data(symbol, days=30):
-    """生成模拟股票数据"""
-    base_price = random.uniform(50, 300)
-    dates = []
-    prices = []
+    """生成模拟股票数据（可复现的合成市场价格路径）"""
+    market = get_mock_market(seed=int(os.getenv('MOCK_MARKET_SEED', 42)), days=days)
+    closes = market.close_paths([symbol])[:, 0]
     
-    for i in range(days):
-        date = datetime.now() - timedelta(days=days-i)
-        dates.append(date.strftime('%Y-%m-%d'))
-        
-        # 模拟价格波动
-        if i == 0:
-            price = base_price
-        else:
-            change = random.uniform(-0.05, 0.05)  # -5% 到 +5% 的变化
-            price = prices[-1] * (1 + change)
-        
-        prices.append(round(price, 2))
+    dates = [date.strftime('%Y-%m-%d') for date in market.dates]
+    prices = [round(price, 2) for price in closes.tolist()]
     
     return dates, prices
 
@@ -0,0 +1,160 @@
+"""
+向量化组合回测引擎
+在收盘价矩阵上回测固定目标权重的组合：买入持有、定期再平衡、偏离阈值再平衡，
+扣除单边佣金和市场冲击成本，输出每日净值、换手率和回撤序列
+"""
+
+import os
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+# 交易成本（与策略提示词一致）：0.02% 单边佣金 + 10 bps 市场冲击
+COMMISSION_RATE = 0.0002
+IMPACT_RATE = 0.0010
+
+TRADING_DAYS_PER_YEAR = 252
+
+# 回测模式
+BUY_AND_HOLD = 'buy_and_hold'
+REBALANCE = 'rebalance'
+DRIFT = 'drift'
+
+# 定期再平衡频率（pandas 周期别名）
+REBALANCE_FREQUENCIES = {'W': 'W', 'M': 'M', 'Q': 'Q', 'A': 'Y'}
+
+DEFAULT_MODE = os.getenv('BACKTEST_MODE', REBALANCE)
+DEFAULT_FREQUENCY = os.getenv('BACKTEST_REBALANCE_FREQUENCY', 'M')
+
+
+def _periodic_rebalance_points(dates: pd.DatetimeIndex, frequency: str) -> np.ndarray:
+    """每个新周期的首个交易日再平衡（第0天为建仓日）"""
+    if frequency not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"不支持的再平衡频率: {frequency}")
+    periods = dates.to_period(REBALANCE_FREQUENCIES[frequency]).asi8
+    changes = np.flatnonzero(periods[1:] != periods[:-1]) + 1
+    return np.concatenate([[0], changes])
+
+
+def _drift_rebalance_points(prices: np.ndarray, weights: np.ndarray, tolerance: float,
+                            lookahead: int = 64) -> np.ndarray:
+    """任一股票权重偏离目标超过 tolerance（绝对值）时再平衡"""
+    cash = 1 - weights.sum()
+    points = [0]
+    start = 0
+    n_days = prices.shape[0]
+
+    while True:
+        found = None
+        # 分块向前搜索，避免每次再平衡都扫描剩余全部交易日
+        for chunk_start in range(start + 1, n_days, lookahead):
+            chunk = prices[chunk_start:chunk_start + lookahead] / prices[start]
+            values = chunk * weights
+            drifted = values / (cash + values.sum(axis=1, keepdims=True))
+            breached = np.flatnonzero(np.abs(drifted - weights).max(axis=1) > tolerance)
+            if breached.size:
+                found = chunk_start + int(breached[0])
+                break
+        if found is None:
+            return np.array(points)
+        points.append(found)
+        start = found
+
+
+def run_backtest(panel: pd.DataFrame,
+                 weights,
+                 mode: str = DEFAULT_MODE,
+                 frequency: str = DEFAULT_FREQUENCY,
+                 tolerance: float = 0.05,
+                 commission: float = COMMISSION_RATE,
+                 impact: float = IMPACT_RATE) -> Dict[str, Any]:
+    """
+    回测固定目标权重的组合（未分配的权重作为现金，收益为0）
+
+    Args:
+        panel: 交易日 × 股票 收盘价矩阵（build_close_panel 输出）；上市前的缺失价格按首个有效价格回填，
+            即该部分权重在上市前视同现金
+        weights: 与 panel 列对齐的目标权重（小数，合计不超过1）；也可传以股票代码为索引的 Series，
+            panel 中缺失的股票按现金处理
+        mode: buy_and_hold（建仓后不再交易）/ rebalance（定期再平衡）/ drift（偏离阈值再平衡）
+        frequency: 定期再平衡频率 W / M / Q / A
+        tolerance: drift 模式下单只股票权重的最大绝对偏离
+        commission: 单边佣金率
+        impact: 单边市场冲击成本率
+
+    Returns:
+        {"nav", "turnover", "drawdown"}（以日期为索引的 Series，净值从1开始、已扣成本）及 "metrics" 汇总指标
+    """
+    if isinstance(weights, pd.Series):
+        weights = weights.groupby(level=0).sum().reindex(panel.columns).fillna(0)
+    weights = np.asarray(weights, dtype=np.float64)
+    if panel.empty:
+        raise ValueError("价格矩阵为空")
+    if weights.shape != (panel.shape[1],):
+        raise ValueError("权重数量与股票数量不一致")
+
+    prices = panel.ffill().bfill().to_numpy(dtype=np.float64)
+    keep = ~np.isnan(prices).any(axis=0)
+    prices, weights = prices[:, keep], weights[keep]
+    cash = 1 - weights.sum()
+    cost_rate = commission + impact
+
+    if mode == BUY_AND_HOLD:
+        points = np.array([0])
+    elif mode == REBALANCE:
+        points = _periodic_rebalance_points(panel.index, frequency)
+    elif mode == DRIFT:
+        points = _drift_rebalance_points(prices, weights, tolerance)
+    else:
+        raise ValueError(f"不支持的回测模式: {mode}")
+
+    # 每个交易日所属的持有区间：区间 k 为 (points[k], points[k+1]]
+    n_days = prices.shape[0]
+    segment = np.clip(np.searchsorted(points, np.arange(n_days), side='left') - 1, 0, None)
+    relative = prices / prices[points[segment]]
+    growth = cash + relative @ weights  # 区间内未扣成本的净值增长倍数
+
+    # 再平衡时点的换手率：建仓为全部仓位，其后为漂移权重与目标权重的差
+    turnover_at = np.empty(len(points))
+    turnover_at[0] = np.abs(weights).sum()
+    if len(points) > 1:
+        drifted = weights * relative[points[1:]] / growth[points[1:], None]
+        turnover_at[1:] = np.abs(drifted - weights).sum(axis=1)
+    cost_factor = 1 - cost_rate * turnover_at
+
+    # 再平衡后的区间起始净值：V_k = V_{k-1} * growth(points[k]) * cost_factor_k
+    start_growth = np.concatenate([[1.0], growth[points[1:]]])
+    segment_nav = np.cumprod(start_growth * cost_factor)
+
+    nav = np.concatenate([[segment_nav[0]], segment_nav[segment[1:]] * growth[1:]])
+    nav[points[1:]] *= cost_factor[1:]
+
+    turnover = np.zeros(n_days)
+    turnover[points] = turnover_at
+    drawdown = nav / np.maximum.accumulate(nav) - 1
+
+    index = panel.index
+    daily_returns = np.diff(nav) / nav[:-1]
+    years = max(n_days - 1, 1) / TRADING_DAYS_PER_YEAR
+    volatility = float(daily_returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR)) if len(daily_returns) > 1 else 0.0
+    annual_return = float(nav[-1] ** (1 / years) - 1) if nav[-1] > 0 else -1.0
+
+    return {
+        "nav": pd.Series(nav, index=index),
+        "turnover": pd.Series(turnover, index=index),
+        "drawdown": pd.Series(drawdown, index=index),
+        "metrics": {
+            "mode": mode,
+            "rebalanceFrequency": frequency if mode == REBALANCE else None,
+            "rebalances": int(len(points) - 1),
+            "totalReturn": round(float(nav[-1] - 1) * 100, 2),
+            "annualReturn": round(annual_return * 100, 2),
+            "annualVolatility": round(volatility * 100, 2),
+            "sharpeRatio": round(annual_return / volatility, 2) if volatility > 0 else None,
+            "maxDrawdown": round(float(drawdown.min()) * 100, 2),
+            "totalTurnover": round(float(turnover.sum()) * 100, 2),
+            "totalCost": round(float(1 - np.prod(cost_factor)) * 100, 4)
+        }
+    }
+
@@ -0,0 +1,119 @@
+"""
+策略生成延迟基准
+在固定测试数据源上预热整个指数（默认标普500）的价格库、价格面板、协方差矩阵、因子表和因子暴露，
+然后连续请求 /api/generate-strategy（不调用大模型），统计端到端延迟的 p50 / p95 并检查是否在预算内
+
+用法:
+    python benchmark_strategy.py --universe sp500 --requests 60
+p95 超出预算时退出码为1
+"""
+
+import argparse
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+STYLES = ['value', 'growth', 'momentum', 'contrarian', 'lowVolatility']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='/api/generate-strategy 延迟基准（不含大模型调用）')
+    parser.add_argument('--universe', default='sp500', help='候选全集：sp500 / nasdaq100 / pools')
+    parser.add_argument('--requests', type=int, default=60, help='计时请求数（不含每种风格的首次请求）')
+    parser.add_argument('--budget-ms', type=float, default=2000, help='p95 延迟预算（毫秒）')
+    parser.add_argument('--app', default='app_with_deepseek', help='被测的 Flask 应用模块')
+    parser.add_argument('--data-dir', default=None, help='价格库等数据目录，默认使用临时目录并在结束后删除')
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float('nan')
+
+
+def main():
+    args = parse_args()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='strategy-bench-')
+
+    # 必须在导入应用之前设置：固定数据源、独立的数据目录、不调用大模型、不启动后台预热线程，
+    # 不物化备用策略快照（测量实时计算路径）
+    os.environ.update({
+        'MARKET_DATA_PROVIDER': 'fixture',
+        'PRICE_STORE_DIR': os.path.join(data_dir, 'price_store'),
+        'PRICE_PANEL_DIR': os.path.join(data_dir, 'price_panel'),
+        'FACTOR_EXPOSURE_DIR': os.path.join(data_dir, 'factor_exposures'),
+        'STRATEGY_SNAPSHOT_DIR': os.path.join(data_dir, 'strategy_snapshots'),
+        'STRATEGY_SNAPSHOT_UNIVERSES': '',
+        'WARM_INDEX_UNIVERSES': args.universe,
+        'STRATEGY_LATENCY_BUDGET_MS': str(args.budget_ms),
+        'CACHE_WARMER_ENABLED': '0',
+        'DEEPSEEK_API_KEY': ''
+    })
+
+    try:
+        app_module = importlib.import_module(args.app)
+        from cache_warmer import cache_warmer
+        from monte_carlo import monte_carlo_engine
+        from stock_pools import get_universe
+
+        print(f"🔥 预热 {args.universe}: {len(get_universe(args.universe))} 只成分股")
+        started = time.perf_counter()
+        status = cache_warmer.warm()
+        print(f"   预热耗时 {time.perf_counter() - started:.1f} 秒，状态 {status['state']}，失败任务 {status['failedTasks'] or '无'}")
+
+        client = app_module.app.test_client()
+
+        def request_once(i):
+            preferences = {
+                'tradingStyle': STYLES[i % len(STYLES)],
+                'universe': args.universe,
+                'investmentAmount': 100000,
+                'maxSinglePosition': 60,
+                'allowShortSelling': i % 2 == 1
+            }
+            start = time.perf_counter()
+            response = client.post('/api/generate-strategy', json={'preferences': preferences})
+            elapsed = (time.perf_counter() - start) * 1000
+            body = response.get_json()
+            if response.status_code != 200 or not body.get('success'):
+                raise RuntimeError(f"请求失败: {response.status_code} {body}")
+            return elapsed, body['data']
+
+        # 每种风格（多头 / 多空）的首次请求：优化器冷启动，单独统计
+        warmup = [request_once(i)[0] for i in range(2 * len(STYLES))]
+
+        latencies, stages = [], {}
+        candidates = []
+        slowest = (0.0, None)
+        for i in range(args.requests):
+            elapsed, data = request_once(i)
+            latencies.append(elapsed)
+            candidates.append(len(data['recommendations']))
+            for stage, ms in data['latency']['stages'].items():
+                stages.setdefault(stage, []).append(ms)
+            if elapsed > slowest[0]:
+                slowest = (elapsed, data['latency']['stages'])
+
+        p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+        print(f"\n📊 {args.universe}: {args.requests} 次请求，平均推荐 {np.mean(candidates):.1f} 只股票")
+        print(f"   首次请求（冷启动）: 最大 {max(warmup):.0f}ms")
+        print(f"   端到端延迟: p50 {p50:.0f}ms, p95 {p95:.0f}ms, 最大 {max(latencies):.0f}ms（预算 {args.budget_ms:.0f}ms）")
+        for stage, values in stages.items():
+            print(f"   - {stage}: p50 {percentile(values, 50):.1f}ms, p95 {percentile(values, 95):.1f}ms, 最大 {max(values):.1f}ms")
+        print(f"   最慢请求各阶段: {slowest[1]}")
+
+        monte_carlo_engine.shutdown()
+        within = p95 <= args.budget_ms
+        print(f"\n{'✅ p95 在预算内' if within else '❌ p95 超出预算'}")
+        return 0 if within else 1
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+后台缓存预热
+启动时以及每个美股交易日收盘后，预先拉取所有股票池的行情、发布共享价格面板并执行注册的预计算任务，
+让当天第一个请求与后续请求一样快
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from market_data import fetch_many, market_indices_snapshot, refresh_us_daily
+from price_panel import shared_panel
+from price_store import next_session_close
+from quote_snapshot import quote_snapshot
+from stock_pools import warm_symbols
+
+# 最近一轮预热失败的股票占比超过该值时视为未就绪
+MAX_FAILED_RATIO = float(os.getenv('CACHE_WARMER_MAX_FAILED_RATIO', 0.5))
+
+
+class CacheWarmer:
+    def __init__(self, symbols: List[str]):
+        """
+        初始化缓存预热器
+
+        Args:
+            symbols: 需要预热的股票列表
+        """
+        self.symbols = symbols
+        self._tasks: List[Tuple[str, Callable[[], Any]]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._state = {
+            "state": "idle",  # idle / warming / ready / degraded
+            "runs": 0,
+            "lastStartedAt": None,
+            "lastFinishedAt": None,
+            "lastDurationSeconds": None,
+            "nextRunAt": None,
+            "symbols": len(symbols),
+            "failedSymbols": [],
+            "failedTasks": []
+        }
+
+    def register_task(self, name: str, task: Callable[[], Any]) -> None:
+        """注册行情预热完成后执行的预计算任务（如历史表现、衍生指标）"""
+        with self._lock:
+            self._tasks.append((name, task))
+
+    def warm(self) -> Dict[str, Any]:
+        """同步执行一轮预热，返回本轮结果状态"""
+        started = time.time()
+        self._update(state="warming", lastStartedAt=datetime.now().isoformat(timespec='seconds'))
+        print(f"🔥 开始预热缓存: {len(self.symbols)} 只股票")
+
+        # 全市场快照和指数快照
+        quote_snapshot.refresh()
+        market_indices_snapshot.refresh()
+
+        # 股票池日线（写入本地价格库和进程内缓存）
+        results = fetch_many(self.symbols, refresh_us_daily, symbol_timeout=120, deadline=600)
+        failed_symbols = [item['symbol'] for item in results if item['error']]
+
+        # 发布跨进程共享价格面板（多个 worker 时只有一个进程执行）
+        try:
+            shared_panel.publish({item['symbol']: item['data'] for item in results
+                                  if item['error'] is None and item['data'] is not None and not item['data'].empty})
+        except Exception as e:
+            print(f"❌ 发布价格面板失败: {e}")
+
+        failed_tasks = []
+        with self._lock:
+            tasks = list(self._tasks)
+        for name, task in tasks:
+            try:
+                task()
+            except Exception as e:
+                print(f"❌ 预计算任务 {name} 失败: {e}")
+                failed_tasks.append(name)
+
+        duration = time.time() - started
+        state = "ready" if not failed_tasks and len(failed_symbols) <= MAX_FAILED_RATIO * max(1, len(self.symbols)) \
+            else "degraded"
+        self._update(
+            state=state,
+            runs=self._state["runs"] + 1,
+            lastFinishedAt=datetime.now().isoformat(timespec='seconds'),
+            lastDurationSeconds=round(duration, 1),
+            failedSymbols=failed_symbols,
+            failedTasks=failed_tasks
+        )
+        print(f"✅ 缓存预热完成: 耗时 {duration:.1f} 秒，失败股票 {failed_symbols or '无'}")
+        return self.status()
+
+    def start(self) -> None:
+        """启动后台预热线程：立即预热一次，之后在每个交易日收盘后预热（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run_forever, name='cache-warmer', daemon=True)
+        self._thread.start()
+
+    def status(self) -> Dict[str, Any]:
+        """返回预热状态（用于就绪检查）"""
+        with self._lock:
+            return dict(self._state)
+
+    def is_ready(self) -> bool:
+        """至少完成过一轮预热，且最近一轮失败的股票不超过 MAX_FAILED_RATIO"""
+        status = self.status()
+        if status["runs"] == 0:
+            return False
+        return len(status["failedSymbols"]) <= MAX_FAILED_RATIO * max(1, status["symbols"])
+
+    def _run_forever(self) -> None:
+        while True:
+            try:
+                self.warm()
+            except Exception as e:
+                print(f"❌ 缓存预热失败: {e}")
+                self._update(state="degraded", failedSymbols=list(self.symbols))
+
+            next_run = next_session_close()
+            self._update(nextRunAt=next_run.isoformat(timespec='seconds'))
+            time.sleep(max(60.0, (next_run - datetime.now(next_run.tzinfo)).total_seconds()))
+
+    def _update(self, **changes: Any) -> None:
+        with self._lock:
+            self._state.update(changes)
+
+
+# 进程级预热器，覆盖所有风格股票池和需要预热的指数成分股
+cache_warmer = CacheWarmer(warm_symbols())
+
+
+def start_cache_warmer() -> None:
+    """
+    按环境变量 CACHE_WARMER_ENABLED（默认开启）启动后台预热
+
+    只在提供服务的进程中调用（应用的 __main__ 入口或 WSGI 服务器的启动钩子），不要在模块导入时调用：
+    spawn 子进程和调试重载器的监视进程会重新导入应用模块，否则每个进程都会各自预热
+    """
+    if os.getenv('CACHE_WARMER_ENABLED', '1') == '1':
+        cache_warmer.start()
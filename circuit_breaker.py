@@ -0,0 +1,220 @@
+"""
+上游行情熔断器
+按接口和按股票两级熔断：连续失败后短路一段时间，冷却期结束放行单个探测请求（半开），
+探测成功恢复、失败重新熔断；返回空数据的股票（退市、代码错误）进入带 TTL 的负缓存。
+已知不可用的股票不再每次请求都等满上游超时
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+from market_data_cache import MarketDataCache
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断或负缓存命中时抛出，不访问上游"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60, max_reset_timeout: float = 3600):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断后首次允许探测的冷却时间（秒）
+            max_reset_timeout: 探测连续失败时冷却时间翻倍的上限（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._cooldown = reset_timeout
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def can_pass(self) -> bool:
+        """是否会放行请求（只检查，不占用半开探测名额）"""
+        with self._lock:
+            return self.state == CLOSED or time.monotonic() - self._opened_at >= self._cooldown
+
+    def allow(self) -> bool:
+        """是否放行本次请求；冷却期结束后只放行一个半开探测（探测未返回结果时，下一个冷却期后再放行一个）"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self._cooldown:
+                self.state = HALF_OPEN
+                self._opened_at = now
+                return True
+            return False
+
+    def release_probe(self) -> None:
+        """归还未实际发出的半开探测名额（恢复为冷却期已结束的熔断状态，下一个请求可立即探测）"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self._opened_at = time.monotonic() - self._cooldown
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.last_error = None
+            self._cooldown = self.reset_timeout
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN:
+                # 探测失败：重新熔断并延长冷却时间
+                self._cooldown = min(self._cooldown * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        """距离下一次允许探测的秒数"""
+        if self.state == CLOSED:
+            return 0.0
+        return max(0.0, self._cooldown - (time.monotonic() - self._opened_at))
+
+
+class UpstreamGuard:
+    def __init__(self,
+                 endpoint_threshold: int = 5,
+                 symbol_threshold: int = 2,
+                 reset_timeout: float = 60,
+                 negative_ttl: float = 3600):
+        """
+        初始化上游调用保护
+
+        Args:
+            endpoint_threshold: 接口级连续失败阈值（跨股票计数，判断数据源整体不可用）
+            symbol_threshold: 股票级连续失败阈值
+            reset_timeout: 熔断冷却时间（秒）
+            negative_ttl: 空数据股票的负缓存时间（秒）
+        """
+        self.endpoint_threshold = endpoint_threshold
+        self.symbol_threshold = symbol_threshold
+        self.reset_timeout = reset_timeout
+        self.negative_cache = MarketDataCache(ttl_seconds=negative_ttl, max_bytes=4 * 1024 * 1024)
+        self._breakers: Dict[Hashable, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.short_circuited = 0
+
+    def breaker(self, key: Hashable, threshold: int) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=self.reset_timeout)
+                self._breakers[key] = breaker
+            return breaker
+
+    def call(self, endpoint: str, symbol: Optional[str], fn: Callable[[], Any]) -> Any:
+        """
+        经熔断器调用上游
+
+        Args:
+            endpoint: 接口名（如 stock_us_daily）
+            symbol: 股票或指数代码，全市场接口传 None
+            fn: 实际访问上游的无参函数
+
+        Returns:
+            fn 的结果
+
+        Raises:
+            CircuitOpenError: 负缓存命中或熔断中，未访问上游
+        """
+        key = (endpoint, symbol)
+        negative = self.negative_cache.get(key)
+        if negative is not None:
+            self.short_circuited += 1
+            raise CircuitOpenError(f"{symbol or endpoint} 暂不可用（{negative}）")
+
+        endpoint_breaker = self.breaker((endpoint,), self.endpoint_threshold)
+        symbol_breaker = self.breaker(key, self.symbol_threshold) if symbol is not None else None
+        # 先无副作用地检查两级熔断器，确定会实际调用上游时才占用半开探测名额；
+        # 否则股票级拒绝时接口级的探测名额被白白占用，接口一直停留在半开状态
+        breakers = [breaker for breaker in (symbol_breaker, endpoint_breaker) if breaker is not None]
+        for breaker in breakers:
+            if not breaker.can_pass():
+                self._short_circuit(endpoint, symbol, breaker)
+        claimed = []
+        for breaker in breakers:
+            if not breaker.allow():
+                # 检查之后被并发请求抢先占用了探测名额
+                for other in claimed:
+                    other.release_probe()
+                self._short_circuit(endpoint, symbol, breaker)
+            claimed.append(breaker)
+
+        try:
+            result = fn()
+        except Exception as e:
+            endpoint_breaker.record_failure(str(e))
+            if symbol_breaker is not None:
+                symbol_breaker.record_failure(str(e))
+            raise
+
+        # 接口正常返回；空数据说明代码本身无效，只对该代码负缓存
+        endpoint_breaker.record_success()
+        if symbol_breaker is not None:
+            symbol_breaker.record_success()
+        if result is None or (isinstance(result, pd.DataFrame) and result.empty):
+            self.negative_cache.set(key, "无行情数据")
+        return result
+
+    def _short_circuit(self, endpoint: str, symbol: Optional[str], breaker: CircuitBreaker) -> None:
+        self.short_circuited += 1
+        raise CircuitOpenError(f"{symbol or endpoint} 已熔断，{breaker.retry_in():.0f} 秒后重试（{breaker.last_error}）")
+
+    def reset(self, symbol: Optional[str] = None) -> None:
+        """清除熔断状态和负缓存；指定 symbol 时只清除该代码"""
+        with self._lock:
+            if symbol is None:
+                self._breakers.clear()
+                self.negative_cache.invalidate()
+                return
+            for key in [key for key in self._breakers if len(key) == 2 and key[1] == symbol]:
+                del self._breakers[key]
+                self.negative_cache.invalidate(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回熔断统计：短路次数、负缓存条目、当前未闭合的熔断器"""
+        with self._lock:
+            tripped = {
+                '/'.join(str(part) for part in key): {"state": breaker.state, "failures": breaker.failures,
+                                                     "retryIn": round(breaker.retry_in(), 1)}
+                for key, breaker in self._breakers.items() if breaker.state != CLOSED
+            }
+        return {
+            "shortCircuited": self.short_circuited,
+            "negativeEntries": self.negative_cache.stats()["entries"],
+            "open": tripped
+        }
+
+
+# 进程级上游保护：所有数据源调用共用
+upstream_guard = UpstreamGuard(
+    endpoint_threshold=int(os.getenv('UPSTREAM_ENDPOINT_FAILURE_THRESHOLD', 5)),
+    symbol_threshold=int(os.getenv('UPSTREAM_SYMBOL_FAILURE_THRESHOLD', 2)),
+    reset_timeout=float(os.getenv('UPSTREAM_BREAKER_RESET_SECONDS', 60)),
+    negative_ttl=float(os.getenv('UPSTREAM_NEGATIVE_CACHE_TTL', 3600))
+)
@@ -0,0 +1,15 @@
+"""
+pytest 公共配置
+导入业务模块之前把本地存储目录指向临时目录、使用离线样例数据源并关闭后台预热，测试不读写 data/ 也不访问网络
+"""
+
+import os
+import tempfile
+
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix='stock_strategy_test_')
+
+os.environ['MARKET_DATA_PROVIDER'] = 'fixture'
+os.environ['CACHE_WARMER_ENABLED'] = '0'
+for _name, _subdir in (('PRICE_STORE_DIR', 'price_store'), ('PRICE_PANEL_DIR', 'price_panel'),
+                       ('FACTOR_EXPOSURE_DIR', 'factor_exposures'), ('STRATEGY_SNAPSHOT_DIR', 'strategy_snapshots')):
+    os.environ[_name] = os.path.join(_TEST_DATA_DIR, _subdir)
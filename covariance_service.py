@@ -0,0 +1,237 @@
+"""
+收缩协方差矩阵服务
+按（股票全集, 回看窗口, 截止日期）构建 Ledoit-Wolf 收缩协方差和相关系数矩阵并缓存；
+新交易日到来时用滑动窗口充分统计量增量更新，请求只需要子集时直接从全集矩阵切片
+"""
+
+import os
+import threading
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from market_data_cache import MarketDataCache
+from price_panel import load_close_panel
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+class CovarianceEstimate:
+    def __init__(self, symbols: List[str], covariance: np.ndarray, shrinkage: float, as_of: pd.Timestamp,
+                 window: int, mean: Optional[np.ndarray] = None):
+        """
+        初始化协方差估计结果
+
+        Args:
+            symbols: 股票代码（矩阵行列顺序）
+            covariance: 日收益率收缩协方差矩阵
+            shrinkage: Ledoit-Wolf 收缩强度（0~1）
+            as_of: 最后一个交易日
+            window: 回看的收益率个数
+            mean: 窗口内的日均收益率（与 symbols 对齐）
+        """
+        self.symbols = symbols
+        self.covariance = covariance
+        self.mean = mean if mean is not None else np.zeros(len(symbols))
+        self.shrinkage = shrinkage
+        self.as_of = as_of
+        self.window = window
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+
+    @property
+    def correlation(self) -> np.ndarray:
+        std = np.sqrt(np.diag(self.covariance))
+        return self.covariance / np.outer(std, std)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.covariance.nbytes + self.mean.nbytes)
+
+    def annualized(self) -> np.ndarray:
+        return self.covariance * TRADING_DAYS_PER_YEAR
+
+    def subset(self, symbols: List[str]) -> 'CovarianceEstimate':
+        """按股票子集切片（不重新估计；收缩强度沿用全集的估计）"""
+        missing = [symbol for symbol in symbols if symbol not in self._index]
+        if missing:
+            raise KeyError(f"协方差矩阵中没有这些股票: {missing}")
+        rows = [self._index[symbol] for symbol in symbols]
+        return CovarianceEstimate(list(symbols), self.covariance[np.ix_(rows, rows)], self.shrinkage,
+                                  self.as_of, self.window, self.mean[rows])
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+
+class RollingMoments:
+    def __init__(self, returns: np.ndarray, dates: pd.DatetimeIndex, symbols: List[str]):
+        """
+        初始化滑动窗口充分统计量
+
+        Args:
+            returns: 窗口内的日收益率矩阵（交易日 × 股票），缺失值按0处理
+            dates: 与 returns 行对应的交易日
+            symbols: 与 returns 列对应的股票代码
+        """
+        self.symbols = symbols
+        self.returns = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+        self.dates = dates
+        x = self.returns
+        squared_norms = (x ** 2).sum(axis=1)
+        self.sum_x = x.sum(axis=0)
+        self.sum_xx = x.T @ x
+        self.sum_norm2_x = squared_norms @ x
+        self.sum_norm4 = float((squared_norms ** 2).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.returns.nbytes + self.sum_xx.nbytes + self.sum_x.nbytes + self.sum_norm2_x.nbytes)
+
+    def roll(self, new_returns: np.ndarray, new_dates: pd.DatetimeIndex) -> None:
+        """新收益率进入窗口、最早的收益率离开窗口（每行 O(N²)，不重新扫描整个窗口）"""
+        new_returns = np.nan_to_num(np.asarray(new_returns, dtype=np.float64))
+        window = len(self.returns)
+        for x_in, x_out in zip(new_returns, self.returns[:len(new_returns)]):
+            in_norm2 = float(x_in @ x_in)
+            out_norm2 = float(x_out @ x_out)
+            self.sum_x += x_in - x_out
+            self.sum_xx += np.outer(x_in, x_in) - np.outer(x_out, x_out)
+            self.sum_norm2_x += in_norm2 * x_in - out_norm2 * x_out
+            self.sum_norm4 += in_norm2 ** 2 - out_norm2 ** 2
+        self.returns = np.vstack([self.returns, new_returns])[-window:]
+        self.dates = self.dates.append(new_dates)[-window:]
+
+    def ledoit_wolf(self) -> Tuple[np.ndarray, float]:
+        """
+        Ledoit-Wolf (2004) 收缩估计：向 μI 收缩的样本协方差
+
+        去均值后的各项和由充分统计量展开得到：
+        Σ‖x−m‖⁴ = Σ‖x‖⁴ − 4Σ‖x‖²xᵀm + 4mᵀ(Σxxᵀ)m + 2‖m‖²Σ‖x‖² − 4‖m‖²Σxᵀm + T‖m‖⁴
+        """
+        t, n = self.returns.shape
+        mean = self.sum_x / t
+        sample = self.sum_xx / t - np.outer(mean, mean)
+
+        mean_norm2 = float(mean @ mean)
+        centered_norm4 = (self.sum_norm4
+                          - 4 * float(self.sum_norm2_x @ mean)
+                          + 4 * float(mean @ self.sum_xx @ mean)
+                          + 2 * mean_norm2 * float(np.trace(self.sum_xx))
+                          - 4 * mean_norm2 * float(self.sum_x @ mean)
+                          + t * mean_norm2 ** 2)
+
+        mu = float(np.trace(sample)) / n
+        delta = float(((sample - mu * np.eye(n)) ** 2).sum()) / n
+        beta = max(centered_norm4 - t * float((sample ** 2).sum()), 0.0) / (n * t ** 2)
+        shrinkage = min(beta, delta) / delta if delta > 0 else 0.0
+
+        covariance = (1 - shrinkage) * sample
+        covariance[np.diag_indices(n)] += shrinkage * mu
+        return covariance, shrinkage
+
+
+class CovarianceService:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 24 * 3600,
+                 recheck_seconds: float = 300):
+        """
+        初始化协方差服务
+
+        Args:
+            max_bytes: 已估计矩阵（及滑动窗口统计量）的缓存字节预算，超出后按 LRU 淘汰
+            ttl_seconds: 已估计矩阵的缓存时间
+            recheck_seconds: 最新估计的复用时间，期间请求不再读取价格检查是否有新交易日
+        """
+        self.recheck_seconds = recheck_seconds
+        # 已估计矩阵按（全集, 窗口, 截止日期）缓存；最新估计另以（全集, 窗口, None）缓存 recheck_seconds，同受字节预算约束
+        self._estimates = MarketDataCache(ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+        self._moments = MarketDataCache(ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.rolls = 0
+
+    def get(self, symbols: List[str], window: int = TRADING_DAYS_PER_YEAR,
+            universe: Optional[List[str]] = None, as_of: Optional[str] = None) -> CovarianceEstimate:
+        """
+        获取股票的收缩协方差估计
+
+        Args:
+            symbols: 需要的股票代码
+            window: 回看的日收益率个数
+            universe: 估计所用的股票全集，同一全集的不同子集请求共用一次估计；
+                symbols 中有全集外的股票时只对 symbols 单独估计，不为少数股票重新估计整个全集
+            as_of: 截止日期（YYYY-MM-DD），None 表示最新交易日
+
+        Returns:
+            按 symbols 顺序切片的 CovarianceEstimate
+        """
+        base = sorted(set(universe or symbols))
+        if not set(symbols) <= set(base):
+            base = sorted(set(symbols))
+        estimate = self.estimate(base, window, as_of)
+        return estimate.subset([symbol for symbol in symbols if symbol in estimate])
+
+    def estimate(self, universe: List[str], window: int = TRADING_DAYS_PER_YEAR,
+                 as_of: Optional[str] = None) -> CovarianceEstimate:
+        """估计股票全集的收缩协方差（有价格数据的股票才会出现在结果中）"""
+        universe_key = tuple(universe)
+        moments_key = (universe_key, window)
+        latest_key = (universe_key, window, None)
+        if not as_of:
+            latest_estimate = self._estimates.get(latest_key)
+            if latest_estimate is not None:
+                return latest_estimate
+
+        panel, _ = load_close_panel(list(universe), None if as_of else window + 1)
+        if as_of:
+            panel = panel.loc[:pd.Timestamp(as_of)].tail(window + 1)
+        panel = panel.dropna(axis=1, how='all')
+        if len(panel) < 3 or panel.shape[1] == 0:
+            raise ValueError("价格数据不足，无法估计协方差")
+
+        latest = panel.index[-1]
+        key = (universe_key, window, latest.strftime('%Y-%m-%d'))
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            estimate = self._build(panel, moments_key, key, rolling=not as_of)
+        if not as_of:
+            self._estimates.set(latest_key, estimate, ttl_seconds=self.recheck_seconds)
+        return estimate
+
+    def _build(self, panel: pd.DataFrame, moments_key: Hashable, key: Hashable, rolling: bool) -> CovarianceEstimate:
+        returns = panel.pct_change().iloc[1:]
+        symbols = list(panel.columns)
+        latest = panel.index[-1]
+
+        with self._lock:
+            moments = self._moments.get(moments_key) if rolling else None
+            reusable = (moments is not None and moments.symbols == symbols
+                        and moments.dates[-1] in returns.index and moments.dates[-1] < latest
+                        and len(moments.returns) == len(returns))
+            if reusable:
+                new_rows = returns.loc[returns.index > moments.dates[-1]]
+                moments.roll(new_rows.to_numpy(), new_rows.index)
+                self.rolls += 1
+            else:
+                moments = RollingMoments(returns.to_numpy(), returns.index, symbols)
+                self.builds += 1
+            if rolling:
+                self._moments.set(moments_key, moments)
+
+            covariance, shrinkage = moments.ledoit_wolf()
+            mean = moments.sum_x / len(moments.returns)
+
+        estimate = CovarianceEstimate(symbols, covariance, shrinkage, latest, len(returns), mean)
+        self._estimates.set(key, estimate)
+        return estimate
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存和增量更新统计"""
+        return {**self._estimates.stats(), "builds": self.builds, "rolls": self.rolls,
+                "rollingWindows": self._moments.stats()["entries"]}
+
+
+# 进程级协方差服务
+covariance_service = CovarianceService(
+    max_bytes=int(float(os.getenv('COVARIANCE_CACHE_MAX_MB', 64)) * 1024 * 1024)
+)
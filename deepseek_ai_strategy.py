@@ -3,6 +3,11 @@ import json
 from typing import Dict, List, Any
 import os
 
+from portfolio_optimizer import portfolio_optimizer
+
+# DeepSeek 接口超时（秒）；超时后回退到优化器生成的备用策略
+LLM_TIMEOUT_SECONDS = float(os.getenv('DEEPSEEK_TIMEOUT_SECONDS', 60))
+
 class DeepSeekAIStrategy:
     def __init__(self, api_key: str = None):
         """
@@ -202,7 +207,7 @@ class DeepSeekAIStrategy:
             "max_tokens": 3000
         }
         
-        response = requests.post(self.base_url, headers=headers, json=data, timeout=60)
+        response = requests.post(self.base_url, headers=headers, json=data, timeout=LLM_TIMEOUT_SECONDS)
         response.raise_for_status()
         
         result = response.json()
@@ -235,92 +240,40 @@ class DeepSeekAIStrategy:
         # 获取组合仓位占比
         portfolio_position_ratio = preferences.get('maxSinglePosition', 20) / 100
         
-        # 根据交易风格确定基础权重分配
-        if trading_style == 'value':
-            base_weights = [0.30, 0.25, 0.20, 0.15, 0.10]
-        elif trading_style == 'growth':
-            base_weights = [0.35, 0.25, 0.20, 0.12, 0.08]
-        elif trading_style == 'momentum':
-            base_weights = [0.25, 0.25, 0.20, 0.15, 0.15]
-        else:
-            base_weights = [0.20, 0.20, 0.20, 0.20, 0.20]
+        # 按交易风格在约束下优化目标权重（单标、行业上限，总仓位 = 组合仓位占比）
+        optimization = portfolio_optimizer.allocate(
+            [stock['symbol'] for stock in stock_data],
+            trading_style,
+            portfolio_position_ratio,
+            allow_short=allow_short,
+            mode=preferences.get('optimizationMode'),
+            universe=preferences.get('universe')
+        )
+        investment_amount = preferences.get('investmentAmount', 100000)
         
         selected_stocks = []
-        
-        # 多空策略需要特殊处理仓位分配
-        if allow_short:
-            # 多空策略：确保总仓位等于用户设定的组合仓位占比
-            # 将权重重新分配，确保多头+空头的绝对值 = 总仓位占比
-            
-            # 分配策略：前3只做多，后2只做空
-            long_base_weights = base_weights[:3]  # 前3只的权重
-            short_base_weights = base_weights[3:5]  # 后2只的权重
-            
-            # 计算基础权重总和
-            long_base_sum = sum(long_base_weights)
-            short_base_sum = sum(short_base_weights)
-            total_base_sum = long_base_sum + short_base_sum
-            
-            # 按比例分配到总仓位
-            long_weights = [w / total_base_sum for w in long_base_weights]
-            short_weights = [w / total_base_sum for w in short_base_weights]
+        for stock in stock_data:
+            weight = optimization['weights'].get(stock['symbol'], 0)
+            allocation_percent = abs(weight) * 100
+            if allocation_percent < 0.01:
+                continue
             
-            # 处理做多仓位
-            for i, stock in enumerate(stock_data[:3]):
-                if i < len(long_weights):
-                    allocation_percent = long_weights[i] * portfolio_position_ratio * 100
-                    investment_amount = preferences.get('investmentAmount', 100000)
-                    
-                    selected_stocks.append({
-                        "symbol": stock['symbol'],
-                        "position": "LONG",
-                        "allocation": allocation_percent,
-                        "shares": int(investment_amount * allocation_percent / 100 / stock.get('currentPrice', 100)),
-                        "rationale": f"基于{trading_style}投资风格选择的多头标的，预期上涨",
-                        "riskMetrics": {
-                            "beta": "1.0",
-                            "volatility": "20%",
-                            "maxDrawdown": "15%"
-                        }
-                    })
+            position = "SHORT" if weight < 0 else "LONG"
+            if position == "SHORT":
+                rationale = f"基于{trading_style}投资风格选择的空头标的，预期下跌"
+            elif allow_short:
+                rationale = f"基于{trading_style}投资风格选择的多头标的，预期上涨"
+            else:
+                rationale = f"基于{trading_style}投资风格选择的多头标的"
             
-            # 处理做空仓位
-            for i, stock in enumerate(stock_data[3:5]):
-                if i < len(short_weights):
-                    allocation_percent = short_weights[i] * portfolio_position_ratio * 100
-                    investment_amount = preferences.get('investmentAmount', 100000)
-                    
-                    selected_stocks.append({
-                        "symbol": stock['symbol'],
-                        "position": "SHORT",
-                        "allocation": allocation_percent,
-                        "shares": int(investment_amount * allocation_percent / 100 / stock.get('currentPrice', 100)),
-                        "rationale": f"基于{trading_style}投资风格选择的空头标的，预期下跌",
-                        "riskMetrics": {
-                            "beta": "-1.0",
-                            "volatility": "25%",
-                            "maxDrawdown": "20%"
-                        }
-                    })
-        else:
-            # 仅做多策略：正常分配
-            for i, stock in enumerate(stock_data[:5]):
-                if i < len(base_weights):
-                    allocation_percent = base_weights[i] * portfolio_position_ratio * 100
-                    investment_amount = preferences.get('investmentAmount', 100000)
-                    
-                    selected_stocks.append({
-                        "symbol": stock['symbol'],
-                        "position": "LONG",
-                        "allocation": allocation_percent,
-                        "shares": int(investment_amount * allocation_percent / 100 / stock.get('currentPrice', 100)),
-                        "rationale": f"基于{trading_style}投资风格选择的多头标的",
-                        "riskMetrics": {
-                            "beta": "1.0",
-                            "volatility": "20%",
-                            "maxDrawdown": "15%"
-                        }
-                    })
+            selected_stocks.append({
+                "symbol": stock['symbol'],
+                "position": position,
+                "allocation": allocation_percent,
+                "shares": int(investment_amount * allocation_percent / 100 / stock.get('currentPrice', 100)),
+                "rationale": rationale,
+                "riskMetrics": {}  # 由 risk_engine 按实际行情计算
+            })
         
         # 计算总仓位（多头+空头的绝对值）
         total_allocation = sum([abs(stock['allocation']) for stock in selected_stocks])
@@ -360,9 +313,9 @@ class DeepSeekAIStrategy:
             "expectedMetrics": {
                 "annualizedReturn": "12-15%",
                 "sharpeRatio": "1.2-1.5",
-                "maxDrawdown": f"{preferences.get('maxDrawdown', 20)}%",
-                "var95": "5-6%"
-            }
+                "maxDrawdown": f"{preferences.get('maxDrawdown', 20)}%"
+            },
+            "optimization": optimization
         }
 
 # 使用示例
@@ -498,6 +451,7 @@ def integrate_deepseek_strategy(preferences: Dict, market_data: List, stock_data
             "strategyInsights": backup_analysis.get('executionStrategy', ''),
             "scenarioAnalysis": backup_analysis.get('scenarioAnalysis', {}),
             "expectedMetrics": backup_analysis.get('expectedMetrics', {}),
+            "optimization": backup_analysis.get('optimization'),
             "aiPowered": False,
             "professionalGrade": True
         }
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+图表序列降采样
+Largest-Triangle-Three-Buckets（LTTB）：把长序列压缩到目标点数，同时保留峰谷等视觉形状，
+使历史曲线的响应大小与时间跨度无关
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+def max_drawdown_points(cumulative: np.ndarray) -> Optional[tuple]:
+    """
+    最大回撤的起点（前高）和终点（谷底）位置
+
+    Args:
+        cumulative: 累计收益率序列（百分比）
+
+    Returns:
+        (前高位置, 谷底位置)，序列没有回撤时返回 None
+    """
+    nav = 1 + np.nan_to_num(np.asarray(cumulative, dtype=np.float64)) / 100
+    peaks = np.maximum.accumulate(nav)
+    drawdowns = nav / np.where(peaks > 0, peaks, 1) - 1
+    trough = int(np.argmin(drawdowns))
+    if drawdowns[trough] >= 0:
+        return None
+    return int(np.argmax(nav[:trough + 1])), trough
+
+
+def lttb_indices(values: np.ndarray, target: int, keep_drawdown: bool = True) -> np.ndarray:
+    """
+    用 LTTB 选出保留的采样点位置
+
+    首尾两点固定保留，中间的点均分为 target-2 个桶，每个桶选出与前一个已选点、
+    下一个桶均值构成三角形面积最大的点
+
+    Args:
+        values: 按时间排序的序列（x 轴为等间距的采样序号）
+        target: 目标点数，不小于序列长度时原样返回
+        keep_drawdown: 是否强制保留最大回撤的前高和谷底（把 values 视为累计收益率百分比），
+            保证降采样后的曲线与原序列的最大回撤一致
+
+    Returns:
+        升序排列的位置数组，长度不超过 target
+    """
+    y = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    n = len(y)
+    if target >= n or target < 3:
+        return np.arange(n)
+
+    # 强制保留的点占用桶的名额（目标点数太少时不再强制保留）
+    forced = max_drawdown_points(y) if keep_drawdown else None
+    if forced and target - 2 - len(set(forced)) < 1:
+        forced = None
+    buckets = target - 2 - (len(set(forced)) if forced else 0)
+
+    # 桶边界：中间的 n-2 个点均分为 buckets 个桶（每个桶至少一个点）
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    x = np.arange(n, dtype=np.float64)
+    selected = [0]
+    a = 0
+    for i in range(buckets):
+        start, end = edges[i], edges[i + 1]
+        if i + 1 < buckets:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+    selected.append(n - 1)
+
+    if forced:
+        selected.extend(forced)
+    return np.unique(np.asarray(selected, dtype=np.int64))
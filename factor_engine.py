@@ -0,0 +1,281 @@
+"""
+Barra 风格因子暴露引擎
+每日一次在收盘价矩阵上批量计算市场、规模、价值、动量、低波动因子：
+风格因子暴露为每日横截面标准化的特征值，因子收益由逐日横截面回归（批量求解正规方程）得到，
+市场暴露为相对标普500的 Beta；结果持久化到磁盘，任意推荐组合的因子暴露只需一次矩阵-向量乘法
+"""
+
+import glob
+import os
+import threading
+import time
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from market_data import get_us_index_history
+from market_data_cache import RefreshingSnapshot
+from price_panel import load_close_panel
+from price_store import price_store
+from risk_engine import BENCHMARK_SYMBOL, masked_beta
+from screening import factor_table_snapshot
+
+FACTORS = ['market', 'size', 'value', 'momentum', 'lowVolatility']
+STYLE_FACTORS = FACTORS[1:]
+
+# 策略提示词中的风格因子暴露约束 |β| ≤ 0.6（市场暴露只报告，不约束）
+MAX_FACTOR_EXPOSURE = float(os.getenv('MAX_FACTOR_EXPOSURE', 0.6))
+
+# 回看窗口：收盘价矩阵长度；动量为12-1个月收益，低波动为63日收益率标准差取负，价值为距52周高点的跌幅
+PANEL_DAYS = 504
+MOMENTUM_LAG, MOMENTUM_SKIP = 252, 21
+VOLATILITY_WINDOW = 63
+HIGH_WINDOW = 252
+WINSOR_LIMIT = 3.0
+MIN_HISTORY_DAYS = 63
+
+
+def _standardize(values: np.ndarray) -> np.ndarray:
+    """逐日横截面标准化（缩尾到 ±3），缺失值记为0（中性暴露）"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(values, axis=1, keepdims=True)
+        std = np.nanstd(values, axis=1, keepdims=True)
+        z = np.where(std > 0, (values - mean) / std, 0.0)
+    return np.nan_to_num(np.clip(z, -WINSOR_LIMIT, WINSOR_LIMIT))
+
+
+def style_characteristics(panel: pd.DataFrame, shares: Optional[pd.Series] = None) -> Dict[str, np.ndarray]:
+    """
+    计算每日风格特征（交易日 × 股票，未标准化）
+
+    Args:
+        panel: 收盘价矩阵
+        shares: 以股票代码为索引的总股本（由市值/价格推算），None 或缺失时规模特征为 NaN
+    """
+    returns = panel.pct_change(fill_method=None)
+    shares = (shares.reindex(panel.columns) if shares is not None
+              else pd.Series(np.nan, index=panel.columns)).to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        size = np.log(panel.to_numpy() * shares)
+    return {
+        "size": size,
+        "value": (1 - panel / panel.rolling(HIGH_WINDOW, min_periods=MIN_HISTORY_DAYS).max()).to_numpy(),
+        "momentum": (panel.shift(MOMENTUM_SKIP) / panel.shift(MOMENTUM_LAG) - 1).to_numpy(),
+        "lowVolatility": -returns.rolling(VOLATILITY_WINDOW, min_periods=MIN_HISTORY_DAYS // 2).std().to_numpy()
+    }
+
+
+def cross_sectional_regression(returns: np.ndarray, exposures: np.ndarray) -> np.ndarray:
+    """
+    逐日横截面回归 r_t = f_t,0 + Σ_k X_{t−1,k} f_t,k，所有交易日一次批量求解正规方程
+
+    Args:
+        returns: 交易日 × 股票 的日收益率（缺失为 NaN，不参与当日回归）
+        exposures: 交易日 × 股票 × 风格因子 的前一交易日标准化暴露
+
+    Returns:
+        交易日 × (1 + 风格因子数) 的因子收益率（第0列为截距，即等权市场收益），有效股票不足的交易日为 NaN
+    """
+    t, n, k = exposures.shape
+    design = np.concatenate([np.ones((t, n, 1)), exposures], axis=2)
+    mask = ~np.isnan(returns)
+    y = np.where(mask, returns, 0.0)
+    weighted = design * mask[:, :, None]
+    xtx = np.einsum('tnk,tnl->tkl', weighted, design)
+    xty = np.einsum('tnk,tn->tk', weighted, y)
+    # 伪逆：某个风格因子当日全为0（如缺少市值数据）时不影响其他因子
+    factor_returns = (np.linalg.pinv(xtx) @ xty[:, :, None])[:, :, 0]
+    factor_returns[mask.sum(axis=1) < k + 2] = np.nan
+    return factor_returns
+
+
+class FactorExposures:
+    def __init__(self, symbols: List[str], exposures: np.ndarray, factor_returns: np.ndarray,
+                 dates: pd.DatetimeIndex, as_of: str):
+        """
+        初始化因子暴露结果
+
+        Args:
+            symbols: 股票代码
+            exposures: 股票 × FACTORS 暴露矩阵（市场为 Beta，风格为标准化特征）
+            factor_returns: 交易日 × FACTORS 因子日收益率（市场列为横截面回归截距）
+            dates: 因子收益率对应的交易日
+            as_of: 暴露对应的最后交易日
+        """
+        self.symbols = list(symbols)
+        self.exposures = exposures
+        self.factor_returns = factor_returns
+        self.dates = dates
+        self.as_of = as_of
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def matrix(self, symbols: List[str], factors: List[str] = FACTORS) -> np.ndarray:
+        """按股票顺序取暴露矩阵的行（未覆盖的股票暴露为0）"""
+        columns = [FACTORS.index(factor) for factor in factors]
+        result = np.zeros((len(symbols), len(columns)))
+        for row, symbol in enumerate(symbols):
+            i = self._index.get(symbol)
+            if i is not None:
+                result[row] = self.exposures[i, columns]
+        return result
+
+    def portfolio(self, weights: Dict[str, float]) -> Dict[str, float]:
+        """组合因子暴露 = 暴露矩阵ᵀ · 带符号权重"""
+        symbols = list(weights)
+        values = self.matrix(symbols).T @ np.array([weights[symbol] for symbol in symbols])
+        return {factor: float(value) for factor, value in zip(FACTORS, values)}
+
+    def factor_volatility(self) -> Dict[str, float]:
+        """各因子收益率的年化波动率"""
+        with np.errstate(invalid='ignore'):
+            std = np.nanstd(self.factor_returns, axis=0, ddof=1) * np.sqrt(252)
+        return {factor: float(value) for factor, value in zip(FACTORS, std)}
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, symbols=np.array(self.symbols, dtype=str), exposures=self.exposures,
+                 factor_returns=self.factor_returns, dates=self.dates.values.astype('datetime64[D]').astype(np.int64),
+                 as_of=np.array(self.as_of))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'FactorExposures':
+        with np.load(path) as data:
+            return cls(data['symbols'].tolist(), data['exposures'], data['factor_returns'],
+                       pd.DatetimeIndex(data['dates'].astype('datetime64[D]')), str(data['as_of']))
+
+
+def compute_exposures(panel: pd.DataFrame,
+                      benchmark: Optional[pd.Series] = None,
+                      shares: Optional[pd.Series] = None) -> FactorExposures:
+    """
+    在收盘价矩阵上批量计算因子暴露和因子收益
+
+    Args:
+        panel: 交易日 × 股票 收盘价矩阵
+        benchmark: 以日期为索引的基准收盘价，None 时以横截面回归截距（等权市场）计算 Beta
+        shares: 以股票代码为索引的总股本，用于规模因子
+
+    Returns:
+        FactorExposures（暴露取最后一个交易日）
+    """
+    panel = panel.loc[:, panel.notna().sum() >= MIN_HISTORY_DAYS]
+    if panel.shape[1] < len(FACTORS) + 2:
+        raise ValueError("历史数据足够的股票太少，无法做横截面回归")
+
+    characteristics = style_characteristics(panel, shares)
+    z = np.stack([_standardize(characteristics[factor]) for factor in STYLE_FACTORS], axis=2)
+    returns = panel.pct_change(fill_method=None).to_numpy()[1:]
+    factor_returns = cross_sectional_regression(returns, z[:-1])
+
+    if benchmark is not None and not benchmark.empty:
+        aligned = benchmark.reindex(panel.index).ffill().to_numpy(dtype=np.float64)
+        market_returns = aligned[1:] / aligned[:-1] - 1
+    else:
+        market_returns = factor_returns[:, 0]
+    window = slice(-(HIGH_WINDOW - 1), None)
+    beta = np.nan_to_num(masked_beta(returns[window], market_returns[window]), nan=1.0)
+
+    exposures = np.column_stack([beta, z[-1]])
+    return FactorExposures(list(panel.columns), exposures, factor_returns, panel.index[1:],
+                           panel.index[-1].strftime('%Y-%m-%d'))
+
+
+class FactorEngine:
+    def __init__(self, root_dir: str):
+        """
+        初始化因子引擎
+
+        Args:
+            root_dir: 持久化目录，每个交易日一个 exposures_<YYYY-MM-DD>.npz
+        """
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _path(self, as_of: str) -> str:
+        return os.path.join(self.root_dir, f"exposures_{as_of}.npz")
+
+    def load_latest(self) -> Optional[FactorExposures]:
+        """读取最近一次持久化的结果"""
+        paths = sorted(glob.glob(os.path.join(self.root_dir, 'exposures_*.npz')))
+        for path in reversed(paths):
+            try:
+                return FactorExposures.load(path)
+            except Exception as e:
+                print(f"⚠️  读取因子暴露文件失败 {path}: {e}")
+        return None
+
+    def load_or_compute(self) -> Optional[FactorExposures]:
+        """价格库有新交易日时重新计算并持久化，否则读取已有结果（每个交易日只计算一次）"""
+        store_factors = price_store.universe_factors()
+        if not store_factors:
+            return self.load_latest()
+        latest_date = max(factors['lastDate'] for factors in store_factors.values())
+        if os.path.exists(self._path(latest_date)):
+            return FactorExposures.load(self._path(latest_date))
+
+        started = time.time()
+        panel, _ = load_close_panel(sorted(store_factors), PANEL_DAYS)
+        if panel.empty:
+            return self.load_latest()
+
+        try:
+            index_df = get_us_index_history(BENCHMARK_SYMBOL)
+            benchmark = index_df.set_index('date')['close'] if index_df is not None and not index_df.empty else None
+        except Exception as e:
+            print(f"⚠️  获取基准指数失败，Beta 相对等权市场计算: {e}")
+            benchmark = None
+
+        table = factor_table_snapshot.peek()
+        shares = None
+        if table is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                shares = pd.Series(table.columns['marketCap'] / table.columns['price'], index=table.symbols).dropna()
+
+        result = compute_exposures(panel, benchmark, shares)
+        result.save(self._path(result.as_of))
+        print(f"📐 因子暴露已更新: {len(result)} 只股票，截至 {result.as_of}，耗时 {time.time() - started:.1f} 秒")
+        return result
+
+
+# 进程共享的因子引擎（多个 worker 进程读取同一份持久化结果）
+factor_engine = FactorEngine(
+    os.getenv('FACTOR_EXPOSURE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'factor_exposures'))
+)
+
+# 进程内的最新因子暴露：后台加载，默认每小时检查一次价格库是否有新交易日
+factor_exposure_snapshot = RefreshingSnapshot(
+    factor_engine.load_or_compute,
+    ttl_seconds=float(os.getenv('FACTOR_EXPOSURE_TTL', 3600)),
+    max_stale_seconds=float(os.getenv('FACTOR_EXPOSURE_MAX_STALE', 3 * 24 * 3600))
+)
+
+
+def attach_factor_exposures(recommendations: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    计算推荐组合的因子暴露并检查 |β| ≤ MAX_FACTOR_EXPOSURE（不阻塞请求：因子暴露尚未计算时返回 None）
+
+    Returns:
+        {"exposures": {因子: 暴露}, "limit", "breaches": 超限的风格因子, "asOf"}
+    """
+    exposures = factor_exposure_snapshot.peek()
+    if exposures is None or not recommendations:
+        return None
+
+    weights: Dict[str, float] = {}
+    for r in recommendations:
+        sign = -1 if r.get('position') == 'SHORT' else 1
+        weights[r['symbol']] = weights.get(r['symbol'], 0.0) + sign * r['allocation'] / 100
+    portfolio = exposures.portfolio(weights)
+    return {
+        "exposures": {factor: round(value, 4) for factor, value in portfolio.items()},
+        "limit": MAX_FACTOR_EXPOSURE,
+        "breaches": [factor for factor in STYLE_FACTORS if abs(portfolio[factor]) > MAX_FACTOR_EXPOSURE],
+        "asOf": exposures.as_of
+    }
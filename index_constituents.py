@@ -0,0 +1,109 @@
+"""
+指数成分股
+标普500、纳斯达克100 的成分股快照（2024年末）及其 GICS 一级行业，
+指数调整成分后需同步更新本文件
+"""
+
+from typing import Dict, List
+
+# 标普500 成分股（按 GICS 一级行业分组）
+SP500_BY_SECTOR = {
+    'Information Technology': [
+        'AAPL', 'MSFT', 'NVDA', 'AVGO', 'ORCL', 'CRM', 'ADBE', 'AMD', 'ACN', 'CSCO', 'IBM', 'INTU', 'NOW',
+        'TXN', 'QCOM', 'AMAT', 'MU', 'ADI', 'LRCX', 'KLAC', 'PANW', 'ANET', 'SNPS', 'CDNS', 'INTC', 'APH',
+        'MSI', 'ROP', 'NXPI', 'ADSK', 'FTNT', 'MCHP', 'TEL', 'IT', 'FICO', 'CTSH', 'GLW', 'HPQ', 'ON',
+        'MPWR', 'KEYS', 'CDW', 'HPE', 'ANSS', 'TYL', 'FSLR', 'NTAP', 'TER', 'PTC', 'WDC', 'STX', 'ZBRA',
+        'TDY', 'GDDY', 'SMCI', 'VRSN', 'TRMB', 'SWKS', 'GEN', 'AKAM', 'JBL', 'FFIV', 'EPAM', 'ENPH',
+        'JNPR', 'QRVO', 'PLTR', 'CRWD', 'DELL'
+    ],
+    'Communication Services': [
+        'GOOGL', 'GOOG', 'META', 'NFLX', 'DIS', 'CMCSA', 'T', 'VZ', 'TMUS', 'CHTR', 'EA', 'TTWO', 'WBD',
+        'OMC', 'IPG', 'LYV', 'MTCH', 'FOXA', 'FOX', 'NWSA', 'NWS', 'PARA'
+    ],
+    'Consumer Discretionary': [
+        'AMZN', 'TSLA', 'HD', 'MCD', 'LOW', 'BKNG', 'TJX', 'SBUX', 'NKE', 'CMG', 'ORLY', 'AZO', 'MAR',
+        'HLT', 'ABNB', 'GM', 'F', 'ROST', 'DHI', 'LEN', 'YUM', 'RCL', 'LULU', 'EBAY', 'TSCO', 'GRMN',
+        'NVR', 'PHM', 'DRI', 'CCL', 'EXPE', 'ULTA', 'GPC', 'LVS', 'BBY', 'POOL', 'KMX', 'DPZ', 'APTV',
+        'LKQ', 'HAS', 'WYNN', 'MGM', 'CZR', 'TPR', 'RL', 'NCLH', 'BWA', 'MHK', 'DECK'
+    ],
+    'Consumer Staples': [
+        'WMT', 'PG', 'COST', 'KO', 'PEP', 'PM', 'MO', 'MDLZ', 'CL', 'TGT', 'KMB', 'GIS', 'KDP', 'STZ',
+        'SYY', 'KR', 'MNST', 'HSY', 'KHC', 'ADM', 'DG', 'DLTR', 'EL', 'CHD', 'CLX', 'MKC', 'TSN', 'K',
+        'CAG', 'SJM', 'HRL', 'BG', 'LW', 'CPB', 'TAP', 'BF-B', 'KVUE', 'WBA'
+    ],
+    'Financials': [
+        'BRK-B', 'JPM', 'V', 'MA', 'BAC', 'WFC', 'GS', 'MS', 'SPGI', 'AXP', 'C', 'BLK', 'SCHW', 'PGR',
+        'CB', 'MMC', 'BX', 'ICE', 'CME', 'PYPL', 'AON', 'USB', 'PNC', 'MCO', 'AJG', 'COF', 'TFC', 'AIG',
+        'MET', 'AFL', 'TRV', 'ALL', 'PRU', 'MSCI', 'BK', 'AMP', 'FIS', 'DFS', 'ACGL', 'HIG', 'WTW',
+        'FITB', 'MTB', 'STT', 'RJF', 'TROW', 'NDAQ', 'BRO', 'HBAN', 'RF', 'SYF', 'CINF', 'CFG', 'NTRS',
+        'KEY', 'WRB', 'FDS', 'PFG', 'CBOE', 'L', 'EG', 'GPN', 'JKHY', 'MKTX', 'AIZ', 'GL', 'BEN', 'IVZ',
+        'KKR', 'ERIE', 'FI', 'CPAY'
+    ],
+    'Health Care': [
+        'LLY', 'UNH', 'JNJ', 'ABBV', 'MRK', 'TMO', 'ABT', 'DHR', 'PFE', 'AMGN', 'ISRG', 'SYK', 'ELV',
+        'BSX', 'VRTX', 'MDT', 'GILD', 'REGN', 'CI', 'BMY', 'ZTS', 'CVS', 'MCK', 'HCA', 'BDX', 'EW', 'COR',
+        'IDXX', 'A', 'IQV', 'HUM', 'GEHC', 'DXCM', 'CNC', 'RMD', 'MTD', 'BIIB', 'CAH', 'WST', 'ZBH',
+        'STE', 'MRNA', 'BAX', 'COO', 'HOLX', 'LH', 'DGX', 'WAT', 'ALGN', 'MOH', 'PODD', 'TECH', 'CRL',
+        'VTRS', 'INCY', 'UHS', 'HSIC', 'SOLV', 'RVTY', 'DVA', 'CTLT', 'BIO', 'TFX'
+    ],
+    'Industrials': [
+        'GE', 'CAT', 'RTX', 'UNP', 'HON', 'ETN', 'UBER', 'LMT', 'BA', 'ADP', 'DE', 'UPS', 'WM', 'PH',
+        'TT', 'GD', 'ITW', 'TDG', 'NOC', 'CTAS', 'EMR', 'MMM', 'CSX', 'FDX', 'CARR', 'PCAR', 'NSC', 'JCI',
+        'GWW', 'URI', 'CPRT', 'PAYX', 'CMI', 'OTIS', 'FAST', 'AME', 'RSG', 'PWR', 'VRSK', 'ODFL', 'IR',
+        'HWM', 'EFX', 'XYL', 'DAL', 'ROK', 'GEV', 'WAB', 'AXON', 'DOV', 'VLTO', 'BR', 'FTV', 'HUBB',
+        'LDOS', 'BLDR', 'LUV', 'EXPD', 'J', 'UAL', 'TXT', 'MAS', 'PNR', 'SNA', 'IEX', 'NDSN', 'JBHT',
+        'CHRW', 'ALLE', 'AOS', 'SWK', 'HII', 'GNRC', 'DAY', 'PAYC', 'RHI'
+    ],
+    'Energy': [
+        'XOM', 'CVX', 'COP', 'EOG', 'SLB', 'PSX', 'MPC', 'WMB', 'OKE', 'OXY', 'VLO', 'KMI', 'HES', 'BKR',
+        'FANG', 'TRGP', 'DVN', 'HAL', 'CTRA', 'EQT', 'MRO', 'APA'
+    ],
+    'Materials': [
+        'LIN', 'SHW', 'APD', 'ECL', 'FCX', 'NEM', 'CTVA', 'DOW', 'NUE', 'DD', 'PPG', 'MLM', 'VMC', 'IFF',
+        'LYB', 'SW', 'STLD', 'PKG', 'BALL', 'IP', 'AVY', 'AMCR', 'CF', 'MOS', 'CE', 'EMN', 'ALB'
+    ],
+    'Real Estate': [
+        'PLD', 'AMT', 'EQIX', 'WELL', 'SPG', 'O', 'PSA', 'CCI', 'DLR', 'EXR', 'VICI', 'AVB', 'CBRE',
+        'CSGP', 'IRM', 'EQR', 'VTR', 'SBAC', 'WY', 'INVH', 'ARE', 'ESS', 'MAA', 'KIM', 'DOC', 'UDR', 'CPT',
+        'HST', 'REG', 'BXP', 'FRT'
+    ],
+    'Utilities': [
+        'NEE', 'SO', 'DUK', 'CEG', 'AEP', 'SRE', 'D', 'PCG', 'EXC', 'XEL', 'PEG', 'ED', 'VST', 'EIX',
+        'WEC', 'ETR', 'DTE', 'AWK', 'PPL', 'FE', 'AEE', 'ES', 'CNP', 'ATO', 'CMS', 'NRG', 'LNT', 'NI',
+        'EVRG', 'PNW', 'AES'
+    ]
+}
+
+# 纳斯达克100 中不属于标普500 的成分股
+NASDAQ100_EXTRA_SECTORS = {
+    'ASML': 'Information Technology', 'ARM': 'Information Technology', 'MRVL': 'Information Technology',
+    'WDAY': 'Information Technology', 'DDOG': 'Information Technology', 'TEAM': 'Information Technology',
+    'ZS': 'Information Technology', 'GFS': 'Information Technology', 'MDB': 'Information Technology',
+    'PDD': 'Consumer Discretionary', 'MELI': 'Consumer Discretionary', 'DASH': 'Consumer Discretionary',
+    'TTD': 'Communication Services', 'AZN': 'Health Care', 'ILMN': 'Health Care',
+    'CCEP': 'Consumer Staples'
+}
+
+NASDAQ100 = [
+    'AAPL', 'MSFT', 'NVDA', 'AMZN', 'AVGO', 'META', 'TSLA', 'GOOGL', 'GOOG', 'COST', 'NFLX', 'TMUS', 'ASML',
+    'CSCO', 'AMD', 'PEP', 'LIN', 'ADBE', 'ISRG', 'INTU', 'TXN', 'QCOM', 'AMGN', 'BKNG', 'PDD', 'CMCSA',
+    'AMAT', 'HON', 'ARM', 'VRTX', 'PANW', 'ADP', 'GILD', 'SBUX', 'MU', 'ADI', 'MELI', 'REGN', 'LRCX', 'INTC',
+    'KLAC', 'CTAS', 'MDLZ', 'CRWD', 'SNPS', 'CDNS', 'PYPL', 'MAR', 'ABNB', 'CEG', 'ORLY', 'MRVL', 'FTNT',
+    'DASH', 'WDAY', 'CSX', 'ADSK', 'ROP', 'CHTR', 'TTD', 'PCAR', 'NXPI', 'MNST', 'AEP', 'CPRT', 'FANG',
+    'PAYX', 'KDP', 'ROST', 'FAST', 'ODFL', 'AZN', 'EA', 'DDOG', 'LULU', 'BKR', 'VRSK', 'KHC', 'XEL', 'CTSH',
+    'GEHC', 'EXC', 'TEAM', 'CCEP', 'IDXX', 'MCHP', 'DXCM', 'ZS', 'ON', 'TTWO', 'ANSS', 'CSGP', 'CDW', 'BIIB',
+    'WBD', 'GFS', 'ILMN', 'MDB', 'SMCI', 'DLTR'
+]
+
+SP500 = [symbol for symbols in SP500_BY_SECTOR.values() for symbol in symbols]
+
+# 成分股 -> GICS 一级行业
+INDEX_SECTORS: Dict[str, str] = {
+    **{symbol: sector for sector, symbols in SP500_BY_SECTOR.items() for symbol in symbols},
+    **NASDAQ100_EXTRA_SECTORS
+}
+
+INDEX_UNIVERSES: Dict[str, List[str]] = {
+    'sp500': SP500,
+    'nasdaq100': NASDAQ100
+}
@@ -0,0 +1,65 @@
+"""
+请求延迟预算
+记录策略生成各阶段耗时，计算剩余预算供可降级的阶段（如蒙特卡洛模拟）使用；
+大模型调用等外部阶段单独记录，不计入预算
+"""
+
+import os
+import time
+from typing import Any, Dict
+
+# /api/generate-strategy 的延迟预算（毫秒，不含大模型调用）
+STRATEGY_LATENCY_BUDGET_MS = float(os.getenv('STRATEGY_LATENCY_BUDGET_MS', 2000))
+
+
+class LatencyBudget:
+    def __init__(self, budget_ms: float = STRATEGY_LATENCY_BUDGET_MS):
+        """
+        初始化延迟预算（创建时开始计时）
+
+        Args:
+            budget_ms: 预算毫秒数
+        """
+        self.budget_ms = budget_ms
+        self.stages: Dict[str, float] = {}
+        self.excluded_ms = 0.0
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def mark(self, stage: str, excluded: bool = False) -> float:
+        """
+        记录从上一次 mark 到现在的阶段耗时
+
+        Args:
+            stage: 阶段名称，同名阶段累加
+            excluded: 是否不计入预算（如大模型调用）
+
+        Returns:
+            本阶段耗时（毫秒）
+        """
+        now = time.perf_counter()
+        elapsed = (now - self._last) * 1000
+        self._last = now
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+        if excluded:
+            self.excluded_ms += elapsed
+        return elapsed
+
+    def elapsed_ms(self) -> float:
+        """已消耗的预算（不含 excluded 阶段）"""
+        return (time.perf_counter() - self._start) * 1000 - self.excluded_ms
+
+    def remaining_ms(self, reserve_ms: float = 0.0) -> float:
+        """剩余预算，扣除为后续阶段预留的时间"""
+        return max(self.budget_ms - self.elapsed_ms() - reserve_ms, 0.0)
+
+    def report(self) -> Dict[str, Any]:
+        """返回预算使用情况（写入接口响应）"""
+        elapsed = self.elapsed_ms()
+        return {
+            "budgetMs": self.budget_ms,
+            "elapsedMs": round(elapsed, 1),
+            "excludedMs": round(self.excluded_ms, 1),
+            "withinBudget": elapsed <= self.budget_ms,
+            "stages": {stage: round(ms, 1) for stage, ms in self.stages.items()}
+        }
@@ -0,0 +1,273 @@
+"""
+行情数据访问层
+所有应用模块通过这里获取上游行情：进程内缓存 -> 请求合并 -> 本地价格库 -> 熔断器 -> 行情数据源（默认 akshare）
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Any, Callable, Dict, Iterator, List
+
+import pandas as pd
+
+from circuit_breaker import upstream_guard
+from market_data_cache import CompactDailyFrame, RefreshingSnapshot, SingleFlight, price_cache
+from market_data_provider import get_provider
+from price_store import price_store
+
+# 所有上游数据源调用的请求合并层：同一数据的并发请求只访问一次上游
+upstream_flight = SingleFlight()
+
+
+def _fetch_us_daily(symbol: str) -> pd.DataFrame:
+    return upstream_guard.call('stock_us_daily', symbol, lambda: get_provider().stock_us_daily(symbol))
+
+
+def _load_us_daily(symbol: str) -> pd.DataFrame:
+    provider = get_provider()
+    return upstream_flight.do(
+        ('us_daily', provider.name, symbol),
+        lambda: price_store.get(symbol, lambda: _fetch_us_daily(symbol), prefer_local=provider.prefer_local_store)
+    )
+
+
+def _cache_key(kind: str, symbol: str) -> tuple:
+    """进程内缓存键（按数据源区分，切换数据源后不会读到其他数据源的数据）"""
+    return kind, get_provider().name, symbol
+
+
+# 进程内缓存只保留最近 N 个交易日的紧凑表示（更长的历史图表直接读取本地价格库的全部历史）
+CACHE_WINDOW = int(os.getenv('MARKET_CACHE_WINDOW', 504))
+
+
+def get_us_daily(symbol: str, full_history: bool = False) -> pd.DataFrame:
+    """
+    获取美股日线数据（带进程内缓存和本地价格库）
+
+    Args:
+        symbol: 股票代码
+        full_history: 为 True 时跳过进程内缓存，从本地价格库返回全部历史和全部列
+
+    Returns:
+        默认返回最近 CACHE_WINDOW 个交易日的 date / close / volume 三列日线；
+        full_history 时返回与 ak.stock_us_daily 相同列的完整日线，调用方不得原地修改
+    """
+    if full_history:
+        return _load_us_daily(symbol)
+
+    key = _cache_key('us_daily', symbol)
+    compact = price_cache.get(key)
+    if compact is None:
+        stock_df = _load_us_daily(symbol)
+        if stock_df is None or stock_df.empty:
+            return stock_df
+        compact = CompactDailyFrame.from_frame(stock_df, CACHE_WINDOW)
+        price_cache.set(key, compact)
+    return compact.to_frame()
+
+
+def refresh_us_daily(symbol: str) -> pd.DataFrame:
+    """
+    跳过进程内缓存重新读取美股日线（本地价格库过期时访问上游），并替换缓存条目
+
+    Args:
+        symbol: 股票代码
+
+    Returns:
+        最新的完整日线 DataFrame
+    """
+    stock_df = _load_us_daily(symbol)
+    if stock_df is not None and not stock_df.empty:
+        price_cache.set(_cache_key('us_daily', symbol), CompactDailyFrame.from_frame(stock_df, CACHE_WINDOW))
+    return stock_df
+
+
+# 上游请求共享线程池（有界，避免突发请求压垮数据源）
+_fetch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('MARKET_FETCH_WORKERS', 8)),
+    thread_name_prefix='market-fetch'
+)
+
+# 流式批量请求同时占用共享线程池的任务数上限（其余任务在前面的任务完成后再提交）
+STREAM_MAX_IN_FLIGHT = int(os.getenv('MARKET_STREAM_MAX_IN_FLIGHT', 4))
+
+
+def fetch_many(symbols: List[str],
+               fetcher: Callable[[str], Any] = get_us_daily,
+               symbol_timeout: float = 15.0,
+               deadline: float = 30.0) -> List[Dict[str, Any]]:
+    """
+    并发获取多只股票的数据
+
+    Args:
+        symbols: 股票代码列表
+        fetcher: 单只股票的获取函数
+        symbol_timeout: 单只股票的最长等待时间（秒，从该股票的任务开始执行时计时）
+        deadline: 整批请求的最长等待时间（秒）
+
+    Returns:
+        与输入顺序一致的结果列表，每项为 {"symbol", "data", "error"}，失败时 data 为 None
+    """
+    started = time.monotonic()
+    batch_until = started + deadline
+    # 每只股票的超时从其任务实际开始执行时计时（线程池排队的时间只受整批截止时间约束）
+    task_started: Dict[int, float] = {}
+
+    def run(index: int, symbol: str) -> Any:
+        task_started[index] = time.monotonic()
+        return fetcher(symbol)
+
+    def wait_result(index: int, future) -> Any:
+        while True:
+            begin = task_started.get(index)
+            wait_until = batch_until if begin is None else min(batch_until, begin + symbol_timeout)
+            timeout = wait_until - time.monotonic()
+            if begin is None:
+                # 仍在排队：定期检查是否已开始执行
+                timeout = min(timeout, 0.5)
+            try:
+                return future.result(timeout=max(0.0, timeout))
+            except FutureTimeoutError:
+                if time.monotonic() >= wait_until:
+                    raise
+
+    futures = [_fetch_executor.submit(run, i, symbol) for i, symbol in enumerate(symbols)]
+
+    results = []
+    for i, (symbol, future) in enumerate(zip(symbols, futures)):
+        try:
+            data = wait_result(i, future)
+            results.append({"symbol": symbol, "data": data, "error": None})
+        except FutureTimeoutError:
+            future.cancel()
+            error = f"超时（>{symbol_timeout:.0f}秒）" if time.monotonic() < batch_until else f"整批超时（>{deadline:.0f}秒）"
+            results.append({"symbol": symbol, "data": None, "error": error})
+        except Exception as e:
+            results.append({"symbol": symbol, "data": None, "error": str(e)})
+
+    return results
+
+
+def iter_fetch_many(symbols: List[str],
+                    fetcher: Callable[[str], Any] = get_us_daily,
+                    deadline: float = 120.0,
+                    max_in_flight: int = STREAM_MAX_IN_FLIGHT) -> Iterator[Dict[str, Any]]:
+    """
+    并发获取多只股票的数据，按完成顺序逐个产出结果
+
+    同时最多 max_in_flight 个任务占用共享线程池，每完成一个再提交下一个：
+    一次请求数千只股票也不会占满线程池，策略生成和缓存预热的请求可以穿插执行
+
+    Args:
+        symbols: 股票代码列表
+        fetcher: 单只股票的获取函数
+        deadline: 整批请求的最长等待时间（秒），到期未完成（含尚未提交）的股票产出超时错误
+        max_in_flight: 同时执行的任务数上限
+
+    Yields:
+        {"index", "symbol", "data", "error"}，index 为该股票在输入列表中的位置
+    """
+    deadline_at = time.monotonic() + deadline
+    queue = iter(enumerate(symbols))
+    futures: Dict[Any, int] = {}
+
+    def submit_next() -> bool:
+        for i, symbol in queue:
+            futures[_fetch_executor.submit(fetcher, symbol)] = i
+            return True
+        return False
+
+    try:
+        while len(futures) < max(1, max_in_flight) and submit_next():
+            pass
+        while futures:
+            done, _ = wait(futures, timeout=max(0.0, deadline_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                i = futures.pop(future)
+                try:
+                    yield {"index": i, "symbol": symbols[i], "data": future.result(), "error": None}
+                except Exception as e:
+                    yield {"index": i, "symbol": symbols[i], "data": None, "error": str(e)}
+                submit_next()
+
+        # 到期：取消执行中的任务，未完成和尚未提交的股票都产出超时错误
+        timed_out = sorted(futures.values()) + [i for i, _ in queue]
+        for future in futures:
+            future.cancel()
+        futures.clear()
+        for i in timed_out:
+            yield {"index": i, "symbol": symbols[i], "data": None, "error": f"超时（>{deadline:.0f}秒）"}
+    finally:
+        # 调用方提前停止迭代（如客户端断开）时取消尚未开始的任务，剩余股票不再提交
+        for future in futures:
+            future.cancel()
+
+
+# 美股主要指数：(新浪代码, 名称, 展示代码)
+US_MARKET_INDICES = [
+    (".NDX", "纳斯达克综合指数", "NASDAQ"),
+    (".INX", "标普500指数", "S&P 500"),
+    (".DJI", "道琼斯工业指数", "DOW")
+]
+
+
+def get_us_index(symbol: str) -> pd.DataFrame:
+    """获取美股指数日线数据（并发请求合并）"""
+    return upstream_flight.do(
+        ('us_index', get_provider().name, symbol),
+        lambda: upstream_guard.call('index_us_stock_sina', symbol, lambda: get_provider().index_us_stock_sina(symbol))
+    )
+
+
+def get_us_index_history(symbol: str) -> pd.DataFrame:
+    """
+    获取美股指数日线历史（紧凑缓存，用于 Beta 等风险计算；最新点位请使用 market_indices_snapshot）
+
+    Returns:
+        最近 CACHE_WINDOW 个交易日的 date / close / volume 三列日线
+    """
+    key = _cache_key('us_index_history', symbol)
+    compact = price_cache.get(key)
+    if compact is None:
+        index_df = get_us_index(symbol)
+        if index_df is None or index_df.empty:
+            return index_df
+        compact = CompactDailyFrame.from_frame(index_df, CACHE_WINDOW)
+        price_cache.set(key, compact)
+    return compact.to_frame()
+
+
+def load_market_indices() -> List[Dict[str, Any]]:
+    """并发获取主要指数并计算最新涨跌，失败的指数会被跳过"""
+    indices_data = []
+    results = fetch_many([code for code, _, _ in US_MARKET_INDICES], get_us_index)
+
+    for (code, name, display_symbol), item in zip(US_MARKET_INDICES, results):
+        if item['error']:
+            print(f"❌ 获取{name}数据失败: {item['error']}")
+            continue
+
+        index_df = item['data']
+        if index_df is None or index_df.empty:
+            continue
+
+        latest = index_df.iloc[-1]
+        prev = index_df.iloc[-2] if len(index_df) > 1 else latest
+        indices_data.append({
+            "name": name,
+            "symbol": display_symbol,
+            "price": float(latest['close']),
+            "change": float(latest['close'] - prev['close']),
+            "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
+        })
+
+    return indices_data
+
+
+# 指数快照：策略请求和看板轮询共用，过期后后台刷新，不阻塞请求
+market_indices_snapshot = RefreshingSnapshot(
+    load_market_indices,
+    ttl_seconds=float(os.getenv('MARKET_INDICES_TTL', 60))
+)
@@ -0,0 +1,354 @@
+"""
+行情数据进程内缓存
+为上游行情接口（akshare）返回的 DataFrame 提供进程级共享缓存：
+TTL 过期、按字节预算的 LRU 淘汰，以及命中/未命中计数；日线以紧凑形式（CompactDailyFrame）缓存
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存对象占用的字节数"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(value)
+
+
+class CompactDailyFrame:
+    __slots__ = ('days', 'close', 'volume')
+
+    def __init__(self, days: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        """
+        初始化日线紧凑表示
+
+        Args:
+            days: int32 日期序号（距1970-01-01的天数）
+            close: float32 收盘价
+            volume: float32 成交量
+        """
+        self.days = days
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, window: Optional[int] = None) -> 'CompactDailyFrame':
+        """由日线 DataFrame 构建，只保留 date / close / volume 列和最近 window 个交易日"""
+        recent = df.tail(window) if window else df
+        days = pd.to_datetime(recent['date']).values.astype('datetime64[D]').astype(np.int32)
+        volume = recent['volume'] if 'volume' in recent else pd.Series(0.0, index=recent.index)
+        return cls(days, recent['close'].to_numpy(dtype=np.float32), volume.to_numpy(dtype=np.float32))
+
+    def to_frame(self) -> pd.DataFrame:
+        """还原为 date / close / volume 三列的日线 DataFrame（价格按4位小数还原 float32 误差）"""
+        return pd.DataFrame({
+            'date': pd.to_datetime(self.days.astype(np.int64), unit='D'),
+            'close': np.round(self.close.astype(np.float64), 4),
+            'volume': np.round(self.volume.astype(np.float64))
+        })
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.days.nbytes + self.close.nbytes + self.volume.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+
+class MarketDataCache:
+    def __init__(self, ttl_seconds: float = 6 * 3600, max_bytes: int = 256 * 1024 * 1024):
+        """
+        初始化行情缓存
+
+        Args:
+            ttl_seconds: 缓存条目的存活时间（秒）
+            max_bytes: 缓存总字节预算，超出后按 LRU 顺序淘汰
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.RLock()
+        self._current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存，过期或不存在时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """写入缓存，并按字节预算淘汰最久未使用的条目"""
+        size = estimate_size(value)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            # 单个对象超过整体预算时不缓存
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._current_bytes += size
+
+            while self._current_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        读取缓存，未命中时调用 loader 加载并写入缓存
+
+        Args:
+            key: 缓存键
+            loader: 无参加载函数，返回 None 或空 DataFrame 时不写入缓存
+
+        Returns:
+            缓存或新加载的数据
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        value = loader()
+        if value is not None and not (isinstance(value, pd.DataFrame) and value.empty):
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """删除指定条目；未指定 key 时清空缓存"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._current_bytes = 0
+            elif key in self._entries:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / total, 4) if total else 0.0
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+
+
+class RefreshingSnapshot:
+    def __init__(self, loader: Callable[[], Any], ttl_seconds: float = 60, max_stale_seconds: float = 24 * 3600,
+                 negative_ttl_seconds: float = 30):
+        """
+        初始化 stale-while-revalidate 快照
+
+        Args:
+            loader: 无参加载函数，返回 None 或空值时保留旧快照
+            ttl_seconds: 快照新鲜期，过期后返回旧值并在后台刷新
+            max_stale_seconds: 旧值最长可用时间，超过后同步刷新
+            negative_ttl_seconds: 加载失败或为空后的负缓存时间，期间读取直接返回当前值（可能为 None），
+                不再访问上游（显式调用 refresh 不受影响）
+        """
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._value = None
+        self._loaded_at = 0.0
+        self._failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.loads = 0
+        self.negative_hits = 0
+
+    def get(self) -> Any:
+        """读取快照：新鲜时直接返回，过期时返回旧值并触发后台刷新"""
+        age = time.monotonic() - self._loaded_at
+        if self._value is not None and age < self.ttl_seconds:
+            self.hits += 1
+            return self._value
+
+        if self._value is not None and age < self.max_stale_seconds:
+            self.stale_hits += 1
+            if not self._recently_failed():
+                self._refresh_in_background()
+            return self._value
+
+        # 上游刚刚加载失败：负缓存期内不再同步访问，返回当前值
+        if self._recently_failed():
+            self.negative_hits += 1
+            return self._value
+
+        # 首次加载或旧值过久，同步加载
+        return self.refresh()
+
+    def peek(self) -> Any:
+        """非阻塞读取快照：立即返回当前值，未加载或旧值过久时返回 None，需要时在后台刷新"""
+        age = time.monotonic() - self._loaded_at
+        if self._value is not None and age < self.ttl_seconds:
+            self.hits += 1
+            return self._value
+
+        if not self._recently_failed():
+            self._refresh_in_background()
+        if self._value is not None and age < self.max_stale_seconds:
+            self.stale_hits += 1
+            return self._value
+        return None
+
+    def refresh(self) -> Any:
+        """同步刷新快照，加载失败时返回旧值"""
+        try:
+            value = self.loader()
+        except Exception as e:
+            print(f"⚠️  快照刷新失败: {e}")
+            value = None
+
+        with self._lock:
+            self.loads += 1
+            if value:
+                self._value = value
+                self._loaded_at = time.monotonic()
+                self._failed_at = None
+            else:
+                self._failed_at = time.monotonic()
+            return self._value
+
+    def stats(self) -> Dict[str, Any]:
+        """返回快照统计信息"""
+        return {
+            "hits": self.hits,
+            "staleHits": self.stale_hits,
+            "loads": self.loads,
+            "negativeHits": self.negative_hits,
+            "ageSeconds": round(time.monotonic() - self._loaded_at, 1) if self._value is not None else None
+        }
+
+    def _recently_failed(self) -> bool:
+        failed_at = self._failed_at
+        return failed_at is not None and time.monotonic() - failed_at < self.negative_ttl_seconds
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='snapshot-refresh', daemon=True).start()
+
+
+class _FlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        """初始化请求合并器：同一 key 的并发调用只执行一次，其余调用方等待并共享结果"""
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, _FlightCall] = {}
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        执行或加入同一 key 的在途调用
+
+        Args:
+            key: 合并键
+            fn: 实际执行的无参函数
+
+        Returns:
+            fn 的结果；fn 抛出的异常会同样抛给所有等待方
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _FlightCall()
+                self._in_flight[key] = call
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回合并统计：总调用数、实际上游调用数、节省的调用数"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "upstreamCalls": self.executions,
+                "saved": self.shared,
+                "inFlight": len(self._in_flight)
+            }
+
+
+# 进程级共享的行情缓存（日线数据每天只更新一次，默认缓存6小时）
+price_cache = MarketDataCache(
+    ttl_seconds=float(os.getenv('MARKET_CACHE_TTL', 6 * 3600)),
+    max_bytes=int(float(os.getenv('MARKET_CACHE_MAX_MB', 256)) * 1024 * 1024)
+)
@@ -0,0 +1,210 @@
+"""
+可插拔行情数据源
+- akshare: 实时访问上游（默认）
+- record:  访问上游的同时把响应保存到磁盘
+- replay:  从磁盘读取录制的响应，可注入延迟，用于离线、可复现的压测
+- fixture: 按股票代码生成确定性的测试数据，完全不依赖网络
+
+通过环境变量 MARKET_DATA_PROVIDER 选择数据源
+"""
+
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from synthetic_market import SyntheticMarket
+
+
+# 实时数据源：数据写入生产价格库和共享价格面板；其余数据源（回放、固定测试数据）使用独立的持久化目录
+LIVE_PROVIDERS = ('akshare', 'record')
+
+
+class MarketDataProvider(ABC):
+    """行情数据源接口，方法签名与对应的 akshare 函数一致"""
+
+    name = 'base'
+    # 本地价格库数据新鲜时是否跳过数据源（回放需要每次都访问数据源，保证注入的延迟序列可复现）
+    prefer_local_store = True
+
+    @abstractmethod
+    def stock_us_daily(self, symbol: str) -> pd.DataFrame:
+        """美股日线（date / open / high / low / close / volume）"""
+
+    @abstractmethod
+    def index_us_stock_sina(self, symbol: str) -> pd.DataFrame:
+        """美股指数日线"""
+
+    @abstractmethod
+    def stock_us_spot_em(self) -> pd.DataFrame:
+        """美股全市场实时行情表"""
+
+
+class AkshareProvider(MarketDataProvider):
+    name = 'akshare'
+
+    def stock_us_daily(self, symbol: str) -> pd.DataFrame:
+        import akshare as ak
+        return ak.stock_us_daily(symbol=symbol)
+
+    def index_us_stock_sina(self, symbol: str) -> pd.DataFrame:
+        import akshare as ak
+        return ak.index_us_stock_sina(symbol=symbol)
+
+    def stock_us_spot_em(self) -> pd.DataFrame:
+        import akshare as ak
+        return ak.stock_us_spot_em()
+
+
+def _capture_name(method: str, symbol: Optional[str] = None) -> str:
+    key = method if symbol is None else f"{method}-{symbol}"
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', key).lstrip('.') + '.pkl.gz'
+
+
+class RecordingProvider(MarketDataProvider):
+    name = 'record'
+
+    def __init__(self, capture_dir: str, upstream: Optional[MarketDataProvider] = None):
+        """
+        初始化录制数据源
+
+        Args:
+            capture_dir: 录制文件目录
+            upstream: 实际访问的数据源，默认 akshare
+        """
+        self.capture_dir = capture_dir
+        self.upstream = upstream or AkshareProvider()
+        os.makedirs(self.capture_dir, exist_ok=True)
+
+    def _record(self, name: str, df: pd.DataFrame) -> pd.DataFrame:
+        path = os.path.join(self.capture_dir, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_pickle(tmp_path, compression='gzip')
+        os.replace(tmp_path, path)
+        return df
+
+    def stock_us_daily(self, symbol: str) -> pd.DataFrame:
+        return self._record(_capture_name('stock_us_daily', symbol), self.upstream.stock_us_daily(symbol))
+
+    def index_us_stock_sina(self, symbol: str) -> pd.DataFrame:
+        return self._record(_capture_name('index_us_stock_sina', symbol), self.upstream.index_us_stock_sina(symbol))
+
+    def stock_us_spot_em(self) -> pd.DataFrame:
+        return self._record(_capture_name('stock_us_spot_em'), self.upstream.stock_us_spot_em())
+
+
+class ReplayProvider(MarketDataProvider):
+    name = 'replay'
+    prefer_local_store = False
+
+    def __init__(self, capture_dir: str, latency_ms: float = 0, jitter: float = 0.3, seed: int = 42):
+        """
+        初始化回放数据源
+
+        Args:
+            capture_dir: 录制文件目录（仅读取本地可信的录制文件）
+            latency_ms: 注入的平均延迟（毫秒），0 表示不注入
+            jitter: 延迟的对数正态抖动系数
+            seed: 延迟随机数种子，保证每次压测的延迟序列一致
+        """
+        self.capture_dir = capture_dir
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self._rng = np.random.default_rng(seed)
+        self._rng_lock = threading.Lock()
+
+    def _replay(self, name: str) -> pd.DataFrame:
+        if self.latency_ms > 0:
+            with self._rng_lock:
+                factor = self._rng.lognormal(mean=0.0, sigma=self.jitter)
+            time.sleep(self.latency_ms * factor / 1000)
+
+        path = os.path.join(self.capture_dir, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"没有录制数据: {name}")
+        return pd.read_pickle(path, compression='gzip')
+
+    def stock_us_daily(self, symbol: str) -> pd.DataFrame:
+        return self._replay(_capture_name('stock_us_daily', symbol))
+
+    def index_us_stock_sina(self, symbol: str) -> pd.DataFrame:
+        return self._replay(_capture_name('index_us_stock_sina', symbol))
+
+    def stock_us_spot_em(self) -> pd.DataFrame:
+        return self._replay(_capture_name('stock_us_spot_em'))
+
+
+class FixtureProvider(MarketDataProvider):
+    name = 'fixture'
+
+    def __init__(self, days: int = 756, end_date: str = '2024-12-31', seed: int = 42):
+        """
+        初始化固定测试数据源：同一代码每次生成完全相同的数据（由合成市场生成，股票间相关）
+
+        Args:
+            days: 每只股票的交易日数量
+            end_date: 最后一个交易日
+            seed: 随机数种子
+        """
+        self.market = SyntheticMarket(seed=seed, days=days, end_date=end_date)
+
+    def stock_us_daily(self, symbol: str) -> pd.DataFrame:
+        return self.market.daily_frames([symbol])[symbol]
+
+    def index_us_stock_sina(self, symbol: str) -> pd.DataFrame:
+        return self.market.daily_frames([symbol])[symbol]
+
+    def stock_us_spot_em(self) -> pd.DataFrame:
+        # 固定数据源不提供全市场行情，最新价退回到日线
+        return pd.DataFrame()
+
+
+def create_provider(name: str) -> MarketDataProvider:
+    """按名称创建数据源"""
+    capture_dir = os.getenv('MARKET_DATA_CAPTURE_DIR',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'captures'))
+    if name == 'akshare':
+        return AkshareProvider()
+    if name == 'record':
+        return RecordingProvider(capture_dir)
+    if name == 'replay':
+        return ReplayProvider(capture_dir, latency_ms=float(os.getenv('MARKET_DATA_REPLAY_LATENCY_MS', 0)))
+    if name == 'fixture':
+        return FixtureProvider()
+    raise ValueError(f"未知的行情数据源: {name}")
+
+
+def namespaced_dir(path: str, name: Optional[str] = None) -> str:
+    """
+    数据源对应的持久化目录：实时数据源直接使用 path，其余数据源使用 path 下以数据源命名的子目录，
+    避免测试和回放数据写入生产价格库
+
+    Args:
+        path: 实时数据源使用的目录
+        name: 数据源名称，None 时读取环境变量 MARKET_DATA_PROVIDER
+    """
+    name = name or os.getenv('MARKET_DATA_PROVIDER', 'akshare')
+    return path if name in LIVE_PROVIDERS else os.path.join(path, f"_{name}")
+
+
+_provider: Optional[MarketDataProvider] = None
+
+
+def get_provider() -> MarketDataProvider:
+    """返回当前进程使用的数据源（首次调用时按环境变量创建）"""
+    global _provider
+    if _provider is None:
+        _provider = create_provider(os.getenv('MARKET_DATA_PROVIDER', 'akshare'))
+        print(f"📡 行情数据源: {_provider.name}")
+    return _provider
+
+
+def set_provider(provider: MarketDataProvider) -> None:
+    """替换当前进程使用的数据源（用于压测和测试）"""
+    global _provider
+    _provider = provider
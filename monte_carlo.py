@@ -0,0 +1,270 @@
+"""
+组合蒙特卡洛模拟
+用缓存的收缩协方差和漂移估计模拟数万条组合净值路径（多资产几何布朗运动，买入持有），
+按固定分片和确定性种子分发到进程池，在延迟预算内汇总分位数区间、止损和回撤触发概率，
+替代模型文本或写死的 expectedMetrics
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+TRADING_DAYS_PER_MONTH = 21
+
+# 每个分片的路径数固定，结果只取决于种子和路径数，与进程数无关
+SHARD_PATHS = 1000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+DEFAULT_PATHS = int(os.getenv('MONTE_CARLO_PATHS', 20000))
+DEFAULT_SEED = int(os.getenv('MONTE_CARLO_SEED', 42))
+DEFAULT_BUDGET_MS = float(os.getenv('MONTE_CARLO_BUDGET_MS', 1500))
+MAX_WORKERS = int(os.getenv('MONTE_CARLO_WORKERS', 0)) or os.cpu_count() or 1
+
+# 漂移估计向横截面均值收缩的比例（与组合优化器一致）
+MEAN_SHRINKAGE = 0.5
+
+
+def _simulate_shard(weights: np.ndarray, drift: np.ndarray, cholesky: np.ndarray, horizon: int,
+                    n_paths: int, seed_sequence: np.random.SeedSequence,
+                    stop_loss: float, max_drawdown: float) -> Dict[str, np.ndarray]:
+    """
+    模拟一个分片的组合净值路径（在子进程中执行）
+
+    Args:
+        weights: 带符号权重（未分配部分为现金，收益为0；空头盈亏为 −|w|·(P−1)）
+        drift: 每只股票的日对数收益率漂移（已扣除 σ²/2）
+        cholesky: 日收益率协方差的 Cholesky 因子
+        horizon: 模拟交易日数
+        n_paths: 路径数
+        seed_sequence: 本分片的随机数种子
+        stop_loss: 组合净值跌破 1 − stop_loss 视为触发止损
+        max_drawdown: 回撤超过该值视为突破回撤容忍度
+
+    Returns:
+        每条路径的汇总量（月度检查点净值、终值收益、夏普、最大回撤、触发标记）
+    """
+    rng = np.random.default_rng(seed_sequence)
+    shocks = rng.standard_normal((n_paths, horizon, len(weights))) @ cholesky.T
+    prices = np.exp(np.cumsum(shocks + drift, axis=1))
+    nav = np.empty((n_paths, horizon + 1))
+    nav[:, 0] = 1.0
+    nav[:, 1:] = 1 + (prices - 1) @ weights
+
+    returns = nav[:, 1:] / nav[:, :-1] - 1
+    std = returns.std(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = np.where(std > 0, returns.mean(axis=1) / std * np.sqrt(TRADING_DAYS_PER_YEAR), np.nan)
+    drawdown = (nav / np.maximum.accumulate(nav, axis=1) - 1).min(axis=1)
+
+    return {
+        "checkpoints": nav[:, ::TRADING_DAYS_PER_MONTH],
+        "terminal": nav[:, -1] - 1,
+        "sharpe": sharpe,
+        "drawdown": drawdown,
+        "stopLossHit": nav.min(axis=1) <= 1 - stop_loss,
+        "drawdownBreached": drawdown <= -max_drawdown
+    }
+
+
+class MonteCarloEngine:
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        """
+        初始化蒙特卡洛引擎
+
+        Args:
+            max_workers: 进程池大小；为1时在当前进程内模拟
+        """
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        """惰性创建进程池（spawn 方式，避免在多线程的 Flask 进程中 fork）"""
+        if self.max_workers <= 1:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def simulate(self,
+                 weights,
+                 covariance: np.ndarray,
+                 mean: np.ndarray,
+                 horizon: int = TRADING_DAYS_PER_YEAR,
+                 n_paths: int = DEFAULT_PATHS,
+                 seed: int = DEFAULT_SEED,
+                 stop_loss: float = 0.2,
+                 max_drawdown: float = 0.2,
+                 budget_ms: float = DEFAULT_BUDGET_MS) -> Dict[str, Any]:
+        """
+        模拟组合净值路径并汇总
+
+        Args:
+            weights: 带符号权重（小数，与 covariance 行列对齐）
+            covariance: 日收益率协方差矩阵
+            mean: 日均收益率
+            horizon: 模拟交易日数
+            n_paths: 路径数（按 SHARD_PATHS 分片）
+            seed: 随机数种子，相同种子且全部分片完成时结果完全一致
+            stop_loss: 止损比例（小数）
+            max_drawdown: 最大回撤容忍度（小数）
+            budget_ms: 延迟预算，超时未完成的分片被丢弃（结果中 paths 为实际完成的路径数）
+
+        Returns:
+            {"paths", "horizonDays", "percentiles", "bands", "annualizedReturn", "sharpeRatio", "maxDrawdown",
+             "var95", "cvar95", "lossProbability", "stopLossProbability", "drawdownBreachProbability", "elapsedMs"}
+            （收益率、回撤、概率均为小数）
+        """
+        start = time.perf_counter()
+        weights = np.asarray(weights, dtype=np.float64)
+        covariance = np.asarray(covariance, dtype=np.float64)
+        mean = np.asarray(mean, dtype=np.float64)
+        # 收缩协方差正定，加极小的对角项防止数值误差导致分解失败
+        cholesky = np.linalg.cholesky(covariance + np.eye(len(covariance)) * 1e-12)
+        drift = mean - np.diag(covariance) / 2
+
+        n_shards = max(1, -(-n_paths // SHARD_PATHS))
+        seeds = np.random.SeedSequence(seed).spawn(n_shards)
+        shard_sizes = [min(SHARD_PATHS, n_paths - i * SHARD_PATHS) for i in range(n_shards)]
+        arguments = [(weights, drift, cholesky, horizon, size, seeds[i], stop_loss, max_drawdown)
+                     for i, size in enumerate(shard_sizes)]
+
+        results: Dict[int, Dict[str, np.ndarray]] = {}
+        executor = self._executor()
+        futures = {}
+        if executor is not None:
+            try:
+                futures = {executor.submit(_simulate_shard, *args): i for i, args in enumerate(arguments)}
+            except BrokenProcessPool as e:
+                print(f"⚠️  蒙特卡洛进程池不可用，本次在当前进程内模拟: {e}")
+                self.shutdown()
+
+        if not futures:
+            for i, args in enumerate(arguments):
+                if results and (time.perf_counter() - start) * 1000 > budget_ms:
+                    break
+                results[i] = _simulate_shard(*args)
+        else:
+            pending = set(futures)
+            while pending:
+                remaining = budget_ms / 1000 - (time.perf_counter() - start)
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        print(f"⚠️  蒙特卡洛分片失败: {e}")
+            for future in pending:
+                future.cancel()
+            if not results:
+                # 进程池尚未就绪（首次启动）时，至少在当前进程内完成一个分片
+                results[0] = _simulate_shard(*arguments[0])
+
+        # 按分片序号合并，保证同一组完成分片的结果与完成顺序无关
+        merged = {name: np.concatenate([results[i][name] for i in sorted(results)])
+                  for name in results[next(iter(results))]}
+        return self._summarize(merged, horizon, start)
+
+    @staticmethod
+    def _summarize(merged: Dict[str, np.ndarray], horizon: int, start: float) -> Dict[str, Any]:
+        terminal = merged["terminal"]
+        years = horizon / TRADING_DAYS_PER_YEAR
+        annualized = np.maximum(1 + terminal, 0) ** (1 / years) - 1
+        tail = terminal[terminal <= np.percentile(terminal, 5)]
+
+        def percentiles(values: np.ndarray) -> Dict[str, float]:
+            points = np.nanpercentile(values, PERCENTILES)
+            return {f"p{p}": float(v) for p, v in zip(PERCENTILES, points)}
+
+        bands = np.percentile(merged["checkpoints"], PERCENTILES, axis=0)
+        return {
+            "paths": int(len(terminal)),
+            "horizonDays": horizon,
+            "percentiles": list(PERCENTILES),
+            "bands": [
+                {"day": day * TRADING_DAYS_PER_MONTH, **{f"p{p}": float(bands[j, day]) for j, p in enumerate(PERCENTILES)}}
+                for day in range(bands.shape[1])
+            ],
+            "annualizedReturn": percentiles(annualized),
+            "sharpeRatio": percentiles(merged["sharpe"]),
+            "maxDrawdown": percentiles(merged["drawdown"]),
+            "var95": float(-np.percentile(terminal, 5)),
+            "cvar95": float(-tail.mean()),
+            "lossProbability": float((terminal < 0).mean()),
+            "stopLossProbability": float(merged["stopLossHit"].mean()),
+            "drawdownBreachProbability": float(merged["drawdownBreached"].mean()),
+            "elapsedMs": round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def attach_expected_metrics(recommendations: List[Dict[str, Any]],
+                            expected_metrics: Dict[str, Any],
+                            preferences: Dict[str, Any],
+                            budget_ms: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    用蒙特卡洛模拟结果写入 expectedMetrics（年化收益、夏普、最大回撤为 25%~75% 分位区间）
+
+    Args:
+        recommendations: 推荐列表（symbol / allocation 百分比 / 可选 position）
+        expected_metrics: 组合预期指标，原地更新
+        preferences: 用户偏好（stopLoss / maxDrawdown 为百分比，universe 为候选全集）
+        budget_ms: 模拟可用的延迟预算（请求剩余预算），None 使用 MONTE_CARLO_BUDGET_MS
+
+    Returns:
+        模拟汇总（含分位数区间和止损触发概率）；没有行情数据时返回 None，expected_metrics 保持不变
+    """
+    if not recommendations:
+        return None
+
+    # 延迟导入：子进程只需要 numpy 和 _simulate_shard，避免每个工作进程都加载行情数据依赖
+    from covariance_service import covariance_service
+    from stock_pools import get_universe
+
+    symbols = list(dict.fromkeys(r['symbol'] for r in recommendations))
+    try:
+        estimate = covariance_service.get(symbols, universe=get_universe(preferences.get('universe')))
+        if len(estimate.symbols) == 0:
+            return None
+        weights = {symbol: 0.0 for symbol in estimate.symbols}
+        for r in recommendations:
+            if r['symbol'] in weights:
+                weights[r['symbol']] += r['allocation'] / 100 * (-1 if r.get('position') == 'SHORT' else 1)
+        mean = estimate.mean
+        drift = (1 - MEAN_SHRINKAGE) * mean + MEAN_SHRINKAGE * mean.mean()
+        report = monte_carlo_engine.simulate(
+            [weights[symbol] for symbol in estimate.symbols], estimate.covariance, drift,
+            stop_loss=preferences.get('stopLoss', 20) / 100,
+            max_drawdown=preferences.get('maxDrawdown', 20) / 100,
+            budget_ms=DEFAULT_BUDGET_MS if budget_ms is None else min(budget_ms, DEFAULT_BUDGET_MS)
+        )
+    except Exception as e:
+        print(f"❌ 蒙特卡洛模拟失败: {e}")
+        return None
+
+    annual, sharpe, drawdown = report["annualizedReturn"], report["sharpeRatio"], report["maxDrawdown"]
+    expected_metrics['annualizedReturn'] = f"{annual['p25'] * 100:.1f}% ~ {annual['p75'] * 100:.1f}%"
+    expected_metrics['sharpeRatio'] = f"{sharpe['p25']:.2f} ~ {sharpe['p75']:.2f}"
+    expected_metrics['maxDrawdown'] = f"{abs(drawdown['p50']) * 100:.1f}%"
+    expected_metrics['stopLossProbability'] = f"{report['stopLossProbability'] * 100:.1f}%"
+    return report
+
+
+# 进程级蒙特卡洛引擎（进程池在首次模拟时创建）
+monte_carlo_engine = MonteCarloEngine()
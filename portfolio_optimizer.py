@@ -0,0 +1,479 @@
+"""
+约束组合优化器
+在收缩协方差矩阵上求解最小方差、风险平价、最大夏普三种组合，满足策略提示词中的约束：
+单标权重上限、GICS 行业权重上限、风格因子暴露上限、总仓位等于组合仓位占比、多空净敞口；
+同一组股票再次求解时从上一次的解热启动，替代备用策略写死的权重
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from covariance_service import TRADING_DAYS_PER_YEAR, covariance_service
+from factor_engine import MAX_FACTOR_EXPOSURE, STYLE_FACTORS, factor_exposure_snapshot
+from market_data_cache import MarketDataCache
+from stock_pools import get_sector, get_universe
+
+# 优化目标
+MIN_VARIANCE = 'min_variance'
+RISK_PARITY = 'risk_parity'
+MAX_SHARPE = 'max_sharpe'
+OPTIMIZATION_MODES = (MIN_VARIANCE, RISK_PARITY, MAX_SHARPE)
+
+# 各交易风格默认的优化目标
+STYLE_MODES = {
+    'value': RISK_PARITY,
+    'growth': MAX_SHARPE,
+    'momentum': MAX_SHARPE,
+    'contrarian': RISK_PARITY,
+    'lowVolatility': MIN_VARIANCE
+}
+
+# 风险约束（与策略提示词一致），均为占总资金的比例
+MAX_SINGLE_WEIGHT = float(os.getenv('OPTIMIZER_MAX_SINGLE_WEIGHT', 0.07))
+MAX_SECTOR_WEIGHT = float(os.getenv('OPTIMIZER_MAX_SECTOR_WEIGHT', 0.25))
+
+# 多空组合：空头股票数量占比和默认净敞口占总仓位的比例（与原备用策略等权 3 多 2 空一致）
+SHORT_FRACTION = 0.4
+DEFAULT_NET_EXPOSURE_RATIO = 0.2
+
+# 最大夏普模式对历史日均收益率向横截面均值收缩的比例，降低估计误差
+MEAN_SHRINKAGE = 0.5
+
+# 可行域投影中对偶牛顿法每个方向的最大回溯次数
+MAX_BACKTRACKS = 8
+
+# 因子暴露上限不可行而放宽时保留的余量（避免可行域退化为一个面，投影收敛变慢）
+FACTOR_LIMIT_SLACK = 0.02
+
+
+def _project_capped_simplex(v: np.ndarray, total: float, cap: float) -> np.ndarray:
+    """
+    欧氏投影到 {0 ≤ x ≤ cap, Σx = total}
+
+    x = clip(v − τ, 0, cap) 的和对 τ 分段线性单调递减，拐点为 v 和 v − cap，
+    在全部拐点上一次性求值后线性插值得到 τ
+    """
+    if len(v) == 0 or total <= 0:
+        return np.zeros_like(v)
+    breakpoints = np.sort(np.concatenate([v, v - cap]))
+    sums = np.clip(v[None, :] - breakpoints[:, None], 0, cap).sum(axis=1)  # 随拐点递减
+    k = int(np.searchsorted(-sums, -total, side='left'))
+    if k == 0:
+        tau = breakpoints[0]
+    elif k >= len(breakpoints):
+        tau = breakpoints[-1]
+    else:
+        s_hi, s_lo = sums[k - 1], sums[k]
+        t_lo, t_hi = breakpoints[k - 1], breakpoints[k]
+        tau = t_lo if s_hi == s_lo else t_lo + (s_hi - total) * (t_hi - t_lo) / (s_hi - s_lo)
+    return np.clip(v - tau, 0, cap)
+
+
+def _feasible_sector_cap(group_sizes: np.ndarray, cap: float, total: float, sector_cap: float) -> float:
+    """行业数量或单标上限不足以容纳总仓位时，把行业上限放宽到刚好可行"""
+    def capacity(limit: float) -> float:
+        return float(np.minimum(limit, group_sizes * cap).sum())
+
+    if capacity(sector_cap) >= total - 1e-12:
+        return sector_cap
+    lo, hi = sector_cap, total
+    for _ in range(50):
+        mid = (lo + hi) / 2
+        lo, hi = (lo, mid) if capacity(mid) >= total else (mid, hi)
+    return hi
+
+
+def _feasible_factor_limits(loadings: np.ndarray, long_mask: np.ndarray, side_totals: Tuple[float, float],
+                            cap: float, limit: float) -> np.ndarray:
+    """
+    各因子在方向合计和单标上限下可达的最小 |暴露| 超过上限时，把该因子的上限放宽到刚好可行（留 FACTOR_LIMIT_SLACK 余量）
+
+    单个因子的可达暴露区间由贪心得到：各方向按暴露从小（大）到大（小）依次填满单标上限
+    """
+    lo = np.zeros(loadings.shape[1])
+    hi = np.zeros(loadings.shape[1])
+    for side, total in zip((long_mask, ~long_mask), side_totals):
+        if total <= 0 or not side.any():
+            continue
+        ordered = np.sort(loadings[side], axis=0)
+        full = min(int(total // cap), len(ordered))
+        remainder = total - full * cap if full < len(ordered) else 0.0
+        lo += cap * ordered[:full].sum(axis=0) + (remainder * ordered[full] if remainder > 0 else 0)
+        hi += cap * ordered[::-1][:full].sum(axis=0) + (remainder * ordered[::-1][full] if remainder > 0 else 0)
+    min_abs = np.where((lo <= 0) & (hi >= 0), 0.0, np.minimum(np.abs(lo), np.abs(hi)))
+    return np.where(min_abs > limit, min_abs + FACTOR_LIMIT_SLACK, limit)
+
+
+class _FeasibleSet:
+    def __init__(self, long_mask: np.ndarray, side_totals: Tuple[float, float], cap: float,
+                 groups: np.ndarray, sector_cap: float, loadings: Optional[np.ndarray] = None,
+                 loading_limit=np.inf):
+        """
+        持仓规模 m ≥ 0 的可行域：各方向（多/空）合计固定、单标上限、行业上限（多空按绝对值合计）、因子暴露上限
+
+        Args:
+            long_mask: 做多的股票
+            side_totals: (多头合计, 空头合计)
+            cap: 单标上限
+            groups: 每只股票的行业编号
+            sector_cap: 行业上限
+            loadings: 股票 × 因子 的暴露（已按持仓方向取符号），组合暴露为 loadingsᵀm
+            loading_limit: 组合因子暴露的绝对值上限（标量或每个因子一个）
+        """
+        self.long_mask = long_mask
+        self.side_totals = side_totals
+        self.cap = cap
+        self.sector_cap = sector_cap
+        self.loading_limit = loading_limit
+        loadings = loadings if loadings is not None else np.zeros((len(long_mask), 0))
+
+        # 行业和因子约束统一写成 B·m ≤ c：每个行业一行，每个因子上下界各一行
+        n_groups = int(groups.max()) + 1 if len(groups) else 0
+        self._sector_rows = (np.arange(n_groups)[:, None] == groups[None, :]).astype(np.float64)
+        self._constraints = np.vstack([self._sector_rows, loadings.T, -loadings.T])
+        self._n_loadings = loadings.shape[1]
+        self._lipschitz = float(np.linalg.norm(self._constraints, 2) ** 2) if len(self._constraints) else 0.0
+        # 对偶变量在相邻两次投影之间沿用（梯度步之间的投影点变化很小，起作用的约束基本不变）
+        self._dual = np.zeros(len(self._constraints))
+
+    def relax(self, loading_limit) -> None:
+        """放宽因子暴露上限（重置不可行时发散的对偶变量）"""
+        self.loading_limit = loading_limit
+        self._dual = np.zeros(len(self._constraints))
+
+    def _bounds(self) -> np.ndarray:
+        return np.concatenate([np.full(len(self._sector_rows), self.sector_cap),
+                               np.broadcast_to(self.loading_limit, (self._n_loadings,)),
+                               np.broadcast_to(self.loading_limit, (self._n_loadings,))])
+
+    def _project_sides(self, v: np.ndarray) -> np.ndarray:
+        x = np.empty_like(v)
+        x[self.long_mask] = _project_capped_simplex(v[self.long_mask], self.side_totals[0], self.cap)
+        x[~self.long_mask] = _project_capped_simplex(v[~self.long_mask], self.side_totals[1], self.cap)
+        return x
+
+    def violation(self, x: np.ndarray) -> float:
+        """行业和因子暴露约束的最大违反量"""
+        return float((self._constraints @ x - self._bounds()).max()) if len(self._constraints) else 0.0
+
+    def _dual_value(self, v: np.ndarray, y: np.ndarray, bounds: np.ndarray) -> Tuple[float, np.ndarray]:
+        x = self._project_sides(v - self._constraints.T @ y)
+        return float(0.5 * ((x - v) @ (x - v)) + y @ (self._constraints @ x - bounds)), x
+
+    def _curvature(self, x: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """对偶函数在 rows 上的广义 Hessian（取负）：B_W J B_Wᵀ，J 为各方向自由变量上去均值的投影"""
+        free = (x > 1e-15) & (x < self.cap - 1e-15)
+        b = self._constraints[rows]
+        centered = np.zeros_like(b)
+        for side in (self.long_mask, ~self.long_mask):
+            cols = free & side
+            if cols.any():
+                centered[:, cols] = b[:, cols] - b[:, cols].mean(axis=1, keepdims=True)
+        return centered @ b.T
+
+    def project(self, v: np.ndarray, tol: float = 1e-12, max_iter: int = 50) -> np.ndarray:
+        """
+        投影到可行域：行业和因子约束不起作用时只做一次方向投影，否则求解对偶问题
+        max_{y ≥ 0} ½‖m(y) − v‖² + yᵀ(B·m(y) − c)，m(y) = 方向投影(v − Bᵀy)
+
+        对偶函数是分段二次的，用带回溯的投影牛顿法（有效集上求解 Hessian 方程）通常几步收敛；
+        返回值严格满足总仓位和单标上限，行业和因子约束满足到 tol
+        """
+        x = self._project_sides(v)
+        bounds = self._bounds()
+        if not len(self._constraints) or float((self._constraints @ x - bounds).max()) <= tol:
+            return x
+
+        y = self._dual
+        value, x = self._dual_value(v, y, bounds)
+        for _ in range(max_iter):
+            grad = self._constraints @ x - bounds
+            # KKT：y > 0 的约束恰好取等，y = 0 的约束不违反
+            if max(float(np.abs(grad[y > 0]).max(initial=0)), float(grad[y <= 0].max(initial=0))) <= tol:
+                break
+            working = (y > 0) | (grad > 0)
+            rows = np.flatnonzero(working)
+            newton = np.zeros_like(y)
+            newton[rows] = np.linalg.lstsq(self._curvature(x, rows), grad[rows], rcond=None)[0]
+
+            # 牛顿方向在 y ≥ 0 截断后可能不再上升，回溯失败时改用投影梯度方向
+            accepted = False
+            for direction in (newton, grad / max(self._lipschitz, 1e-12)):
+                step = 1.0
+                for _ in range(MAX_BACKTRACKS):
+                    candidate = np.maximum(y + step * direction, 0)
+                    candidate_value, candidate_x = self._dual_value(v, candidate, bounds)
+                    if candidate_value > value:
+                        accepted = True
+                        break
+                    step /= 2
+                if accepted:
+                    break
+            if not accepted:
+                break
+            y, value, x = candidate, candidate_value, candidate_x
+
+        self._dual = y
+        return x
+
+
+def _objective(mode: str, covariance: np.ndarray,
+               returns: np.ndarray) -> Callable[[np.ndarray], Tuple[float, np.ndarray]]:
+    """返回目标函数（越小越好）及其梯度"""
+    n = len(covariance)
+
+    def min_variance(m):
+        cm = covariance @ m
+        return float(m @ cm), 2 * cm
+
+    def risk_parity(m):
+        # 风险贡献占比与 1/n 的偏差平方和
+        cm = covariance @ m
+        variance = float(m @ cm)
+        contributions = m * cm
+        d = contributions / variance - 1 / n
+        grad = 2 * ((d * cm + covariance @ (d * m)) / variance - 2 * float(d @ contributions) * cm / variance ** 2)
+        return float(d @ d), grad
+
+    def max_sharpe(m):
+        cm = covariance @ m
+        sigma = float(np.sqrt(m @ cm))
+        excess = float(returns @ m)
+        return -excess / sigma, -returns / sigma + excess * cm / sigma ** 3
+
+    return {MIN_VARIANCE: min_variance, RISK_PARITY: risk_parity, MAX_SHARPE: max_sharpe}[mode]
+
+
+def optimize_weights(covariance: np.ndarray,
+                     expected_returns: Optional[np.ndarray] = None,
+                     mode: str = MIN_VARIANCE,
+                     gross_exposure: float = 1.0,
+                     sides: Optional[np.ndarray] = None,
+                     net_exposure: Optional[float] = None,
+                     max_weight: float = MAX_SINGLE_WEIGHT,
+                     sectors: Optional[Sequence[str]] = None,
+                     max_sector_weight: float = MAX_SECTOR_WEIGHT,
+                     factor_exposures: Optional[np.ndarray] = None,
+                     max_factor_exposure: float = np.inf,
+                     initial: Optional[np.ndarray] = None,
+                     tol: float = 1e-9,
+                     max_iter: int = 2000) -> Dict[str, Any]:
+    """
+    带约束的组合优化（加速投影梯度 + 回溯步长）
+
+    Args:
+        covariance: 日收益率协方差矩阵
+        expected_returns: 日均预期收益率，max_sharpe 模式必需
+        mode: min_variance / risk_parity / max_sharpe
+        gross_exposure: 总仓位（多空绝对值之和，占总资金比例）
+        sides: 每只股票的方向（1 做多 / -1 做空），None 表示全部做多
+        net_exposure: 多空净敞口（多头 − 空头），None 时纯多头等于总仓位、多空组合取总仓位的默认比例
+        max_weight: 单标权重上限；股票数量不足以容纳总仓位时放宽到刚好可行
+        sectors: 每只股票的行业，None 时不约束行业
+        max_sector_weight: 行业权重上限（多空按绝对值合计），不可行时同样放宽
+        factor_exposures: 股票 × 因子 的暴露矩阵，None 时不约束因子暴露
+        max_factor_exposure: 组合因子暴露（带符号权重 · 暴露）的绝对值上限
+        initial: 热启动的带符号权重（通常是上一次的解）
+        tol: 收敛阈值（相邻两次迭代权重的最大变化）
+        max_iter: 最大迭代次数
+
+    Returns:
+        {"weights": 带符号权重, "iterations", "converged", "maxWeight", "maxSectorWeight",
+         "maxFactorExposure"（实际使用的约束，因子暴露上限每个因子一个）}
+    """
+    if mode not in OPTIMIZATION_MODES:
+        raise ValueError(f"不支持的优化目标: {mode}")
+    covariance = np.asarray(covariance, dtype=np.float64)
+    n = len(covariance)
+    sides = np.ones(n) if sides is None else np.where(np.asarray(sides) < 0, -1.0, 1.0)
+    long_mask = sides > 0
+    n_long, n_short = int(long_mask.sum()), int(n - long_mask.sum())
+    if n == 0:
+        raise ValueError("没有可优化的股票")
+    if mode == MAX_SHARPE and expected_returns is None:
+        raise ValueError("最大夏普模式需要预期收益率")
+
+    if n_short == 0:
+        net_exposure = gross_exposure
+    elif n_long == 0:
+        net_exposure = -gross_exposure
+    elif net_exposure is None:
+        net_exposure = gross_exposure * DEFAULT_NET_EXPOSURE_RATIO
+    net_exposure = float(np.clip(net_exposure, -gross_exposure, gross_exposure))
+    side_totals = ((gross_exposure + net_exposure) / 2, (gross_exposure - net_exposure) / 2)
+
+    cap = max(max_weight,
+              side_totals[0] / n_long if n_long else 0.0,
+              side_totals[1] / n_short if n_short else 0.0)
+    _, groups = np.unique(np.asarray(sectors if sectors is not None else range(n), dtype=str), return_inverse=True)
+    sector_cap = max_sector_weight if sectors is not None else gross_exposure
+    sector_cap = _feasible_sector_cap(np.bincount(groups), cap, gross_exposure, sector_cap)
+    loadings = None
+    factor_limits = np.full(0, max_factor_exposure)
+    if factor_exposures is not None:
+        loadings = np.asarray(factor_exposures, dtype=np.float64) * sides[:, None]
+        factor_limits = _feasible_factor_limits(loadings, long_mask, side_totals, cap, max_factor_exposure)
+    feasible = _FeasibleSet(long_mask, side_totals, cap, groups, sector_cap, loadings, factor_limits)
+
+    # 在持仓规模 m = |w| 上求解：协方差按方向取符号，并归一化到平均方差为1以稳定步长
+    scale = float(np.mean(np.diag(covariance))) or 1.0
+    signed_cov = covariance * np.outer(sides, sides) / scale
+    signed_returns = (sides * np.asarray(expected_returns, dtype=np.float64) / np.sqrt(scale)
+                      if expected_returns is not None else np.zeros(n))
+    objective = _objective(mode, signed_cov, signed_returns)
+
+    if initial is not None and len(initial) == n:
+        start = np.abs(np.asarray(initial, dtype=np.float64))
+    else:
+        # 冷启动：按波动率倒数分配，先缩放到总仓位再投影（未缩放的值投影后可能落在单只股票的顶点上，
+        # 风险平价目标在该点梯度为0，迭代无法离开）
+        start = 1 / np.sqrt(np.maximum(np.diag(signed_cov), 1e-12))
+        start *= gross_exposure / start.sum()
+    m = feasible.project(start)
+    slack = FACTOR_LIMIT_SLACK
+    while loadings is not None and feasible.violation(m) > 1e-6 and slack < gross_exposure * 10:
+        # 多个因子和行业约束叠加后仍不可行（逐个因子放宽不足）：逐步加倍放宽所有因子上限
+        feasible.relax(factor_limits + slack)
+        m = feasible.project(start)
+        slack *= 2
+    value = objective(m)[0]
+    step = 1 / (2 * max(float(np.linalg.eigvalsh(signed_cov)[-1]), 1e-12))
+
+    # 加速投影梯度（FISTA），目标值上升时重置动量
+    y, t = m, 1.0
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        y_value, y_grad = objective(y)
+        while True:
+            candidate = feasible.project(y - step * y_grad)
+            delta = candidate - y
+            candidate_value = objective(candidate)[0]
+            if candidate_value <= y_value + y_grad @ delta + (delta @ delta) / (2 * step) + 1e-15 or step < 1e-12:
+                break
+            step /= 2
+
+        if candidate_value > value and t > 1:
+            y, t = m, 1.0
+            continue
+        change = np.abs(candidate - m).max()
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = candidate + (t - 1) / t_next * (candidate - m)
+        m, value, t = candidate, candidate_value, t_next
+        if change <= tol:
+            converged = True
+            break
+
+    return {
+        "weights": m * sides,
+        "iterations": iterations,
+        "converged": converged,
+        "maxWeight": cap,
+        "maxSectorWeight": sector_cap,
+        "maxFactorExposure": [float(limit) for limit in np.broadcast_to(feasible.loading_limit, (len(factor_limits),))]
+    }
+
+
+class PortfolioOptimizer:
+    def __init__(self, window: int = TRADING_DAYS_PER_YEAR):
+        """
+        初始化组合优化服务
+
+        Args:
+            window: 估计协方差和收益率的回看交易日数
+        """
+        self.window = window
+        # 上次的最优权重（热启动用），按（优化目标, 股票, 多空方向）缓存，受字节预算约束
+        self._solutions = MarketDataCache(ttl_seconds=24 * 3600, max_bytes=4 * 1024 * 1024)
+
+    def allocate(self,
+                 symbols: List[str],
+                 trading_style: str,
+                 gross_exposure: float,
+                 allow_short: bool = False,
+                 net_exposure: Optional[float] = None,
+                 mode: Optional[str] = None,
+                 universe: Optional[str] = None) -> Dict[str, Any]:
+        """
+        为候选股票计算目标权重
+
+        Args:
+            symbols: 候选股票（优化器可能给部分股票分配0权重）
+            trading_style: 交易风格，决定默认优化目标
+            gross_exposure: 总仓位（占总资金比例，即组合仓位占比）
+            allow_short: 是否构建多空组合（预期收益最低的一部分股票做空）
+            net_exposure: 多空净敞口（占总资金比例），None 使用默认比例
+            mode: 优化目标，None 或不支持的取值按交易风格选择
+            universe: 候选全集名称（协方差矩阵在全集上估计后切片），None 使用默认全集
+
+        Returns:
+            {"weights": {股票代码: 带符号权重}, "mode", "iterations", "converged", "warmStart",
+             "solveMs", "expectedVolatility"（年化，%）}；没有行情数据时退化为等权（mode 为 equal_weight）
+        """
+        if mode and mode not in OPTIMIZATION_MODES:
+            print(f"⚠️  不支持的优化目标 {mode}，按交易风格选择")
+            mode = None
+        mode = mode or STYLE_MODES.get(trading_style, MIN_VARIANCE)
+        start = time.perf_counter()
+        try:
+            estimate = covariance_service.get(symbols, self.window, universe=get_universe(universe))
+            if len(estimate.symbols) == 0:
+                raise ValueError("候选股票都没有价格数据")
+        except Exception as e:
+            print(f"⚠️  组合优化缺少行情数据，使用等权配置: {e}")
+            return self._equal_weight(symbols, gross_exposure, allow_short, net_exposure)
+
+        names = estimate.symbols
+        mean = estimate.mean
+        expected = (1 - MEAN_SHRINKAGE) * mean + MEAN_SHRINKAGE * mean.mean()
+        sides = np.ones(len(names))
+        if allow_short and len(names) >= 2:
+            n_short = max(1, int(round(len(names) * SHORT_FRACTION)))
+            sides[np.argsort(expected, kind='stable')[:n_short]] = -1
+
+        key = (mode, tuple(names), tuple(sides))
+        initial = self._solutions.get(key)
+        # 风格因子暴露约束 |β| ≤ MAX_FACTOR_EXPOSURE（因子暴露尚未计算时不约束）
+        exposures = factor_exposure_snapshot.peek()
+        loadings = exposures.matrix(names, STYLE_FACTORS) if exposures is not None else None
+        result = optimize_weights(estimate.covariance, expected, mode, gross_exposure, sides, net_exposure,
+                                  sectors=[get_sector(symbol) for symbol in names],
+                                  factor_exposures=loadings, max_factor_exposure=MAX_FACTOR_EXPOSURE,
+                                  initial=initial)
+        self._solutions.set(key, result["weights"])
+
+        weights = result["weights"]
+        variance = float(weights @ estimate.covariance @ weights)
+        return {
+            "weights": {symbol: float(w) for symbol, w in zip(names, weights)},
+            "mode": mode,
+            "iterations": result["iterations"],
+            "converged": result["converged"],
+            "warmStart": initial is not None,
+            "solveMs": round((time.perf_counter() - start) * 1000, 2),
+            "expectedVolatility": round(np.sqrt(variance * TRADING_DAYS_PER_YEAR) * 100, 2)
+        }
+
+    @staticmethod
+    def _equal_weight(symbols: List[str], gross_exposure: float, allow_short: bool,
+                      net_exposure: Optional[float]) -> Dict[str, Any]:
+        """行情不可用时的等权配置（多空组合按顺序，末尾的股票做空）"""
+        n = len(symbols)
+        n_short = max(1, int(round(n * SHORT_FRACTION))) if allow_short and n >= 2 else 0
+        if n_short:
+            if net_exposure is None:
+                net_exposure = gross_exposure * DEFAULT_NET_EXPOSURE_RATIO
+            long_weight = (gross_exposure + net_exposure) / 2 / (n - n_short)
+            short_weight = -(gross_exposure - net_exposure) / 2 / n_short
+            weights = [long_weight] * (n - n_short) + [short_weight] * n_short
+        else:
+            weights = [gross_exposure / n] * n if n else []
+        return {"weights": dict(zip(symbols, weights)), "mode": "equal_weight", "iterations": 0,
+                "converged": True, "warmStart": False, "solveMs": 0.0, "expectedVolatility": None}
+
+
+# 进程级组合优化器（保存各组股票上一次的解用于热启动）
+portfolio_optimizer = PortfolioOptimizer()
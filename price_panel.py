@@ -0,0 +1,408 @@
+"""
+对齐价格矩阵（交易日 × 股票）及其向量化计算
+包含跨 worker 进程共享的只读价格面板（内存映射文件 + 原子版本切换）
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from downsampling import lttb_indices
+from market_data import CACHE_WINDOW, fetch_many, get_us_daily
+from market_data_provider import namespaced_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，退化为不加锁
+    fcntl = None
+
+# 组合累计收益率列名（与前端图表约定一致）
+PORTFOLIO_COLUMN = '组合累计收益率'
+
+# 历史序列采样频率 -> pandas 周期（daily 不重采样）
+HISTORY_RESOLUTIONS = {'daily': None, 'weekly': 'W-FRI', 'monthly': 'M'}
+
+# 各采样频率在前端记录中的时间标签字段
+HISTORY_LABEL_KEYS = {'daily': 'date', 'weekly': 'date', 'monthly': 'month'}
+
+# 单次历史序列最多返回的点数（超出时 LTTB 降采样），与时间跨度无关
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', 500))
+
+# 单次历史序列最长的时间跨度（交易日，默认约30年），更长的 period 按上限截断
+HISTORY_MAX_DAYS = int(os.getenv('HISTORY_MAX_DAYS', 30 * 252))
+
+
+def allocation_weights(symbols: List[str], allocations: Optional[List[float]] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    将与 symbols 按位置对应的配置比例（%）汇总为按股票的权重
+
+    Args:
+        symbols: 股票代码（可能重复）
+        allocations: 配置比例，None 表示等权；缺少的部分按 1/len(symbols) 补齐
+
+    Returns:
+        (去重后的股票, 对应权重)，重复股票的权重相加
+    """
+    totals: Dict[str, float] = {}
+    for i, symbol in enumerate(symbols):
+        weight = allocations[i] / 100 if allocations is not None and i < len(allocations) else 1 / len(symbols)
+        totals[symbol] = totals.get(symbol, 0.0) + weight
+    return list(totals), np.array(list(totals.values()), dtype=np.float64)
+
+
+def parse_history_period(period: Any) -> Optional[int]:
+    """
+    解析历史序列的时间跨度参数
+
+    Args:
+        period: 交易日数（整数或数字字符串）；'max' / 0 / None 表示上市以来的全部历史
+
+    Returns:
+        交易日数（1 ~ HISTORY_MAX_DAYS），全部历史时返回 None
+
+    Raises:
+        ValueError: period 不是正整数或 'max'
+    """
+    if period in (None, 0, 'max'):
+        return None
+    if isinstance(period, bool) or isinstance(period, float) and not period.is_integer():
+        raise ValueError("period 必须是交易日数或 'max'")
+    try:
+        trading_days = int(period)
+    except (TypeError, ValueError):
+        raise ValueError("period 必须是交易日数或 'max'")
+    if trading_days < 0:
+        raise ValueError("period 必须是交易日数或 'max'")
+    return min(trading_days, HISTORY_MAX_DAYS) or None
+
+
+def build_close_panel(frames: Dict[str, pd.DataFrame], window: Optional[int] = None) -> pd.DataFrame:
+    """
+    将多只股票的日线收盘价对齐为 交易日 × 股票 矩阵
+
+    Args:
+        frames: 股票代码 -> 日线 DataFrame（需包含 date / close 列）
+        window: 每只股票只取最近 window 个交易日，None 表示全部历史
+
+    Returns:
+        以日期为索引、股票代码为列的收盘价矩阵，缺失值为 NaN
+    """
+    series = {}
+    for symbol, stock_df in frames.items():
+        recent = stock_df.tail(window) if window else stock_df
+        if recent.empty:
+            continue
+        series[symbol] = pd.Series(recent['close'].to_numpy(dtype=np.float64),
+                                   index=pd.DatetimeIndex(recent['date']))
+
+    if not series:
+        return pd.DataFrame()
+    return pd.DataFrame(series).sort_index()
+
+
+def cumulative_returns(panel: pd.DataFrame, symbols: List[str], weights: np.ndarray,
+                       periods: Optional[int] = None, resolution: str = 'monthly',
+                       portfolio_nav: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    按指定频率采样累计收益率及加权组合累计收益率
+
+    Args:
+        panel: build_close_panel 返回的收盘价矩阵
+        symbols: 输出列顺序，panel 中缺失的股票收益率记为 0
+        weights: 与 symbols 对齐的权重（小数）
+        periods: 保留最近的采样点数，None 表示全部
+        resolution: 采样频率 daily / weekly / monthly，每期取最后一个有效观测值
+        portfolio_nav: 组合每日净值（如 backtest.run_backtest 的 nav），提供时组合累计收益率取净值的采样值，
+            否则按权重加权各股票累计收益率
+
+    Returns:
+        以时间标签（monthly 为 YYYY-MM，其余为该期最后一个交易日 YYYY-MM-DD）为索引的累计收益率矩阵（百分比），
+        末列为组合累计收益率
+    """
+    if resolution not in HISTORY_RESOLUTIONS:
+        raise ValueError(f"不支持的采样频率: {resolution}")
+
+    # 以每只股票窗口内的首个有效价格为基准
+    base_prices = panel.bfill().iloc[0]
+    cumulative = (panel / base_prices - 1) * 100
+
+    frequency = HISTORY_RESOLUTIONS[resolution]
+    if frequency is None:
+        sampled = cumulative
+        labels = cumulative.index
+    else:
+        keys = cumulative.index.to_period(frequency)
+        sampled = cumulative.groupby(keys).last()
+        labels = sampled.index if resolution == 'monthly' else \
+            cumulative.index.to_series().groupby(keys).max().reindex(sampled.index)
+    if periods:
+        sampled, labels = sampled.tail(periods), labels[-periods:]
+    sampled = sampled.reindex(columns=symbols).fillna(0).round(2)
+
+    if portfolio_nav is not None:
+        if frequency is None:
+            nav_sampled = portfolio_nav.reindex(sampled.index)
+        else:
+            nav_sampled = portfolio_nav.groupby(portfolio_nav.index.to_period(frequency)).last().reindex(sampled.index)
+        sampled[PORTFOLIO_COLUMN] = ((nav_sampled - 1) * 100).round(2).to_numpy()
+    else:
+        sampled[PORTFOLIO_COLUMN] = (sampled[symbols].to_numpy() @ weights).round(2)
+    sampled.index = pd.Index(labels).strftime('%Y-%m' if resolution == 'monthly' else '%Y-%m-%d')
+    return sampled
+
+
+def history_records(sampled: pd.DataFrame, label: str = 'month') -> List[Dict[str, float]]:
+    """将 cumulative_returns 的结果转换为前端使用的 [{label: ..., 股票: ...}] 格式"""
+    columns = list(sampled.columns)
+    return [{label: key, **dict(zip(columns, row))}
+            for key, row in zip(sampled.index, sampled.to_numpy().tolist())]
+
+
+def chart_history(panel: pd.DataFrame, symbols: List[str], weights: np.ndarray,
+                  portfolio_nav: Optional[pd.Series] = None, trading_days: Optional[int] = None,
+                  resolution: str = 'monthly', max_points: int = HISTORY_MAX_POINTS) -> List[Dict[str, float]]:
+    """
+    生成图表用的历史累计收益率序列：按频率采样后用 LTTB 降采样到 max_points 个点以内
+
+    降采样以组合累计收益率选点（所有股票列取相同的时间点），并保留组合的最大回撤前高和谷底
+
+    Args:
+        panel: 收盘价矩阵（已截取到目标时间跨度）
+        symbols: 输出列顺序
+        weights: 与 symbols 对齐的权重（小数）
+        portfolio_nav: 组合每日净值
+        trading_days: 时间跨度（交易日），monthly 频率下保留最近 trading_days // 21 个月
+        resolution: 采样频率 daily / weekly / monthly
+        max_points: 最多返回的点数
+
+    Returns:
+        [{'month' 或 'date': 时间标签, 股票: 累计收益率, ..., 组合累计收益率: ...}]
+    """
+    periods = max(1, trading_days // 21) if resolution == 'monthly' and trading_days else None
+    sampled = cumulative_returns(panel, symbols, weights, periods, resolution, portfolio_nav)
+    sampled = sampled.iloc[lttb_indices(sampled[PORTFOLIO_COLUMN].to_numpy(), max_points)]
+    return history_records(sampled, HISTORY_LABEL_KEYS[resolution])
+
+
+class PanelView:
+    def __init__(self, version: str, values: np.ndarray, dates: pd.DatetimeIndex, symbols: List[str]):
+        """
+        只读价格矩阵视图
+
+        Args:
+            version: 面板版本号
+            values: 交易日 × 股票 的收盘价矩阵（内存映射，只读）
+            dates: 交易日索引
+            symbols: 股票代码（列顺序）
+        """
+        self.version = version
+        self.values = values
+        self.dates = dates
+        self.symbols = symbols
+        self._columns = {symbol: i for i, symbol in enumerate(symbols)}
+
+    def has(self, symbols: List[str]) -> bool:
+        """面板是否包含全部指定股票"""
+        return all(symbol in self._columns for symbol in symbols)
+
+    def window(self, days: Optional[int] = None) -> np.ndarray:
+        """最近 days 个交易日的全部股票价格（零拷贝视图）"""
+        return self.values[-days:] if days else self.values
+
+    def close_frame(self, symbols: List[str], days: Optional[int] = None) -> pd.DataFrame:
+        """
+        取指定股票最近 days 个交易日的收盘价矩阵
+
+        时间窗口切片为零拷贝视图，按股票取列会复制所选列
+        """
+        columns = [self._columns[symbol] for symbol in symbols if symbol in self._columns]
+        rows = slice(-days, None) if days else slice(None)
+        values = self.values[rows][:, columns].astype(np.float64)
+        frame = pd.DataFrame(values, index=self.dates[rows],
+                             columns=[symbol for symbol in symbols if symbol in self._columns])
+        # 去掉所选股票均无数据的交易日（如尚未上市）
+        return frame.dropna(how='all')
+
+
+class SharedPricePanel:
+    def __init__(self, root_dir: str, dtype: str = 'float64', keep_versions: int = 2, recheck_seconds: float = 5):
+        """
+        初始化跨进程共享价格面板
+
+        单个刷新进程将对齐后的价格矩阵写成带版本号的 .npy 文件，并原子替换 CURRENT 指针；
+        各 worker 进程以内存映射方式挂载当前版本，共享同一份物理页
+
+        Args:
+            root_dir: 面板文件目录
+            dtype: 价格精度（float32 或 float64）
+            keep_versions: 保留的历史版本数
+            recheck_seconds: worker 检查新版本的最短间隔
+        """
+        self.root_dir = root_dir
+        self.dtype = np.dtype(dtype)
+        self.keep_versions = keep_versions
+        self.recheck_seconds = recheck_seconds
+        self._view: Optional[PanelView] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _pointer_path(self) -> str:
+        return os.path.join(self.root_dir, 'CURRENT')
+
+    def current_version(self) -> Optional[str]:
+        """读取当前发布的版本号"""
+        try:
+            with open(self._pointer_path(), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def attach(self) -> Optional[PanelView]:
+        """挂载当前版本（版本未变化时复用已有映射），尚未发布时返回 None"""
+        now = time.monotonic()
+        if self._view is not None and now - self._checked_at < self.recheck_seconds:
+            return self._view
+
+        with self._lock:
+            self._checked_at = now
+            version = self.current_version()
+            if version is None:
+                return self._view
+            if self._view is not None and self._view.version == version:
+                return self._view
+
+            try:
+                values = np.load(os.path.join(self.root_dir, f"panel-{version}.npy"), mmap_mode='r')
+                with open(os.path.join(self.root_dir, f"panel-{version}.json"), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  挂载价格面板 {version} 失败: {e}")
+                return self._view
+
+            dates = pd.to_datetime(np.asarray(meta['dates'], dtype=np.int64), unit='D')
+            self._view = PanelView(version, values, dates, meta['symbols'])
+            return self._view
+
+    def publish(self, frames: Dict[str, pd.DataFrame]) -> Optional[str]:
+        """
+        由日线数据构建并发布新版本面板（同一时刻只有一个进程执行发布）
+
+        Args:
+            frames: 股票代码 -> 日线 DataFrame
+
+        Returns:
+            新版本号；其他进程正在发布或没有数据时返回 None
+        """
+        with _exclusive_file_lock(os.path.join(self.root_dir, 'publish.lock')) as acquired:
+            if not acquired:
+                return None
+
+            panel = build_close_panel(frames)
+            if panel.empty:
+                return None
+
+            version = datetime.now().strftime('%Y%m%d%H%M%S%f') + f"-{os.getpid()}"
+            data_path = os.path.join(self.root_dir, f"panel-{version}.npy")
+            meta_path = os.path.join(self.root_dir, f"panel-{version}.json")
+
+            with open(data_path + '.tmp', 'wb') as f:
+                np.save(f, np.ascontiguousarray(panel.to_numpy(dtype=self.dtype)))
+            os.replace(data_path + '.tmp', data_path)
+
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": version,
+                    "symbols": list(panel.columns),
+                    "dates": panel.index.values.astype('datetime64[D]').astype(np.int64).tolist(),
+                    "dtype": self.dtype.name
+                }, f)
+            os.replace(meta_path + '.tmp', meta_path)
+
+            # 原子切换版本指针，正在使用旧版本的进程不受影响
+            with open(self._pointer_path() + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(version)
+            os.replace(self._pointer_path() + '.tmp', self._pointer_path())
+
+            self._prune(version)
+            print(f"🧮 价格面板已发布: {version} ({panel.shape[0]} 个交易日 × {panel.shape[1]} 只股票)")
+            return version
+
+    def _prune(self, current: str) -> None:
+        versions = sorted(name[len('panel-'):-len('.npy')] for name in os.listdir(self.root_dir)
+                          if name.startswith('panel-') and name.endswith('.npy'))
+        for version in versions[:-self.keep_versions]:
+            if version == current:
+                continue
+            for suffix in ('.npy', '.json'):
+                try:
+                    os.remove(os.path.join(self.root_dir, f"panel-{version}{suffix}"))
+                except OSError:
+                    pass
+
+
+@contextmanager
+def _exclusive_file_lock(path: str):
+    """非阻塞的跨进程文件锁，获取失败时返回 False"""
+    handle = open(path, 'a')
+    try:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    finally:
+        handle.close()
+
+
+# 跨进程共享的价格面板
+shared_panel = SharedPricePanel(
+    namespaced_dir(os.getenv('PRICE_PANEL_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'price_panel'))),
+    dtype=os.getenv('PRICE_PANEL_DTYPE', 'float64')
+)
+
+
+def load_close_panel(symbols: List[str], window: Optional[int] = None) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    获取多只股票最近 window 个交易日的收盘价矩阵
+
+    优先从共享价格面板切片（零拷贝挂载，面板保存全部历史），缺少股票时并发获取日线；
+    超出进程内缓存窗口的时间跨度从本地价格库读取全部历史
+
+    Args:
+        symbols: 股票代码列表
+        window: 交易日数量，None 表示全部历史
+
+    Returns:
+        (收盘价矩阵, 获取失败的股票列表 [{"symbol", "error"}])
+    """
+    panel_view = shared_panel.attach()
+    if panel_view is not None and panel_view.has(symbols):
+        return panel_view.close_frame(symbols, window), []
+
+    fetcher = get_us_daily if window is not None and window <= CACHE_WINDOW \
+        else (lambda symbol: get_us_daily(symbol, full_history=True))
+    stock_frames = {}
+    errors = []
+    for item in fetch_many(symbols, fetcher):
+        if item['error']:
+            errors.append({"symbol": item['symbol'], "error": item['error']})
+        elif item['data'] is not None and not item['data'].empty:
+            stock_frames[item['symbol']] = item['data']
+
+    return build_close_panel(stock_frames, window=window), errors
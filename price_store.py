@@ -0,0 +1,273 @@
+"""
+本地日线价格库
+将 ak.stock_us_daily 的结果按股票持久化为列式 .npy 文件，
+读取时内存映射（多个 worker 进程共享同一份页缓存），刷新时只追加新交易日，
+并增量更新随元数据保存的滚动统计（波动率、动量、均线）
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from market_data_provider import namespaced_dir
+from rolling_stats import update_state
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，退化为只在进程内加锁
+    fcntl = None
+
+try:
+    from zoneinfo import ZoneInfo
+    _NY_TZ = ZoneInfo('America/New_York')
+except Exception:  # Python 3.8 或缺少 tzdata 时退化为固定时区
+    from datetime import timezone
+    _NY_TZ = timezone(timedelta(hours=-5))
+
+# 列式存储布局：第0行为日期（距1970-01-01的天数），其余为价格/成交量
+STORE_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+# 美股收盘后留出数据源更新的缓冲时间
+MARKET_CLOSE_BUFFER = (16, 30)
+
+
+def last_completed_session(now: Optional[datetime] = None) -> date:
+    """返回最近一个已收盘的美股交易日（按工作日近似，不含节假日）"""
+    now = now or datetime.now(_NY_TZ)
+    day = now.date()
+    if (now.hour, now.minute) < MARKET_CLOSE_BUFFER:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def next_session_close(now: Optional[datetime] = None) -> datetime:
+    """返回下一个美股收盘（含数据缓冲时间）的时刻（按工作日近似，不含节假日）"""
+    now = now or datetime.now(_NY_TZ)
+    target = now.replace(hour=MARKET_CLOSE_BUFFER[0], minute=MARKET_CLOSE_BUFFER[1], second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    while target.weekday() >= 5:
+        target += timedelta(days=1)
+    return target
+
+
+def _to_day_numbers(dates: pd.Series) -> np.ndarray:
+    return pd.to_datetime(dates).values.astype('datetime64[D]').astype(np.int64)
+
+
+def _safe_name(symbol: str) -> str:
+    if not symbol or symbol.startswith('.') or os.path.basename(symbol) != symbol:
+        raise ValueError(f"非法股票代码: {symbol}")
+    return symbol
+
+
+class PriceStore:
+    def __init__(self, root_dir: str, recheck_seconds: float = 3600):
+        """
+        初始化本地价格库
+
+        Args:
+            root_dir: 存储目录，每只股票一个 <SYMBOL>.npy 文件和一个 <SYMBOL>.json 元数据文件
+            recheck_seconds: 数据未更新到最新交易日时（如节假日），两次访问上游之间的最短间隔
+        """
+        self.root_dir = root_dir
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _data_path(self, symbol: str) -> str:
+        return os.path.join(self.root_dir, f"{_safe_name(symbol)}.npy")
+
+    def _meta_path(self, symbol: str) -> str:
+        return os.path.join(self.root_dir, f"{_safe_name(symbol)}.json")
+
+    def _lock_path(self, symbol: str) -> str:
+        return os.path.join(self.root_dir, f"{_safe_name(symbol)}.lock")
+
+    def read_meta(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """读取股票元数据（行数、最后交易日、上次检查时间）"""
+        try:
+            with open(self._meta_path(symbol), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read_array(self, symbol: str) -> Optional[np.ndarray]:
+        """以只读内存映射方式读取列式数组，形状为 (列数, 行数)"""
+        try:
+            return np.load(self._data_path(symbol), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def read_factors(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """读取滚动统计因子（波动率、动量、均线）及其对应的最后交易日，O(1)"""
+        meta = self.read_meta(symbol)
+        if not meta or not meta.get('stats'):
+            return None
+        return {"lastDate": meta['lastDate'], **meta['stats']['factors']}
+
+    def load(self, symbol: str) -> Optional[pd.DataFrame]:
+        """读取股票日线，返回与 ak.stock_us_daily 相同列的 DataFrame"""
+        array = self.read_array(symbol)
+        if array is None or array.shape[1] == 0:
+            return None
+
+        columns = {'date': pd.to_datetime(array[0].astype(np.int64), unit='D')}
+        for i, name in enumerate(STORE_COLUMNS[1:], start=1):
+            columns[name] = array[i]
+        return pd.DataFrame(columns, copy=False)
+
+    def is_fresh(self, symbol: str) -> bool:
+        """判断本地数据是否已覆盖最近交易日，或刚刚检查过上游"""
+        meta = self.read_meta(symbol)
+        if not meta:
+            return False
+        if meta.get('lastDate', '') >= last_completed_session().isoformat():
+            return True
+        return time.time() - meta.get('checkedAt', 0) < self.recheck_seconds
+
+    def append(self, symbol: str, df: pd.DataFrame, as_of: Optional[date] = None) -> int:
+        """
+        将上游数据中比本地最后交易日更新的行追加到价格库
+
+        尚未收盘的交易日（盘中拉取时上游返回的当日K线）不写入；上游与本地最后一个交易日的K线不同
+        （数据源修订）时覆盖该K线并从头重算滚动统计
+
+        Args:
+            symbol: 股票代码
+            df: 包含 STORE_COLUMNS 列的日线数据
+            as_of: 最近一个已收盘的交易日，None 时按当前时间计算
+
+        Returns:
+            新追加的行数
+        """
+        new_array = np.vstack([_to_day_numbers(df['date']).astype(np.float64)] +
+                              [df[name].to_numpy(dtype=np.float64) for name in STORE_COLUMNS[1:]])
+        cutoff = np.datetime64(as_of or last_completed_session(), 'D').astype(np.int64)
+        new_array = new_array[:, new_array[0] <= cutoff]
+
+        # 进程内线程锁 + 跨进程文件锁：多个 worker 同时刷新同一只股票时，读取-合并-写入不会互相覆盖
+        with self._lock, _exclusive_file_lock(self._lock_path(symbol)):
+            existing = self.read_array(symbol)
+            revised = False
+            if existing is not None and existing.shape[1] > 0:
+                existing = np.asarray(existing)
+                last_day = existing[0, -1]
+                same_day = new_array[:, new_array[0] == last_day]
+                revised = same_day.shape[1] > 0 and not np.array_equal(same_day[:, -1], existing[:, -1],
+                                                                       equal_nan=True)
+                new_array = new_array[:, new_array[0] > last_day]
+                head = np.hstack([existing[:, :-1], same_day[:, -1:]]) if revised else existing
+                merged = np.hstack([head, new_array])
+            else:
+                merged = new_array
+
+            appended = new_array.shape[1]
+            if appended or revised or existing is None:
+                self._atomic_save(self._data_path(symbol), merged)
+
+            last_date = ''
+            stats = None
+            if merged.shape[1] > 0:
+                last_date = str(np.datetime64(int(merged[0, -1]), 'D'))
+                previous = None if revised else (self.read_meta(symbol) or {}).get('stats')
+                stats = update_state(previous, merged[STORE_COLUMNS.index('close')]) if appended or previous is None \
+                    else previous
+            self._write_meta(symbol, {
+                "rows": int(merged.shape[1]),
+                "lastDate": last_date,
+                "checkedAt": time.time(),
+                "stats": stats
+            })
+            return appended
+
+    def get(self, symbol: str, fetcher: Callable[[], pd.DataFrame], prefer_local: bool = True) -> pd.DataFrame:
+        """
+        读取股票日线：本地数据新鲜时直接返回，否则从上游拉取并追加新交易日
+
+        Args:
+            symbol: 股票代码
+            fetcher: 上游拉取函数
+            prefer_local: 为 False 时总是访问上游（如回放数据源），本地数据只在上游失败时使用
+
+        Returns:
+            日线 DataFrame；上游失败时退回本地旧数据
+        """
+        if prefer_local and self.is_fresh(symbol):
+            df = self.load(symbol)
+            if df is not None:
+                return df
+
+        try:
+            upstream_df = fetcher()
+        except Exception:
+            stale_df = self.load(symbol)
+            if stale_df is not None:
+                print(f"⚠️  上游获取 {symbol} 失败，使用本地价格库数据")
+                return stale_df
+            raise
+
+        if upstream_df is None or upstream_df.empty:
+            return upstream_df
+
+        appended = self.append(symbol, upstream_df)
+        if appended:
+            print(f"💾 价格库 {symbol} 追加 {appended} 个交易日")
+        return self.load(symbol)
+
+    def symbols(self) -> List[str]:
+        """列出价格库中已有的股票"""
+        return sorted(name[:-4] for name in os.listdir(self.root_dir) if name.endswith('.npy'))
+
+    def universe_factors(self) -> Dict[str, Dict[str, Any]]:
+        """读取价格库中全部股票的滚动统计因子"""
+        factors = {}
+        for symbol in self.symbols():
+            symbol_factors = self.read_factors(symbol)
+            if symbol_factors is not None:
+                factors[symbol] = symbol_factors
+        return factors
+
+    def _atomic_save(self, path: str, array: np.ndarray) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+    def _write_meta(self, symbol: str, meta: Dict[str, Any]) -> None:
+        path = self._meta_path(symbol)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def _exclusive_file_lock(path: str):
+    """阻塞的跨进程文件锁（等待其他进程完成写入）"""
+    handle = open(path, 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    finally:
+        handle.close()
+
+
+# 进程共享的本地价格库（多个 worker 进程指向同一目录；非实时数据源使用独立的子目录）
+price_store = PriceStore(namespaced_dir(
+    os.getenv('PRICE_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'price_store'))
+))
@@ -0,0 +1,185 @@
+"""
+美股全市场行情快照
+定时拉取一次全市场实时行情表，按股票代码建立数组索引，
+最新价查询不再需要为每只股票下载完整日线历史
+"""
+
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from circuit_breaker import upstream_guard
+from market_data import fetch_many, get_us_daily, iter_fetch_many, upstream_flight
+from market_data_cache import RefreshingSnapshot
+from market_data_provider import get_provider
+
+# 行情表数值列（东方财富列名 -> 内部字段名）
+SPOT_COLUMNS = {
+    '最新价': 'price',
+    '涨跌额': 'change',
+    '涨跌幅': 'changePercent',
+    '昨收价': 'prevClose',
+    '成交量': 'volume',
+    '成交额': 'amount',
+    '总市值': 'marketCap'
+}
+QUOTE_FIELDS = list(SPOT_COLUMNS.values())
+# 接口返回的必需字段：任一字段缺失（NaN）的行情视为快照未命中（NaN 不是合法的 JSON）
+REQUIRED_QUOTE_FIELDS = ('price', 'change', 'changePercent')
+
+
+def _is_complete(quote: Dict[str, float]) -> bool:
+    return all(np.isfinite(quote[field]) for field in REQUIRED_QUOTE_FIELDS)
+
+
+def normalize_spot_symbol(code: str) -> str:
+    """将东方财富代码（如 105.AAPL、106.BRK_B）转换为应用内代码（AAPL、BRK-B）"""
+    symbol = code.split('.', 1)[-1]
+    return symbol.upper().replace('_', '-')
+
+
+class QuoteBook:
+    def __init__(self, symbols: List[str], values: np.ndarray, as_of: float):
+        """
+        初始化行情快照
+
+        Args:
+            symbols: 股票代码列表
+            values: 形状为 (股票数, len(QUOTE_FIELDS)) 的 float64 数组
+            as_of: 快照生成时间戳
+        """
+        self.symbols = symbols
+        self.values = values
+        self.as_of = as_of
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+
+    @classmethod
+    def from_spot_frame(cls, spot_df: pd.DataFrame) -> 'QuoteBook':
+        """由 ak.stock_us_spot_em 返回的全市场行情表构建快照"""
+        spot_df = spot_df.dropna(subset=['最新价'])
+        symbols = [normalize_spot_symbol(str(code)) for code in spot_df['代码']]
+        values = np.column_stack([
+            pd.to_numeric(spot_df[column], errors='coerce').to_numpy(dtype=np.float64)
+            for column in SPOT_COLUMNS
+        ])
+        return cls(symbols, values, time.time())
+
+    def get(self, symbol: str) -> Optional[Dict[str, float]]:
+        """O(1) 查询单只股票的最新行情"""
+        row = self._index.get(symbol)
+        if row is None:
+            return None
+        return dict(zip(QUOTE_FIELDS, self.values[row].tolist()))
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+
+def load_quote_book() -> Optional[QuoteBook]:
+    """拉取全市场行情表并构建快照"""
+    started = time.time()
+    spot_df = upstream_flight.do(
+        ('us_spot',),
+        lambda: upstream_guard.call('stock_us_spot_em', None, lambda: get_provider().stock_us_spot_em())
+    )
+    if spot_df is None or spot_df.empty:
+        return None
+
+    book = QuoteBook.from_spot_frame(spot_df)
+    print(f"📡 全市场行情快照已更新: {len(book)} 只股票，耗时 {time.time() - started:.1f} 秒")
+    return book
+
+
+# 全市场快照：默认5分钟刷新一次，在后台加载，不阻塞请求
+quote_snapshot = RefreshingSnapshot(
+    load_quote_book,
+    ttl_seconds=float(os.getenv('QUOTE_SNAPSHOT_TTL', 300)),
+    max_stale_seconds=float(os.getenv('QUOTE_SNAPSHOT_MAX_STALE', 6 * 3600))
+)
+
+
+def _quote_from_daily(stock_df: pd.DataFrame) -> Dict[str, float]:
+    latest = stock_df.iloc[-1]
+    prev = stock_df.iloc[-2] if len(stock_df) > 1 else latest
+    return {
+        "price": float(latest['close']),
+        "change": float(latest['close'] - prev['close']),
+        "changePercent": float((latest['close'] - prev['close']) / prev['close'] * 100)
+    }
+
+
+def _daily_item_to_quote(item: Dict[str, Any]) -> Dict[str, Any]:
+    """将 fetch_many 的日线结果转换为最新价结果"""
+    if item['error'] is not None:
+        return item
+    try:
+        stock_df = item['data']
+        if stock_df is None or stock_df.empty:
+            return {**item, "data": None, "error": "无行情数据"}
+        quote = _quote_from_daily(stock_df)
+        if not _is_complete(quote):
+            return {**item, "data": None, "error": "行情数据不完整"}
+        return {**item, "data": quote}
+    except Exception as e:
+        return {**item, "data": None, "error": str(e)}
+
+
+def _split_by_snapshot(symbols: List[str]):
+    book = quote_snapshot.peek()
+    hits = []
+    missing = []
+    for i, symbol in enumerate(symbols):
+        quote = book.get(symbol) if book is not None else None
+        if quote is not None and _is_complete(quote):
+            hits.append((i, {field: None if np.isnan(value) else value for field, value in quote.items()}))
+        else:
+            missing.append(i)
+    return hits, missing
+
+
+def get_latest_quotes(symbols: List[str]) -> List[Dict[str, Any]]:
+    """
+    获取多只股票的最新价格
+
+    优先查询全市场快照；快照尚未加载或缺少的股票退回到并发下载日线
+
+    Args:
+        symbols: 股票代码列表
+
+    Returns:
+        与输入顺序一致的结果列表，每项为 {"symbol", "data", "error"}，
+        data 包含 price / change / changePercent
+    """
+    hits, missing = _split_by_snapshot(symbols)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(symbols)
+    for i, quote in hits:
+        results[i] = {"symbol": symbols[i], "data": quote, "error": None}
+
+    if missing:
+        for i, item in zip(missing, fetch_many([symbols[i] for i in missing], get_us_daily)):
+            results[i] = _daily_item_to_quote(item)
+
+    return results
+
+
+def iter_latest_quotes(symbols: List[str], deadline: float = 120.0) -> Iterator[Dict[str, Any]]:
+    """
+    流式获取多只股票的最新价格：快照命中的股票立即产出，其余股票并发下载，按完成顺序产出
+
+    Args:
+        symbols: 股票代码列表
+        deadline: 下载缺失股票的最长等待时间（秒）
+
+    Yields:
+        {"index", "symbol", "data", "error"}，index 为该股票在输入列表中的位置
+    """
+    hits, missing = _split_by_snapshot(symbols)
+    for i, quote in hits:
+        yield {"index": i, "symbol": symbols[i], "data": quote, "error": None}
+
+    if missing:
+        for item in iter_fetch_many([symbols[i] for i in missing], get_us_daily, deadline=deadline):
+            yield _daily_item_to_quote({**item, "index": missing[item['index']]})
@@ -0,0 +1,160 @@
+"""
+组合风险指标引擎
+在对齐的收盘价矩阵上批量计算每只持仓和整个组合的 Beta（相对标普500）、年化波动率、
+历史法与参数法 95% VaR、最大回撤，替代模型猜测或写死的风险指标
+"""
+
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from market_data import get_us_index_history
+from price_panel import load_close_panel
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Beta 基准：标普500指数（新浪代码）
+BENCHMARK_SYMBOL = '.INX'
+
+
+def masked_beta(returns: np.ndarray, benchmark: np.ndarray) -> np.ndarray:
+    """逐列计算 Beta，只使用股票和基准同时有收益率的交易日"""
+    mask = ~np.isnan(returns) & ~np.isnan(benchmark)[:, None]
+    count = mask.sum(axis=0)
+    r = np.where(mask, returns, 0.0)
+    b = np.where(mask, benchmark[:, None], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r_dev = np.where(mask, r - r.sum(axis=0) / count, 0.0)
+        b_dev = np.where(mask, b - b.sum(axis=0) / count, 0.0)
+        beta = (r_dev * b_dev).sum(axis=0) / (b_dev ** 2).sum(axis=0)
+    beta[count < 2] = np.nan
+    return beta
+
+
+def _risk_columns(prices: np.ndarray, returns: np.ndarray, benchmark: Optional[np.ndarray],
+                  confidence: float) -> Dict[str, np.ndarray]:
+    """按列批量计算风险指标（收益率和 VaR 为小数，按日计）"""
+    z = NormalDist().inv_cdf(confidence)
+    with np.errstate(invalid='ignore'):
+        daily_std = np.nanstd(returns, axis=0, ddof=1)
+        daily_mean = np.nanmean(returns, axis=0)
+        running_max = np.fmax.accumulate(prices, axis=0)
+        drawdown = np.nanmin(prices / running_max - 1, axis=0)
+        historical_var = -np.nanpercentile(returns, (1 - confidence) * 100, axis=0)
+
+    return {
+        "beta": masked_beta(returns, benchmark) if benchmark is not None else np.full(returns.shape[1], np.nan),
+        "volatility": daily_std * np.sqrt(TRADING_DAYS_PER_YEAR),
+        "var95Historical": historical_var,
+        "var95Parametric": -(daily_mean - z * daily_std),
+        "maxDrawdown": drawdown
+    }
+
+
+def compute_risk_metrics(panel: pd.DataFrame,
+                         weights,
+                         benchmark: Optional[pd.Series] = None,
+                         confidence: float = 0.95) -> Dict[str, Any]:
+    """
+    计算持仓和组合的风险指标
+
+    Args:
+        panel: 交易日 × 股票 收盘价矩阵
+        weights: 与 panel 列对齐的带符号权重（小数，空头为负，未分配部分为现金）；
+            也可传以股票代码为索引的 Series
+        benchmark: 以日期为索引的基准收盘价，None 时不计算 Beta
+        confidence: VaR 置信度
+
+    Returns:
+        {"positions": {股票代码: 指标}, "portfolio": 指标}，指标包含 beta / volatility /
+        var95Historical / var95Parametric（单日，小数）/ maxDrawdown（负数小数），无法计算的指标为 None
+    """
+    if isinstance(weights, pd.Series):
+        weights = weights.groupby(level=0).sum().reindex(panel.columns).fillna(0)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    prices = panel.ffill().to_numpy(dtype=np.float64)
+    returns = prices[1:] / prices[:-1] - 1
+    benchmark_returns = None
+    if benchmark is not None and not benchmark.empty:
+        aligned = benchmark.reindex(panel.index).ffill().to_numpy(dtype=np.float64)
+        benchmark_returns = aligned[1:] / aligned[:-1] - 1
+
+    # 组合按目标权重每日再平衡，缺失收益率（未上市）视同现金
+    portfolio_returns = np.nan_to_num(returns) @ weights
+    portfolio_nav = np.concatenate([[1.0], np.cumprod(1 + portfolio_returns)])
+
+    columns = _risk_columns(prices, returns, benchmark_returns, confidence)
+    portfolio = _risk_columns(portfolio_nav[:, None], portfolio_returns[:, None], benchmark_returns, confidence)
+
+    def row(metrics: Dict[str, np.ndarray], i: int) -> Dict[str, Optional[float]]:
+        return {name: (None if np.isnan(values[i]) else float(values[i])) for name, values in metrics.items()}
+
+    return {
+        "positions": {symbol: row(columns, i) for i, symbol in enumerate(panel.columns)},
+        "portfolio": row(portfolio, 0)
+    }
+
+
+def _format_metrics(metrics: Dict[str, Optional[float]], sign: float = 1.0) -> Dict[str, str]:
+    """转换为前端约定的字符串格式（Beta 按持仓方向带符号，其余为百分比）"""
+    formatted = {}
+    if metrics['beta'] is not None:
+        formatted['beta'] = f"{metrics['beta'] * sign:.2f}"
+    for name in ('volatility', 'var95Historical', 'var95Parametric'):
+        if metrics[name] is not None:
+            formatted[name] = f"{metrics[name] * 100:.2f}%"
+    if metrics['maxDrawdown'] is not None:
+        formatted['maxDrawdown'] = f"{abs(metrics['maxDrawdown']) * 100:.2f}%"
+    return formatted
+
+
+def attach_risk_metrics(recommendations: List[Dict[str, Any]],
+                        expected_metrics: Optional[Dict[str, Any]] = None,
+                        window: int = TRADING_DAYS_PER_YEAR) -> Optional[Dict[str, str]]:
+    """
+    用最近 window 个交易日的实际行情计算风险指标，写入每只推荐股票的 riskMetrics 和 expectedMetrics.var95
+
+    Args:
+        recommendations: 推荐列表（symbol / allocation 百分比 / 可选 position）
+        expected_metrics: 组合预期指标，提供时写入计算得到的 var95
+        window: 回看交易日数
+
+    Returns:
+        组合风险指标（字符串格式）；没有行情数据时返回 None，推荐列表保持不变
+    """
+    if not recommendations:
+        return None
+
+    symbols = [r['symbol'] for r in recommendations]
+    signs = {r['symbol']: -1.0 if r.get('position') == 'SHORT' else 1.0 for r in recommendations}
+    weights = pd.Series([r['allocation'] / 100 * signs[r['symbol']] for r in recommendations], index=symbols)
+
+    try:
+        panel, _ = load_close_panel(symbols, window + 1)
+        if panel.empty:
+            return None
+
+        try:
+            index_df = get_us_index_history(BENCHMARK_SYMBOL)
+            benchmark = index_df.set_index('date')['close'] if index_df is not None and not index_df.empty else None
+        except Exception as e:
+            print(f"⚠️  获取基准指数失败，不计算 Beta: {e}")
+            benchmark = None
+
+        risk = compute_risk_metrics(panel, weights, benchmark)
+    except Exception as e:
+        print(f"❌ 计算风险指标失败: {e}")
+        return None
+
+    for recommendation in recommendations:
+        metrics = risk['positions'].get(recommendation['symbol'])
+        if metrics is not None:
+            recommendation['riskMetrics'] = _format_metrics(metrics, signs[recommendation['symbol']])
+
+    portfolio = _format_metrics(risk['portfolio'])
+    if expected_metrics is not None and 'var95Historical' in portfolio:
+        expected_metrics['var95'] = portfolio['var95Historical']
+    return portfolio
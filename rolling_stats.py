@@ -0,0 +1,108 @@
+"""
+增量滚动统计
+每追加一根日线，只用进入和离开窗口的观测值更新滚动波动率（滑动窗口 Welford 算法）、均线和动量，
+状态随价格库元数据持久化，全市场因子值可按股票 O(1) 读取
+"""
+
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+TRADING_DAYS_PER_YEAR = 252
+
+# 波动率窗口：最近252个收盘价内的251个日收益率（与 get_enhanced_stock_data 原口径一致）
+VOL_WINDOW = 251
+MOVING_AVERAGE_WINDOWS = (20, 50, 200)
+# 动量回看的交易日数：1个月取20个交易日前，12个月取251个交易日前
+MOMENTUM_LAGS = {'momentum1M': 20, 'momentum12M': 251}
+
+# 增量更新累计浮点误差，每隔一定次数从头重算一次
+REBASE_EVERY = 252
+
+
+def _daily_return(closes: np.ndarray, i: int) -> float:
+    return float(closes[i] / closes[i - 1] - 1)
+
+
+def compute_state(closes: np.ndarray) -> Dict[str, Any]:
+    """从完整收盘价序列一次性计算滚动统计状态"""
+    closes = np.asarray(closes, dtype=np.float64)
+    returns = closes[-(VOL_WINDOW + 1):]
+    returns = returns[1:] / returns[:-1] - 1 if len(returns) > 1 else np.empty(0)
+    mean = float(returns.mean()) if len(returns) else 0.0
+
+    state = {
+        "rows": int(len(closes)),
+        "updates": 0,
+        "returns": {"n": int(len(returns)), "mean": mean, "m2": float(((returns - mean) ** 2).sum())},
+        "ma": {str(window): float(closes[-window:].sum()) for window in MOVING_AVERAGE_WINDOWS}
+    }
+    state["factors"] = _factors(state, closes)
+    return state
+
+
+def update_state(state: Optional[Dict[str, Any]], closes: np.ndarray) -> Dict[str, Any]:
+    """
+    按新追加的收盘价增量更新状态
+
+    Args:
+        state: 上次的状态（None 时从头计算）
+        closes: 追加后的完整收盘价序列（可为内存映射）
+
+    Returns:
+        新状态
+    """
+    n_rows = len(closes)
+    if (state is None or state.get("rows", 0) < 2 or state["rows"] > n_rows
+            or state.get("updates", 0) + n_rows - state["rows"] >= REBASE_EVERY):
+        return compute_state(closes)
+
+    returns = dict(state["returns"])
+    ma = dict(state["ma"])
+    for i in range(state["rows"], n_rows):
+        x = _daily_return(closes, i)
+        if returns["n"] < VOL_WINDOW:
+            # 窗口未满：Welford 追加
+            returns["n"] += 1
+            delta = x - returns["mean"]
+            returns["mean"] += delta / returns["n"]
+            returns["m2"] += delta * (x - returns["mean"])
+        else:
+            # 窗口已满：新收益率进入、最早的收益率离开
+            y = _daily_return(closes, i - VOL_WINDOW)
+            old_mean = returns["mean"]
+            returns["mean"] = old_mean + (x - y) / VOL_WINDOW
+            returns["m2"] += (x - y) * (x - returns["mean"] + y - old_mean)
+
+        for window in MOVING_AVERAGE_WINDOWS:
+            key = str(window)
+            ma[key] += float(closes[i])
+            if i >= window:
+                ma[key] -= float(closes[i - window])
+
+    new_state = {
+        "rows": n_rows,
+        "updates": state.get("updates", 0) + n_rows - state["rows"],
+        "returns": returns,
+        "ma": ma
+    }
+    new_state["factors"] = _factors(new_state, closes)
+    return new_state
+
+
+def _factors(state: Dict[str, Any], closes: np.ndarray) -> Dict[str, float]:
+    n_rows = state["rows"]
+    latest = float(closes[-1])
+    returns = state["returns"]
+    variance = max(returns["m2"], 0.0) / (returns["n"] - 1) if returns["n"] > 1 else 0.0
+
+    factors = {
+        "close": latest,
+        "volatility": math.sqrt(variance * TRADING_DAYS_PER_YEAR) * 100
+    }
+    for name, lag in MOMENTUM_LAGS.items():
+        factors[name] = (latest / float(closes[-1 - lag]) - 1) * 100 if n_rows > lag else 0.0
+    for window in MOVING_AVERAGE_WINDOWS:
+        factors[f"ma{window}"] = state["ma"][str(window)] / min(window, n_rows)
+    return factors
@@ -0,0 +1,236 @@
+"""
+机构级股票筛选
+每日由全市场行情快照（市值、成交额）和本地价格库（成交额均值、动量、波动率、上市时长）
+预计算一张列式因子表，筛选条件以向量化布尔掩码执行并按交易风格排序，
+结果按（风格, 截止日期）缓存在因子表上，数千只股票的筛选在毫秒级完成
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from index_constituents import INDEX_UNIVERSES
+from market_data import get_us_index_history
+from market_data_cache import RefreshingSnapshot
+from price_store import price_store
+from quote_snapshot import QUOTE_FIELDS, quote_snapshot
+from risk_engine import BENCHMARK_SYMBOL
+
+# 筛选条件（与策略提示词一致）
+MIN_MARKET_CAP = float(os.getenv('SCREEN_MIN_MARKET_CAP', 2e9))
+MIN_ADV = float(os.getenv('SCREEN_MIN_ADV', 2e7))
+# 剔除上市不满一年的股票（含新上市 SPAC），按价格库中的交易日数判断
+MIN_HISTORY_DAYS = 252
+ADV_WINDOW = 20
+# 指数模式保留的候选股票数量（由组合优化器在候选中分配权重）
+INDEX_SCREEN_LIMIT = int(os.getenv('INDEX_SCREEN_LIMIT', 30))
+
+FACTOR_COLUMNS = ('price', 'marketCap', 'adv', 'momentum1M', 'momentum12M', 'excess12M', 'volatility', 'history')
+
+# 各风格的排序因子（数据源没有估值和财务数据，价值/成长以规模和动量近似）及是否应用动量过滤
+STYLE_SCREENS = {
+    'value': {"rank": ('marketCap', False), "momentumFilter": True},
+    'growth': {"rank": ('excess12M', False), "momentumFilter": True},
+    'momentum': {"rank": ('momentum1M', False), "momentumFilter": True},
+    'contrarian': {"rank": ('momentum12M', True), "momentumFilter": False},
+    'lowVolatility': {"rank": ('volatility', True), "momentumFilter": True}
+}
+# 排序因子整列缺失（如全市场快照不可用时的市值）时按成交额排序
+FALLBACK_RANK = ('adv', False)
+
+
+class FactorTable:
+    def __init__(self, symbols: List[str], columns: Dict[str, np.ndarray], as_of: Optional[str]):
+        """
+        初始化因子表
+
+        Args:
+            symbols: 股票代码
+            columns: 因子名 -> 与 symbols 对齐的 float64 数组（缺失为 NaN）
+            as_of: 因子对应的最新交易日
+        """
+        self.symbols = np.asarray(symbols, dtype=object)
+        self.columns = columns
+        self.as_of = as_of
+        self._screens: Dict[Tuple[str, int, Hashable], Dict[str, Any]] = {}
+        self._members: Dict[Hashable, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def members(self, universe: Union[str, Sequence[str]]) -> np.ndarray:
+        """指数成分股（或给定股票列表）在因子表中的布尔掩码"""
+        key = universe if isinstance(universe, str) else tuple(sorted(universe))
+        with self._lock:
+            mask = self._members.get(key)
+            if mask is None:
+                mask = np.isin(self.symbols, INDEX_UNIVERSES[universe] if isinstance(universe, str) else list(key))
+                self._members[key] = mask
+            return mask
+
+    def screen(self, trading_style: str, limit: int = 8,
+               universe: Optional[Union[str, Sequence[str]]] = None) -> Dict[str, Any]:
+        """
+        按风格筛选并排序（同一因子表上的结果按风格、数量和候选全集缓存）
+
+        Args:
+            trading_style: 交易风格
+            limit: 入选股票数量上限
+            universe: 指数名称（如 sp500）或股票列表（如风格股票池），只在其中筛选；None 表示因子表中的全部股票
+
+        Returns:
+            {"symbols": 入选股票, "asOf", "universe": 候选股票数, "passed": 通过全部过滤的股票数,
+             "skippedFilters": 因全市场缺少数据而未执行的过滤条件,
+             "missingFactors": 各过滤条件中因子缺失、未参与该条件的候选股票数, "elapsedMs"}
+        """
+        universe_key = universe if universe is None or isinstance(universe, str) else tuple(sorted(universe))
+        key = (trading_style, limit, universe_key)
+        with self._lock:
+            cached = self._screens.get(key)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        config = STYLE_SCREENS.get(trading_style, STYLE_SCREENS['value'])
+        if universe is None or (isinstance(universe, str) and universe not in INDEX_UNIVERSES):
+            mask = np.ones(len(self), dtype=bool)
+        else:
+            mask = self.members(universe).copy()
+        candidates_count = int(mask.sum())
+        skipped = []
+        missing: Dict[str, int] = {}
+
+        # 规模、流动性、上市时长：整列缺失（如全市场快照不可用）时跳过该条件；
+        # 单只股票缺失该因子（如不在价格库中）时不参与该条件，由其余条件和排序决定，而不是直接剔除
+        for column, minimum in (('marketCap', MIN_MARKET_CAP), ('adv', MIN_ADV), ('history', MIN_HISTORY_DAYS)):
+            values = self.columns[column]
+            if np.isnan(values).all():
+                skipped.append(column)
+                continue
+            unknown = np.isnan(values)
+            missing[column] = int((mask & unknown).sum())
+            with np.errstate(invalid='ignore'):
+                mask &= unknown | (values >= minimum)
+
+        # 动量过滤：12个月超额收益在合格股票中排名前50%，且最近1个月收益为正（缺失的因子同样不参与）
+        if config["momentumFilter"]:
+            excess, momentum = self.columns['excess12M'], self.columns['momentum1M']
+            eligible = mask & ~np.isnan(excess)
+            if eligible.any():
+                missing['momentum'] = int((mask & (np.isnan(excess) | np.isnan(momentum))).sum())
+                with np.errstate(invalid='ignore'):
+                    mask &= (np.isnan(excess) | (excess >= np.median(excess[eligible]))) \
+                        & (np.isnan(momentum) | (momentum > 0))
+            else:
+                skipped.append('momentum')
+
+        column, ascending = config["rank"]
+        values = self.columns[column]
+        if np.isnan(values[mask]).all():
+            skipped.append(f"rank:{column}")
+            column, ascending = FALLBACK_RANK
+            values = self.columns[column]
+        # 排序因子缺失的股票排在最后
+        candidates = np.flatnonzero(mask)
+        scores = values[candidates] if ascending else -values[candidates]
+        scores = np.where(np.isnan(scores), np.inf, scores)
+        if len(candidates) > limit:
+            top = np.argpartition(scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        selected = candidates[np.argsort(scores, kind='stable')]
+
+        result = {
+            "symbols": self.symbols[selected].tolist(),
+            "asOf": self.as_of,
+            "universe": candidates_count,
+            "passed": int(mask.sum()),
+            "skippedFilters": skipped,
+            "missingFactors": missing,
+            "elapsedMs": round((time.perf_counter() - start) * 1000, 3)
+        }
+        with self._lock:
+            self._screens[key] = result
+        return result
+
+
+def _benchmark_return_12m() -> float:
+    try:
+        index_df = get_us_index_history(BENCHMARK_SYMBOL)
+        closes = index_df['close'].to_numpy(dtype=np.float64)
+        return float(closes[-1] / closes[-252] - 1) * 100 if len(closes) >= 252 else np.nan
+    except Exception as e:
+        print(f"⚠️  获取基准12个月收益失败，超额收益按绝对收益排序: {e}")
+        return np.nan
+
+
+def build_factor_table() -> Optional[FactorTable]:
+    """由全市场快照和本地价格库构建因子表（每只股票只读取最近 ADV_WINDOW 行和随元数据保存的滚动因子）"""
+    started = time.time()
+    book = quote_snapshot.peek()
+    store_factors = price_store.universe_factors()
+
+    symbols = list(book.symbols) if book is not None else []
+    seen = set(symbols)
+    symbols += [symbol for symbol in store_factors if symbol not in seen]
+    if not symbols:
+        return None
+
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    columns = {name: np.full(len(symbols), np.nan) for name in FACTOR_COLUMNS}
+    if book is not None:
+        rows = np.arange(len(book.symbols))
+        columns['price'][rows] = book.values[:, QUOTE_FIELDS.index('price')]
+        columns['marketCap'][rows] = book.values[:, QUOTE_FIELDS.index('marketCap')]
+        columns['adv'][rows] = book.values[:, QUOTE_FIELDS.index('amount')]  # 当日成交额，价格库有日线时替换为均值
+
+    as_of = None
+    for symbol, factors in store_factors.items():
+        i = index[symbol]
+        array = price_store.read_array(symbol)
+        if array is not None and array.shape[1] > 0:
+            closes, volumes = array[4, -ADV_WINDOW:], array[5, -ADV_WINDOW:]
+            columns['adv'][i] = float(np.mean(closes * volumes))
+            columns['history'][i] = array.shape[1]
+        columns['momentum1M'][i] = factors['momentum1M']
+        columns['momentum12M'][i] = factors['momentum12M']
+        columns['volatility'][i] = factors['volatility']
+        if np.isnan(columns['price'][i]):
+            columns['price'][i] = factors['close']
+        as_of = max(as_of or factors['lastDate'], factors['lastDate'])
+
+    columns['excess12M'] = columns['momentum12M'] - np.nan_to_num(_benchmark_return_12m())
+    table = FactorTable(symbols, columns, as_of)
+    print(f"🧮 因子表已更新: {len(table)} 只股票（价格库 {len(store_factors)} 只），耗时 {time.time() - started:.1f} 秒")
+    return table
+
+
+# 每日因子表：后台构建，默认每小时检查一次（价格库在收盘后更新）
+factor_table_snapshot = RefreshingSnapshot(
+    build_factor_table,
+    ttl_seconds=float(os.getenv('FACTOR_TABLE_TTL', 3600)),
+    max_stale_seconds=float(os.getenv('FACTOR_TABLE_MAX_STALE', 2 * 24 * 3600))
+)
+
+
+def screen_universe(trading_style: str, limit: int = 8,
+                    universe: Optional[Union[str, Sequence[str]]] = None) -> Optional[Dict[str, Any]]:
+    """
+    在全市场因子表上筛选股票（不阻塞请求：因子表尚未构建时返回 None 并在后台构建）
+
+    Args:
+        trading_style: 交易风格
+        limit: 入选股票数量上限
+        universe: 指数名称或股票列表（如风格股票池），只在其中筛选；None 表示全市场
+
+    Returns:
+        FactorTable.screen 的结果；因子表不可用或没有股票通过筛选时返回 None
+    """
+    table = factor_table_snapshot.peek()
+    if table is None:
+        return None
+    result = table.screen(trading_style, limit, universe)
+    return result if result["symbols"] else None
@@ -82,11 +82,19 @@ export const getStockData = async (symbols: string[]) => {
 };
 
 // 获取股票历史数据
-export const getStockHistory = async (symbols: string[], period: number = 252) => {
+// period: 交易日数量，'max' 表示全部历史；resolution: 采样频率；maxPoints: 服务端降采样的目标点数
+export const getStockHistory = async (
+  symbols: string[],
+  period: number | 'max' = 252,
+  resolution: 'daily' | 'weekly' | 'monthly' = 'monthly',
+  maxPoints?: number
+) => {
   try {
     const response = await axios.post(`${API_BASE_URL}/stock-history`, {
       symbols,
-      period
+      period,
+      resolution,
+      maxPoints
     });
     
     if (response.data.success) {
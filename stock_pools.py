@@ -0,0 +1,104 @@
+"""
+各交易风格的股票池定义
+策略生成、机构筛选和后台缓存预热共用同一份列表；
+也可以选择整个指数（标普500、纳斯达克100）作为候选全集，由预计算的价格面板和因子表支撑
+"""
+
+import os
+from typing import List, Optional
+
+from index_constituents import INDEX_SECTORS, INDEX_UNIVERSES
+
+# 各交易风格的初始股票池
+STYLE_POOLS = {
+    'value': ['AAPL', 'MSFT', 'BRK-B', 'JNJ', 'PG', 'JPM', 'BAC', 'WFC', 'CVX', 'XOM'],
+    'growth': ['TSLA', 'NVDA', 'AMZN', 'GOOGL', 'META', 'CRM', 'ADBE', 'NOW', 'SHOP', 'SQ'],
+    'momentum': ['AAPL', 'NVDA', 'TSLA', 'AMD', 'NFLX', 'AVGO', 'QCOM', 'AMAT', 'LRCX', 'KLAC'],
+    'contrarian': ['INTC', 'IBM', 'GE', 'F', 'T', 'VZ', 'PFE', 'MRK', 'KO', 'PEP'],
+    'lowVolatility': ['KO', 'PEP', 'WMT', 'PG', 'JNJ', 'MCD', 'UNH', 'V', 'MA', 'HD']
+}
+
+# 通过机构级筛选的股票
+INSTITUTIONAL_POOLS = {
+    'value': ['AAPL', 'MSFT', 'BRK-B', 'JNJ', 'PG', 'JPM', 'BAC'],
+    'growth': ['TSLA', 'NVDA', 'AMZN', 'GOOGL', 'META', 'CRM', 'ADBE'],
+    'momentum': ['AAPL', 'NVDA', 'TSLA', 'AMD', 'AVGO', 'QCOM'],
+    'contrarian': ['INTC', 'IBM', 'GE', 'F', 'T', 'VZ'],
+    'lowVolatility': ['KO', 'PEP', 'WMT', 'PG', 'JNJ', 'MCD', 'UNH']
+}
+
+
+def all_pool_symbols() -> List[str]:
+    """返回所有风格股票池的去重并集（保持首次出现顺序）"""
+    symbols = []
+    for pool in list(STYLE_POOLS.values()) + list(INSTITUTIONAL_POOLS.values()):
+        for symbol in pool:
+            if symbol not in symbols:
+                symbols.append(symbol)
+    return symbols
+
+
+# 股票池成分的 GICS 一级行业（组合优化的行业集中度约束使用）
+GICS_SECTORS = {
+    'AAPL': 'Information Technology', 'MSFT': 'Information Technology', 'NVDA': 'Information Technology',
+    'CRM': 'Information Technology', 'ADBE': 'Information Technology', 'NOW': 'Information Technology',
+    'SHOP': 'Information Technology', 'AMD': 'Information Technology', 'AVGO': 'Information Technology',
+    'QCOM': 'Information Technology', 'AMAT': 'Information Technology', 'LRCX': 'Information Technology',
+    'KLAC': 'Information Technology', 'INTC': 'Information Technology', 'IBM': 'Information Technology',
+    'GOOGL': 'Communication Services', 'META': 'Communication Services', 'NFLX': 'Communication Services',
+    'T': 'Communication Services', 'VZ': 'Communication Services',
+    'AMZN': 'Consumer Discretionary', 'TSLA': 'Consumer Discretionary', 'F': 'Consumer Discretionary',
+    'MCD': 'Consumer Discretionary', 'HD': 'Consumer Discretionary',
+    'PG': 'Consumer Staples', 'KO': 'Consumer Staples', 'PEP': 'Consumer Staples', 'WMT': 'Consumer Staples',
+    'BRK-B': 'Financials', 'JPM': 'Financials', 'BAC': 'Financials', 'WFC': 'Financials',
+    'V': 'Financials', 'MA': 'Financials', 'SQ': 'Financials',
+    'JNJ': 'Health Care', 'PFE': 'Health Care', 'MRK': 'Health Care', 'UNH': 'Health Care',
+    'CVX': 'Energy', 'XOM': 'Energy',
+    'GE': 'Industrials'
+}
+
+
+def get_sector(symbol: str) -> str:
+    """返回股票的 GICS 一级行业；未收录的股票单独成组，不与其他股票合并计算行业集中度"""
+    return GICS_SECTORS.get(symbol) or INDEX_SECTORS.get(symbol, f"Unknown:{symbol}")
+
+
+# 候选全集：pools 为各风格股票池（默认），其余为指数成分股
+POOLS_UNIVERSE = 'pools'
+DEFAULT_UNIVERSE = os.getenv('STRATEGY_UNIVERSE', POOLS_UNIVERSE)
+# 后台预热的指数（逗号分隔，需显式开启；默认只预热 STRATEGY_UNIVERSE 配置的指数，股票池模式不预热指数），
+# 选择未预热的指数时请求需要现场下载成分股日线
+WARM_UNIVERSES = [name.strip().lower() for name in (os.getenv('WARM_INDEX_UNIVERSES') or DEFAULT_UNIVERSE).split(',')
+                  if name.strip().lower() in INDEX_UNIVERSES]
+
+
+def resolve_universe(name: Optional[str]) -> str:
+    """
+    规范化候选全集名称，未知名称使用默认全集
+
+    只有后台预热的指数（WARM_UNIVERSES）可以选择：未预热的指数需要在请求中现场下载数百只成分股日线，
+    超出延迟预算，退回股票池
+    """
+    name = (name or DEFAULT_UNIVERSE).lower()
+    if name in INDEX_UNIVERSES and name not in WARM_UNIVERSES:
+        print(f"⚠️  指数 {name} 未预热（WARM_INDEX_UNIVERSES），使用股票池")
+        return POOLS_UNIVERSE
+    return name if name in INDEX_UNIVERSES else POOLS_UNIVERSE
+
+
+def get_universe(name: Optional[str] = None) -> List[str]:
+    """返回候选全集的股票（协方差矩阵按同一全集估计并缓存）"""
+    name = resolve_universe(name)
+    return list(INDEX_UNIVERSES[name]) if name in INDEX_UNIVERSES else all_pool_symbols()
+
+
+def warm_symbols() -> List[str]:
+    """后台预热的股票：所有风格股票池和 WARM_UNIVERSES 中的指数成分股"""
+    symbols = all_pool_symbols()
+    seen = set(symbols)
+    for name in WARM_UNIVERSES:
+        for symbol in INDEX_UNIVERSES[name]:
+            if symbol not in seen:
+                seen.add(symbol)
+                symbols.append(symbol)
+    return symbols
@@ -0,0 +1,180 @@
+"""
+备用策略物化快照
+非AI路径的输出只由候选全集、交易风格和组合仓位占比决定：每个交易日收盘后（缓存预热完成后），
+为每个候选全集、每种风格、每档组合仓位预先生成完整的备用策略响应（筛选结果、行情、优化权重、
+风险指标、历史序列、蒙特卡洛、因子暴露），按交易日版本持久化；请求时只按投资金额换算推荐金额
+"""
+
+import copy
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from market_data_cache import RefreshingSnapshot
+from price_store import price_store
+from stock_pools import POOLS_UNIVERSE, STYLE_POOLS, resolve_universe
+
+SNAPSHOT_STYLES = list(STYLE_POOLS)
+
+# 物化的组合仓位占比档位（%，默认与问卷的 10%~100%、步长 5% 一致），不在档位上的请求实时计算
+SNAPSHOT_EXPOSURES = sorted({int(value) for value in os.getenv(
+    'STRATEGY_SNAPSHOT_EXPOSURES', ','.join(str(level) for level in range(10, 101, 5))).split(',') if value.strip()})
+
+# 物化的候选全集（逗号分隔；指数模式每档的候选股票更多，物化耗时更长）
+SNAPSHOT_UNIVERSES = list(dict.fromkeys(
+    resolve_universe(name.strip()) for name in os.getenv('STRATEGY_SNAPSHOT_UNIVERSES', POOLS_UNIVERSE).split(',')
+    if name.strip()))
+
+# 物化时使用的参考偏好：推荐金额按参考投资金额计算，请求时等比换算；
+# 止损比例和回撤容忍度只影响蒙特卡洛和风险提示，与参考值不同时由调用方重新模拟
+REFERENCE_PREFERENCES = {'investmentAmount': 100000, 'stopLoss': 20, 'maxDrawdown': 20}
+
+# 持久化目录、保留的历史版本数，进程内快照检查新版本的间隔和最长可用时间（秒）
+SNAPSHOT_DIR = os.getenv('STRATEGY_SNAPSHOT_DIR',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'strategy_snapshots'))
+KEEP_VERSIONS = 3
+SNAPSHOT_TTL = float(os.getenv('STRATEGY_SNAPSHOT_TTL', 3600))
+SNAPSHOT_MAX_STALE = float(os.getenv('STRATEGY_SNAPSHOT_MAX_STALE', 3 * 24 * 3600))
+
+# 构建函数：(候选全集, 交易风格, 仓位档位列表) -> {仓位档位: 备用策略响应数据}
+SnapshotBuilder = Callable[[str, str, List[int]], Dict[int, Dict[str, Any]]]
+
+
+def needs_resimulation(preferences: Dict[str, Any]) -> bool:
+    """止损比例或回撤容忍度与物化时的参考值不同，需要重新做蒙特卡洛模拟"""
+    return any(preferences.get(key, REFERENCE_PREFERENCES[key]) != REFERENCE_PREFERENCES[key]
+               for key in ('stopLoss', 'maxDrawdown'))
+
+
+class StrategySnapshots:
+    def __init__(self, name: str, build: SnapshotBuilder, root_dir: str = SNAPSHOT_DIR,
+                 ttl_seconds: float = SNAPSHOT_TTL, max_stale_seconds: float = SNAPSHOT_MAX_STALE):
+        """
+        初始化备用策略快照
+
+        Args:
+            name: 快照名称（不同应用的备用策略响应格式不同，分别持久化）
+            build: 构建函数，为一个候选全集和交易风格生成各仓位档位的响应数据
+            root_dir: 持久化目录，每个交易日一个 strategies_<name>_<YYYY-MM-DD>.json
+            ttl_seconds: 进程内快照检查新版本的间隔
+            max_stale_seconds: 进程内快照最长可用时间
+        """
+        self.name = name
+        self.build = build
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+        # 进程内的最新版本（只读取磁盘，物化由缓存预热任务执行）
+        self.snapshot = RefreshingSnapshot(self.load_latest, ttl_seconds=ttl_seconds,
+                                           max_stale_seconds=max_stale_seconds)
+
+    def _path(self, as_of: str) -> str:
+        return os.path.join(self.root_dir, f"strategies_{self.name}_{as_of}.json")
+
+    def _paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.root_dir, f"strategies_{self.name}_*.json")))
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  读取备用策略快照失败 {path}: {e}")
+            return None
+
+    def load_latest(self) -> Optional[Dict[str, Any]]:
+        """读取最近一次物化的版本"""
+        for path in reversed(self._paths()):
+            snapshot = self._read(path)
+            if snapshot is not None:
+                return snapshot
+        return None
+
+    def materialize(self) -> Optional[Dict[str, Any]]:
+        """
+        价格库有新交易日（或物化配置变化）时重新生成并持久化，否则沿用已有版本；完成后刷新进程内快照
+
+        Returns:
+            当前版本；价格库为空时返回已有的最新版本
+        """
+        store_factors = price_store.universe_factors()
+        if not store_factors:
+            return self.snapshot.refresh()
+        as_of = max(factors['lastDate'] for factors in store_factors.values())
+        config = {"universes": SNAPSHOT_UNIVERSES, "styles": SNAPSHOT_STYLES, "exposures": SNAPSHOT_EXPOSURES,
+                  "reference": REFERENCE_PREFERENCES}
+
+        with self._lock:
+            path = self._path(as_of)
+            existing = self._read(path) if os.path.exists(path) else None
+            if existing is None or existing.get('config') != config:
+                started = time.time()
+                strategies: Dict[str, Dict[str, Dict[str, Any]]] = {}
+                for universe in SNAPSHOT_UNIVERSES:
+                    for style in SNAPSHOT_STYLES:
+                        try:
+                            levels = self.build(universe, style, SNAPSHOT_EXPOSURES)
+                        except Exception as e:
+                            print(f"❌ 物化备用策略 {universe}/{style} 失败: {e}")
+                            continue
+                        strategies.setdefault(universe, {})[style] = {str(level): data for level, data in levels.items()}
+                if not strategies:
+                    return self.snapshot.refresh()
+
+                version = f"{as_of}-{datetime.now().strftime('%H%M%S')}"
+                with open(f"{path}.{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+                    json.dump({"version": version, "asOf": as_of, "createdAt": datetime.now().isoformat(timespec='seconds'),
+                               "config": config, "strategies": strategies}, f, ensure_ascii=False)
+                os.replace(f"{path}.{os.getpid()}.tmp", path)
+                for old_path in self._paths()[:-KEEP_VERSIONS]:
+                    try:
+                        os.remove(old_path)
+                    except OSError:
+                        pass
+                count = sum(len(levels) for styles in strategies.values() for levels in styles.values())
+                print(f"🗂️  备用策略快照已物化: {version}（{count} 个组合），耗时 {time.time() - started:.1f} 秒")
+
+        return self.snapshot.refresh()
+
+    def lookup(self, universe: str, trading_style: str, preferences: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        查找与偏好匹配的物化策略（不阻塞请求：快照尚未加载时返回 None）
+
+        Args:
+            universe: 候选全集名称
+            trading_style: 交易风格
+            preferences: 用户偏好（maxSinglePosition 需在物化档位上，且未指定优化目标）
+
+        Returns:
+            按投资金额换算推荐金额后的响应数据副本（含 snapshot 版本信息）；没有匹配的快照时返回 None，由调用方实时计算
+        """
+        if preferences.get('optimizationMode'):
+            return None
+        snapshot = self.snapshot.peek()
+        exposure = preferences.get('maxSinglePosition', 20)
+        if snapshot is None or float(exposure) != int(exposure):
+            return None
+        entry = snapshot['strategies'].get(universe, {}).get(trading_style, {}).get(str(int(exposure)))
+        if entry is None:
+            return None
+
+        data = copy.deepcopy(entry)
+        ratio = preferences.get('investmentAmount', REFERENCE_PREFERENCES['investmentAmount']) \
+            / REFERENCE_PREFERENCES['investmentAmount']
+        for recommendation in data['recommendations']:
+            recommendation['recommendedAmount'] *= ratio
+            if 'shares' in recommendation:
+                recommendation['shares'] = int(recommendation['recommendedAmount'] / recommendation['currentPrice'])
+        data['snapshot'] = {"version": snapshot['version'], "asOf": snapshot['asOf'], "exposure": int(exposure)}
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        """返回当前版本和进程内快照统计"""
+        snapshot = self.snapshot.peek()
+        return {"version": snapshot['version'] if snapshot else None, **self.snapshot.stats()}
+
@@ -0,0 +1,171 @@
+"""
+可复现的合成行情生成器
+用多因子模型生成相关的几何布朗运动价格路径，一次调用即可生成数千只股票的完整历史，
+输出格式与真实日线一致，可直接走真实数据的计算路径（价格面板、月度收益、组合计算）
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+# 进程内复用的合成市场数量上限（按最近使用淘汰）
+MAX_MOCK_MARKETS = 8
+
+
+def _symbol_seed(symbol: str) -> int:
+    return zlib.crc32(symbol.encode('utf-8'))
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 哈希（uint64 数组，溢出按模 2⁶⁴ 回绕）"""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniforms(keys: np.ndarray, stream: int, rows: int = 1) -> np.ndarray:
+    """
+    按 (股票键, 流编号, 行号) 哈希生成 (0, 1) 均匀分布随机数（rows × 股票数）
+
+    每个元素只由股票键、流编号和行号决定，所有股票一次向量化生成，结果与一起生成的其他股票无关
+    """
+    counters = (np.uint64(stream) << np.uint64(32)) + np.arange(rows, dtype=np.uint64)
+    bits = _splitmix64(_splitmix64(counters)[:, None] ^ keys[None, :])
+    return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) / 2.0 ** 53
+
+
+def _normals(keys: np.ndarray, stream: int, rows: int = 1) -> np.ndarray:
+    """标准正态随机数（Box-Muller，占用 2·stream、2·stream+1 两个均匀分布流）"""
+    u1, u2 = _uniforms(keys, 2 * stream, rows), _uniforms(keys, 2 * stream + 1, rows)
+    return np.sqrt(-2 * np.log(u1)) * np.cos(2 * np.pi * u2)
+
+
+class SyntheticMarket:
+    def __init__(self, seed: int = 42, days: int = 756, end_date=None, n_factors: int = 4,
+                 market_vol: float = 0.16, market_drift: float = 0.08):
+        """
+        初始化合成市场
+
+        同一 seed 下，某只股票的价格路径只由 seed 和股票代码决定，与一起生成的其他股票无关
+
+        Args:
+            seed: 随机数种子
+            days: 交易日数量
+            end_date: 最后一个交易日，默认今天
+            n_factors: 公共因子数量（第0个为市场因子，其余为行业/风格因子）
+            market_vol: 市场因子年化波动率
+            market_drift: 市场年化漂移率
+        """
+        self.seed = seed
+        self.days = days
+        self.dates = pd.bdate_range(end=pd.Timestamp(end_date or pd.Timestamp.today()).normalize(), periods=days)
+        self.market_drift = market_drift
+
+        rng = np.random.default_rng([seed, 0])
+        factor_vols = np.array([market_vol] + [0.08] * (n_factors - 1)) / np.sqrt(TRADING_DAYS_PER_YEAR)
+        # 公共因子日收益（交易日 × 因子）
+        self.factor_returns = rng.standard_normal((days, n_factors)) * factor_vols
+
+    def _symbol_params(self, symbols: List[str]):
+        """各股票的因子载荷、特质波动率、超额漂移、起始价格和特质冲击（所有股票一次向量化生成）"""
+        n_factors = self.factor_returns.shape[1]
+        keys = _splitmix64(np.array([_symbol_seed(symbol) for symbol in symbols], dtype=np.uint64)
+                           ^ _splitmix64(np.array([self.seed], dtype=np.uint64)))
+
+        # 各参数使用互不重叠的随机数流：均匀分布 0 / 4 / 8，正态分布占用 2-3 / 6-7 / 10-11
+        betas = np.empty((len(symbols), n_factors))
+        betas[:, 0] = 0.6 + 1.0 * _uniforms(keys, 0)[0]
+        betas[:, 1:] = 0.7 * _normals(keys, 1, n_factors - 1).T
+        idio_vol = 0.12 + 0.33 * _uniforms(keys, 4)[0]
+        alpha = 0.04 * _normals(keys, 3)[0]
+        start_price = 20 + 380 * _uniforms(keys, 8)[0]
+        idio = _normals(keys, 5, self.days)
+
+        return betas, idio_vol, alpha, start_price, idio
+
+    def close_paths(self, symbols: List[str]) -> np.ndarray:
+        """
+        生成收盘价路径
+
+        Args:
+            symbols: 股票代码列表
+
+        Returns:
+            形状为 (交易日, 股票数) 的收盘价矩阵
+        """
+        betas, idio_vol, alpha, start_price, idio = self._symbol_params(symbols)
+        dt = 1 / TRADING_DAYS_PER_YEAR
+
+        common = self.factor_returns @ betas.T
+        shocks = common + idio * (idio_vol * np.sqrt(dt))
+        variance = (betas ** 2) @ (self.factor_returns.var(axis=0) / dt) + idio_vol ** 2
+        drift = (self.market_drift * betas[:, 0] + alpha - 0.5 * variance) * dt
+
+        return start_price * np.exp(np.cumsum(shocks + drift, axis=0))
+
+    def panel(self, symbols: List[str]) -> pd.DataFrame:
+        """生成 交易日 × 股票 收盘价矩阵（与 price_panel.build_close_panel 输出格式一致）"""
+        return pd.DataFrame(self.close_paths(symbols), index=self.dates, columns=symbols)
+
+    def daily_frames(self, symbols: List[str]) -> Dict[str, pd.DataFrame]:
+        """生成与 ak.stock_us_daily 相同列的日线数据"""
+        closes = self.close_paths(symbols)
+        rng = np.random.default_rng([self.seed, 1])
+        spread = np.abs(rng.normal(0, 0.006, closes.shape))
+        opens = np.empty_like(closes)
+        opens[0] = closes[0]
+        opens[1:] = closes[:-1] * (1 + rng.normal(0, 0.003, (closes.shape[0] - 1, closes.shape[1])))
+        volumes = rng.lognormal(np.log(5_000_000), 0.5, closes.shape).round()
+
+        frames = {}
+        for i, symbol in enumerate(symbols):
+            frames[symbol] = pd.DataFrame({
+                'date': self.dates,
+                'open': opens[:, i],
+                'high': np.maximum(opens[:, i], closes[:, i]) * (1 + spread[:, i]),
+                'low': np.minimum(opens[:, i], closes[:, i]) * (1 - spread[:, i]),
+                'close': closes[:, i],
+                'volume': volumes[:, i]
+            })
+        return frames
+
+    def latest_quotes(self, symbols: List[str]) -> List[Dict[str, float]]:
+        """生成最新价格和日涨跌（与 get_latest_quotes 的 data 字段格式一致）"""
+        closes = self.close_paths(symbols)[-2:]
+        change = closes[-1] - closes[-2]
+        change_percent = change / closes[-2] * 100
+        return [
+            {"price": float(closes[-1, i]), "change": float(change[i]), "changePercent": float(change_percent[i])}
+            for i in range(len(symbols))
+        ]
+
+
+# 进程级合成市场（用于真实数据不可用时的回退路径），最多保留 MAX_MOCK_MARKETS 个
+_mock_markets: "OrderedDict[tuple, SyntheticMarket]" = OrderedDict()
+_mock_markets_lock = threading.Lock()
+
+
+def get_mock_market(seed: int = 42, days: int = 756, end_date: Optional[str] = None) -> SyntheticMarket:
+    """返回按 (seed, days, end_date) 复用的合成市场（LRU，超出 MAX_MOCK_MARKETS 时淘汰最久未使用的）"""
+    end_date = end_date or pd.Timestamp.today().strftime('%Y-%m-%d')
+    key = (seed, days, end_date)
+    with _mock_markets_lock:
+        market = _mock_markets.get(key)
+        if market is not None:
+            _mock_markets.move_to_end(key)
+            return market
+    market = SyntheticMarket(seed=seed, days=days, end_date=end_date)
+    with _mock_markets_lock:
+        _mock_markets[key] = market
+        _mock_markets.move_to_end(key)
+        while len(_mock_markets) > MAX_MOCK_MARKETS:
+            _mock_markets.popitem(last=False)
+    return market
@@ -0,0 +1,92 @@
+"""回测引擎：向量化净值与逐日模拟持仓的朴素实现一致"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import (BUY_AND_HOLD, COMMISSION_RATE, DRIFT, IMPACT_RATE, REBALANCE, _drift_rebalance_points,
+                      _periodic_rebalance_points, run_backtest)
+
+COST_RATE = COMMISSION_RATE + IMPACT_RATE
+
+
+def _panel(n_days: int = 300, n_stocks: int = 4, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    prices = 50 * np.cumprod(1 + rng.normal(0.0003, 0.02, (n_days, n_stocks)), axis=0)
+    dates = pd.bdate_range('2023-01-02', periods=n_days)
+    return pd.DataFrame(prices, index=dates, columns=[f"S{i}" for i in range(n_stocks)])
+
+
+def _naive_nav(prices: np.ndarray, weights: np.ndarray, points) -> np.ndarray:
+    """逐日持有股数模拟：再平衡日按目标权重调仓并扣除换手成本"""
+    points = set(int(p) for p in points)
+    shares = np.zeros(len(weights))
+    cash = 1.0
+    nav = np.empty(len(prices))
+    for day, price in enumerate(prices):
+        value = cash + shares @ price
+        if day in points:
+            if day == 0:
+                turnover = np.abs(weights).sum()
+            else:
+                turnover = np.abs(shares * price / value - weights).sum()
+            value *= 1 - COST_RATE * turnover
+            shares = weights * value / price
+            cash = value * (1 - weights.sum())
+        nav[day] = cash + shares @ price
+    return nav
+
+
+@pytest.mark.parametrize("mode", [BUY_AND_HOLD, REBALANCE, DRIFT])
+def test_nav_matches_naive_simulation(mode):
+    panel = _panel()
+    weights = np.array([0.3, 0.25, 0.2, 0.15])
+    result = run_backtest(panel, weights, mode=mode, frequency='M', tolerance=0.02)
+    prices = panel.to_numpy()
+
+    if mode == BUY_AND_HOLD:
+        points = [0]
+    elif mode == REBALANCE:
+        points = _periodic_rebalance_points(panel.index, 'M')
+    else:
+        points = _drift_rebalance_points(prices, weights, 0.02)
+    assert result["metrics"]["rebalances"] == len(points) - 1
+    np.testing.assert_allclose(result["nav"].to_numpy(), _naive_nav(prices, weights, points), rtol=1e-12)
+    assert result["metrics"]["totalReturn"] == round((result["nav"].iloc[-1] - 1) * 100, 2)
+
+
+def test_periodic_points_are_first_session_of_each_month():
+    dates = _panel(120).index
+    points = _periodic_rebalance_points(dates, 'M')
+    expected = [0] + [i for i in range(1, len(dates)) if dates[i].month != dates[i - 1].month]
+    assert points.tolist() == expected
+
+
+def test_drift_points_match_naive_scan():
+    prices = _panel(400, seed=3).to_numpy()
+    weights = np.array([0.25, 0.25, 0.25, 0.25])
+    tolerance = 0.03
+    expected, start = [0], 0
+    for day in range(1, len(prices)):
+        values = weights * prices[day] / prices[start]
+        if np.abs(values / values.sum() - weights).max() > tolerance:
+            expected.append(day)
+            start = day
+    assert _drift_rebalance_points(prices, weights, tolerance, lookahead=7).tolist() == expected
+
+
+def test_series_weights_align_by_symbol_and_missing_symbols_are_cash():
+    panel = _panel()
+    as_array = run_backtest(panel, np.array([0.0, 0.4, 0.0, 0.2]), mode=BUY_AND_HOLD)
+    as_series = run_backtest(panel, pd.Series({'S3': 0.2, 'S1': 0.4, 'NOT_IN_PANEL': 0.3}), mode=BUY_AND_HOLD)
+    pd.testing.assert_series_equal(as_array["nav"], as_series["nav"])
+
+
+def test_rejects_bad_input():
+    panel = _panel()
+    with pytest.raises(ValueError):
+        run_backtest(panel, np.ones(3) / 3)
+    with pytest.raises(ValueError):
+        run_backtest(panel, np.ones(4) / 4, mode='unknown')
+    with pytest.raises(ValueError):
+        run_backtest(panel, np.ones(4) / 4, mode=REBALANCE, frequency='D')
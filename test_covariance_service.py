@@ -0,0 +1,80 @@
+"""收缩协方差：充分统计量的 Ledoit-Wolf 与按定义的朴素实现一致，滑动更新与重建一致"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from covariance_service import CovarianceEstimate, RollingMoments
+
+
+def _returns(t: int, n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    common = rng.normal(0.0005, 0.01, (t, 1))
+    return common + rng.normal(0.0002, 0.015, (t, n))
+
+
+def _naive_ledoit_wolf(x: np.ndarray):
+    """Ledoit-Wolf (2004)：逐个观测值按定义计算 β²"""
+    t, n = x.shape
+    centered = x - x.mean(axis=0)
+    sample = centered.T @ centered / t
+    mu = np.trace(sample) / n
+    delta = ((sample - mu * np.eye(n)) ** 2).sum() / n
+    beta = sum(((np.outer(row, row) - sample) ** 2).sum() for row in centered) / (n * t ** 2)
+    shrinkage = min(beta, delta) / delta
+    return (1 - shrinkage) * sample + shrinkage * mu * np.eye(n), shrinkage
+
+
+def _dates(t: int, start: str = '2023-01-02') -> pd.DatetimeIndex:
+    return pd.bdate_range(start, periods=t)
+
+
+@pytest.mark.parametrize("t,n", [(60, 5), (30, 40), (252, 12)])
+def test_ledoit_wolf_matches_naive(t, n):
+    x = _returns(t, n, seed=t + n)
+    covariance, shrinkage = RollingMoments(x, _dates(t), [f"S{i}" for i in range(n)]).ledoit_wolf()
+    expected_cov, expected_shrinkage = _naive_ledoit_wolf(x)
+    assert 0 <= shrinkage <= 1
+    assert shrinkage == pytest.approx(expected_shrinkage, rel=1e-8)
+    np.testing.assert_allclose(covariance, expected_cov, rtol=1e-8, atol=1e-14)
+
+
+def test_roll_matches_rebuild_on_shifted_window():
+    window, n, extra = 80, 6, 25
+    x = _returns(window + extra, n, seed=7)
+    dates = _dates(window + extra)
+    symbols = [f"S{i}" for i in range(n)]
+    moments = RollingMoments(x[:window], dates[:window], symbols)
+    # 分两批滚动：逐日和多日
+    moments.roll(x[window:window + 1], dates[window:window + 1])
+    moments.roll(x[window + 1:], dates[window + 1:])
+    rebuilt = RollingMoments(x[-window:], dates[-window:], symbols)
+
+    np.testing.assert_array_equal(moments.returns, rebuilt.returns)
+    assert moments.dates.equals(rebuilt.dates)
+    rolled_cov, rolled_shrinkage = moments.ledoit_wolf()
+    rebuilt_cov, rebuilt_shrinkage = rebuilt.ledoit_wolf()
+    assert rolled_shrinkage == pytest.approx(rebuilt_shrinkage, rel=1e-7)
+    np.testing.assert_allclose(rolled_cov, rebuilt_cov, rtol=1e-9, atol=1e-15)
+
+
+def test_missing_returns_are_treated_as_zero():
+    x = _returns(50, 4, seed=9)
+    x[3, 1] = np.nan
+    filled = x.copy()
+    filled[3, 1] = 0.0
+    a = RollingMoments(x, _dates(50), list('ABCD')).ledoit_wolf()
+    b = RollingMoments(filled, _dates(50), list('ABCD')).ledoit_wolf()
+    np.testing.assert_array_equal(a[0], b[0])
+
+
+def test_subset_slices_in_requested_order():
+    covariance = np.arange(16, dtype=np.float64).reshape(4, 4)
+    estimate = CovarianceEstimate(list('ABCD'), covariance, 0.3, pd.Timestamp('2024-01-02'), 60,
+                                  mean=np.array([1.0, 2.0, 3.0, 4.0]))
+    subset = estimate.subset(['C', 'A'])
+    np.testing.assert_array_equal(subset.covariance, covariance[np.ix_([2, 0], [2, 0])])
+    np.testing.assert_array_equal(subset.mean, [3.0, 1.0])
+    assert subset.shrinkage == 0.3
+    with pytest.raises(KeyError):
+        estimate.subset(['A', 'Z'])
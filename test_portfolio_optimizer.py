@@ -0,0 +1,142 @@
+"""组合优化器：约束满足、投影与朴素二分法一致、最小方差不劣于可行点"""
+
+import numpy as np
+import pytest
+
+import portfolio_optimizer
+from portfolio_optimizer import (MAX_SECTOR_WEIGHT, MAX_SHARPE, MAX_SINGLE_WEIGHT, MIN_VARIANCE, OPTIMIZATION_MODES,
+                                 RISK_PARITY, STYLE_MODES, PortfolioOptimizer, _project_capped_simplex,
+                                 optimize_weights)
+
+TOL = 1e-6
+
+
+def _covariance(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    x = rng.normal(0, 0.01, (300, n)) + rng.normal(0, 0.008, (300, 1))
+    return np.cov(x, rowvar=False)
+
+
+def _naive_capped_projection(v: np.ndarray, total: float, cap: float) -> np.ndarray:
+    low, high = v.min() - cap - 1, v.max() + 1
+    for _ in range(200):
+        tau = (low + high) / 2
+        if np.clip(v - tau, 0, cap).sum() > total:
+            low = tau
+        else:
+            high = tau
+    return np.clip(v - (low + high) / 2, 0, cap)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_capped_simplex_projection_matches_bisection(seed):
+    rng = np.random.default_rng(seed)
+    v = rng.normal(0, 0.1, 25)
+    for total, cap in ((1.0, 0.07), (0.6, 0.1), (0.3, 1.0)):
+        projected = _project_capped_simplex(v, total, cap)
+        np.testing.assert_allclose(projected, _naive_capped_projection(v, total, cap), atol=1e-10)
+        assert projected.sum() == pytest.approx(total)
+
+
+@pytest.mark.parametrize("mode", OPTIMIZATION_MODES)
+def test_long_only_constraints(mode):
+    n = 30
+    covariance = _covariance(n)
+    expected = np.random.default_rng(1).normal(0.0005, 0.0005, n)
+    sectors = [f"sector{i % 5}" for i in range(n)]
+    result = optimize_weights(covariance, expected, mode, gross_exposure=0.8, sectors=sectors)
+    weights = result["weights"]
+
+    assert result["converged"]
+    assert weights.sum() == pytest.approx(0.8, abs=TOL)
+    assert weights.min() >= -TOL
+    assert weights.max() <= MAX_SINGLE_WEIGHT + TOL
+    for sector in set(sectors):
+        members = [i for i, s in enumerate(sectors) if s == sector]
+        assert weights[members].sum() <= MAX_SECTOR_WEIGHT + TOL
+
+
+def test_long_short_respects_sides_and_net_exposure():
+    n = 30
+    covariance = _covariance(n, seed=2)
+    sides = np.where(np.arange(n) < 12, -1.0, 1.0)
+    result = optimize_weights(covariance, None, MIN_VARIANCE, gross_exposure=1.0, sides=sides, net_exposure=0.2)
+    weights = result["weights"]
+
+    assert np.all(weights[sides > 0] >= -TOL)
+    assert np.all(weights[sides < 0] <= TOL)
+    assert np.abs(weights).sum() == pytest.approx(1.0, abs=TOL)
+    assert weights.sum() == pytest.approx(0.2, abs=TOL)
+    assert np.abs(weights).max() <= result["maxWeight"] + TOL
+
+
+def test_factor_exposure_limit():
+    n = 40
+    covariance = _covariance(n, seed=3)
+    exposures = np.random.default_rng(4).normal(0, 1, (n, 3))
+    free = optimize_weights(covariance, None, MIN_VARIANCE)
+    limited = optimize_weights(covariance, None, MIN_VARIANCE, factor_exposures=exposures, max_factor_exposure=0.05)
+
+    limits = np.array(limited["maxFactorExposure"])
+    assert np.all(np.abs(limited["weights"] @ exposures) <= limits + TOL)
+    assert limited["weights"].sum() == pytest.approx(1.0, abs=TOL)
+    assert limited["weights"].max() <= MAX_SINGLE_WEIGHT + TOL
+    # 约束生效前后的组合确实不同（约束不是空操作）
+    assert np.abs(free["weights"] @ exposures).max() > 0.05
+
+
+def test_min_variance_is_no_worse_than_random_feasible_points():
+    n = 25
+    covariance = _covariance(n, seed=5)
+    weights = optimize_weights(covariance, None, MIN_VARIANCE, gross_exposure=1.0)["weights"]
+    optimum = weights @ covariance @ weights
+
+    rng = np.random.default_rng(6)
+    for _ in range(200):
+        point = _project_capped_simplex(rng.random(n), 1.0, MAX_SINGLE_WEIGHT)
+        assert optimum <= point @ covariance @ point + 1e-15
+
+
+def test_risk_parity_equalizes_risk_contributions_without_binding_caps():
+    covariance = np.diag([0.0001, 0.0004, 0.0009, 0.0016])
+    weights = optimize_weights(covariance, None, RISK_PARITY, max_weight=1.0, tol=1e-12, max_iter=20000)["weights"]
+    contributions = weights * (covariance @ weights)
+    np.testing.assert_allclose(contributions / contributions.sum(), 0.25, atol=1e-4)
+
+
+def test_cap_relaxed_when_too_few_stocks():
+    result = optimize_weights(_covariance(5), None, MIN_VARIANCE, gross_exposure=1.0)
+    assert result["maxWeight"] == pytest.approx(0.2)
+    np.testing.assert_allclose(result["weights"], 0.2, atol=TOL)
+
+
+def test_warm_start_reaches_same_solution():
+    covariance = _covariance(30, seed=8)
+    expected = np.random.default_rng(9).normal(0.0005, 0.0005, 30)
+    cold = optimize_weights(covariance, expected, MAX_SHARPE, tol=1e-12, max_iter=20000)
+    warm = optimize_weights(covariance, expected, MAX_SHARPE, initial=cold["weights"], tol=1e-12, max_iter=20000)
+    np.testing.assert_allclose(warm["weights"], cold["weights"], atol=1e-6)
+    assert warm["iterations"] <= cold["iterations"]
+
+
+def test_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        optimize_weights(_covariance(5), None, 'unknown')
+
+
+def test_allocate_falls_back_to_style_mode_for_unknown_mode(monkeypatch):
+    captured = {}
+
+    def fake_optimize(covariance, expected, mode, *args, **kwargs):
+        captured["mode"] = mode
+        return {"weights": np.full(len(covariance), 1 / len(covariance)), "iterations": 1, "converged": True}
+
+    class FakeEstimate:
+        symbols = ['A', 'B']
+        mean = np.zeros(2)
+        covariance = np.eye(2) * 0.0001
+
+    monkeypatch.setattr(portfolio_optimizer.covariance_service, 'get', lambda *args, **kwargs: FakeEstimate())
+    monkeypatch.setattr(portfolio_optimizer, 'optimize_weights', fake_optimize)
+    result = PortfolioOptimizer().allocate(['A', 'B'], 'value', 1.0, mode='not_a_mode')
+    assert result["mode"] == captured["mode"] == STYLE_MODES['value']
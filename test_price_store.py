@@ -0,0 +1,119 @@
+"""本地价格库：重叠、部分（盘中K线、修订K线）和并发写入"""
+
+import multiprocessing
+import os
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_store import STORE_COLUMNS, PriceStore
+from rolling_stats import compute_state
+
+AS_OF = date(2024, 6, 28)
+
+
+def _bars(start: str, periods: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=periods)
+    close = 100 + np.arange(periods, dtype=np.float64) + rng.random(periods)
+    return pd.DataFrame({'date': dates, 'open': close - 0.5, 'high': close + 1, 'low': close - 1,
+                         'close': close, 'volume': rng.integers(1_000, 10_000, periods).astype(np.float64)})
+
+
+def _assert_store_matches(store: PriceStore, symbol: str, expected: pd.DataFrame) -> None:
+    loaded = store.load(symbol)
+    pd.testing.assert_frame_equal(loaded.reset_index(drop=True), expected[STORE_COLUMNS].reset_index(drop=True),
+                                  check_dtype=False)
+    meta = store.read_meta(symbol)
+    assert meta["rows"] == len(expected)
+    assert meta["lastDate"] == expected['date'].iloc[-1].strftime('%Y-%m-%d')
+    assert meta["stats"]["factors"] == pytest.approx(compute_state(expected['close'].to_numpy())["factors"])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path))
+
+
+def test_overlapping_appends_only_add_new_sessions(store):
+    bars = _bars('2024-01-02', 120)
+    assert store.append('AAA', bars.iloc[:80], as_of=AS_OF) == 80
+    # 与已有数据重叠的窗口：只追加新交易日
+    assert store.append('AAA', bars.iloc[50:100], as_of=AS_OF) == 20
+    # 完全重叠：不追加
+    assert store.append('AAA', bars.iloc[10:60], as_of=AS_OF) == 0
+    assert store.append('AAA', bars, as_of=AS_OF) == 20
+    _assert_store_matches(store, 'AAA', bars)
+
+
+def test_sessions_after_as_of_are_not_stored(store):
+    bars = _bars('2024-06-19', 10)  # 最后几根K线晚于 AS_OF（盘中拉取的当日K线）
+    appended = store.append('BBB', bars, as_of=AS_OF)
+    kept = bars[bars['date'] <= pd.Timestamp(AS_OF)]
+    assert appended == len(kept) < len(bars)
+    _assert_store_matches(store, 'BBB', kept)
+
+    # 收盘后再次拉取：之前被丢弃的交易日正常追加
+    assert store.append('BBB', bars, as_of=date(2024, 7, 31)) == len(bars) - len(kept)
+    _assert_store_matches(store, 'BBB', bars)
+
+
+def test_revised_last_session_is_overwritten(store):
+    bars = _bars('2024-01-02', 60)
+    store.append('CCC', bars.iloc[:40], as_of=AS_OF)
+
+    revised = bars.copy()
+    revised.loc[39, ['close', 'high']] = [500.0, 501.0]
+    # 只修订最后一根K线：覆盖但不算新追加的行
+    assert store.append('CCC', revised.iloc[:40], as_of=AS_OF) == 0
+    _assert_store_matches(store, 'CCC', revised.iloc[:40])
+    # 修订后继续追加，滚动统计以修订后的价格为准
+    assert store.append('CCC', revised, as_of=AS_OF) == 20
+    _assert_store_matches(store, 'CCC', revised)
+
+
+def test_unchanged_reappend_does_not_rewrite_data(store):
+    bars = _bars('2024-01-02', 30)
+    store.append('DDD', bars, as_of=AS_OF)
+    mtime = os.stat(store._data_path('DDD')).st_mtime_ns
+    assert store.append('DDD', bars.iloc[-5:], as_of=AS_OF) == 0
+    assert os.stat(store._data_path('DDD')).st_mtime_ns == mtime
+
+
+def test_concurrent_thread_appends(store):
+    bars = _bars('2023-01-02', 150, seed=1)
+    # 上游每次返回截至当时的完整历史：多个线程同时写入互相重叠的增长窗口
+    windows = [bars.iloc[:end] for end in range(30, 151, 15)]
+    threads = [threading.Thread(target=lambda frames=windows[offset::3]: [
+        store.append('EEE', frame, as_of=AS_OF) for frame in frames]) for offset in (0, 1, 2, 0, 1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    _assert_store_matches(store, 'EEE', bars)
+
+
+def _append_in_process(root_dir: str, frames) -> None:
+    local = PriceStore(root_dir)
+    for frame in frames:
+        local.append('FFF', frame, as_of=AS_OF)
+
+
+def test_concurrent_process_appends(tmp_path):
+    bars = _bars('2024-01-02', 120, seed=2)
+    # 每个进程按顺序写入互相重叠的增长窗口，最终应得到完整数据
+    windows = [bars.iloc[:end] for end in range(20, 121, 10)]
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    processes = [context.Process(target=_append_in_process, args=(str(tmp_path), windows[offset::2]))
+                 for offset in (0, 1, 0, 1)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    store = PriceStore(str(tmp_path))
+    _assert_store_matches(store, 'FFF', bars)
+    assert not [name for name in tmp_path.iterdir() if name.suffix == '.tmp']
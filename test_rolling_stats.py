@@ -0,0 +1,67 @@
+"""滚动统计：增量更新与从头计算、numpy 朴素实现一致"""
+
+import numpy as np
+import pytest
+
+from rolling_stats import (MOMENTUM_LAGS, MOVING_AVERAGE_WINDOWS, REBASE_EVERY, TRADING_DAYS_PER_YEAR, VOL_WINDOW,
+                           compute_state, update_state)
+
+
+def _closes(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100 * np.cumprod(1 + rng.normal(0.0005, 0.02, n))
+
+
+def _naive_factors(closes: np.ndarray) -> dict:
+    returns = np.diff(closes[-(VOL_WINDOW + 1):]) / closes[-(VOL_WINDOW + 1):-1]
+    factors = {
+        "close": closes[-1],
+        "volatility": np.std(returns, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100 if len(returns) > 1 else 0.0
+    }
+    for name, lag in MOMENTUM_LAGS.items():
+        factors[name] = (closes[-1] / closes[-1 - lag] - 1) * 100 if len(closes) > lag else 0.0
+    for window in MOVING_AVERAGE_WINDOWS:
+        factors[f"ma{window}"] = closes[-window:].mean()
+    return factors
+
+
+@pytest.mark.parametrize("n", [2, 30, VOL_WINDOW, VOL_WINDOW + 1, 600])
+def test_compute_state_matches_numpy(n):
+    closes = _closes(n)
+    factors = compute_state(closes)["factors"]
+    for name, expected in _naive_factors(closes).items():
+        assert factors[name] == pytest.approx(expected, rel=1e-9, abs=1e-12), name
+
+
+def test_update_state_matches_recompute_when_window_fills_and_slides():
+    # 从窗口未满开始逐日追加，跨过窗口填满和滑动两个阶段（不触发重算）
+    closes = _closes(VOL_WINDOW + 100, seed=1)
+    state = compute_state(closes[:50])
+    for end in range(51, len(closes) + 1):
+        state = update_state(state, closes[:end])
+        assert state["rows"] == end
+        expected = _naive_factors(closes[:end])
+        for name, value in expected.items():
+            assert state["factors"][name] == pytest.approx(value, rel=1e-8, abs=1e-10), (end, name)
+    assert 0 < state["updates"] < REBASE_EVERY
+
+
+def test_update_state_batch_append_and_rebase():
+    closes = _closes(900, seed=2)
+    state = compute_state(closes[:400])
+    # 一次追加多行
+    state = update_state(state, closes[:460])
+    assert state["updates"] == 60
+    assert state["returns"]["n"] == VOL_WINDOW
+    assert state["returns"]["m2"] == pytest.approx(compute_state(closes[:460])["returns"]["m2"], rel=1e-9)
+    # 累计更新次数达到 REBASE_EVERY 时从头重算
+    state = update_state(state, closes[:460 + REBASE_EVERY])
+    assert state["updates"] == 0
+    assert state == compute_state(closes[:460 + REBASE_EVERY])
+
+
+def test_update_state_recomputes_on_missing_or_stale_state():
+    closes = _closes(300, seed=3)
+    assert update_state(None, closes) == compute_state(closes)
+    # 状态行数比数组还多（价格库被重建）时不能增量更新
+    assert update_state(compute_state(closes), closes[:200]) == compute_state(closes[:200])
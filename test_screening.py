@@ -0,0 +1,101 @@
+"""机构级筛选：向量化掩码与逐只股票判断的朴素实现一致"""
+
+import numpy as np
+import pytest
+
+from screening import FACTOR_COLUMNS, MIN_ADV, MIN_HISTORY_DAYS, MIN_MARKET_CAP, STYLE_SCREENS, FactorTable
+
+
+def _table(n: int = 200, seed: int = 0, missing: float = 0.1) -> FactorTable:
+    rng = np.random.default_rng(seed)
+    columns = {
+        'price': rng.uniform(5, 500, n),
+        'marketCap': rng.lognormal(np.log(5e9), 1.2, n),
+        'adv': rng.lognormal(np.log(5e7), 1.2, n),
+        'momentum1M': rng.normal(1, 5, n),
+        'momentum12M': rng.normal(10, 20, n),
+        'excess12M': rng.normal(0, 20, n),
+        'volatility': rng.uniform(10, 60, n),
+        'history': rng.integers(50, 2000, n).astype(np.float64)
+    }
+    for name in ('marketCap', 'adv', 'momentum1M', 'excess12M', 'history'):
+        columns[name][rng.random(n) < missing] = np.nan
+    return FactorTable([f"S{i:03d}" for i in range(n)], columns, '2024-06-28')
+
+
+def _naive_screen(table: FactorTable, style: str, limit: int, universe=None):
+    """逐只股票判断：缺失的因子不参与对应条件，排序因子缺失的排在最后"""
+    config = STYLE_SCREENS[style]
+    col = {name: table.columns[name] for name in FACTOR_COLUMNS}
+    passed = []
+    for i, symbol in enumerate(table.symbols):
+        if universe is not None and symbol not in universe:
+            continue
+        ok = True
+        for name, minimum in (('marketCap', MIN_MARKET_CAP), ('adv', MIN_ADV), ('history', MIN_HISTORY_DAYS)):
+            if not np.isnan(col[name][i]) and col[name][i] < minimum:
+                ok = False
+        if ok:
+            passed.append(i)
+
+    if config["momentumFilter"]:
+        eligible = [i for i in passed if not np.isnan(col['excess12M'][i])]
+        median = np.median([col['excess12M'][i] for i in eligible])
+        passed = [i for i in passed
+                  if (np.isnan(col['excess12M'][i]) or col['excess12M'][i] >= median)
+                  and (np.isnan(col['momentum1M'][i]) or col['momentum1M'][i] > 0)]
+
+    column, ascending = config["rank"]
+
+    def sort_key(i):
+        value = col[column][i]
+        return (np.isnan(value), value if ascending else -value, i)
+
+    ranked = sorted(passed, key=sort_key)
+    return [table.symbols[i] for i in ranked[:limit]], len(passed)
+
+
+@pytest.mark.parametrize("style", list(STYLE_SCREENS))
+def test_screen_matches_naive_loop(style):
+    table = _table(seed=1)
+    result = table.screen(style, limit=10)
+    expected, passed = _naive_screen(table, style, 10)
+    assert result["symbols"] == expected
+    assert result["passed"] == passed
+    assert result["universe"] == len(table)
+    assert result["skippedFilters"] == []
+
+
+def test_screen_within_symbol_list_universe():
+    table = _table(seed=2)
+    universe = [f"S{i:03d}" for i in range(0, 200, 3)] + ['NOT_IN_TABLE']
+    result = table.screen('growth', limit=8, universe=universe)
+    expected, passed = _naive_screen(table, 'growth', 8, set(universe))
+    assert result["symbols"] == expected
+    assert result["universe"] == 67
+    assert result["passed"] == passed
+    # 同一候选全集（顺序不同）命中缓存
+    assert table.screen('growth', limit=8, universe=list(reversed(universe))) is result
+
+
+def test_missing_factors_are_exempt_and_reported():
+    table = _table(n=6, missing=0.0)
+    table.columns['marketCap'][:] = [1e8, np.nan, 5e9, 5e9, 5e9, 5e9]
+    table.columns['history'][:] = 1000
+    table.columns['adv'][:] = 1e8
+    result = table.screen('contrarian', limit=6)
+    assert 'S000' not in result["symbols"]
+    assert 'S001' in result["symbols"]
+    assert result["missingFactors"]["marketCap"] == 1
+    assert result["passed"] == 5
+
+
+def test_all_missing_column_skips_filter_and_falls_back_rank():
+    table = _table(seed=3)
+    table.columns['marketCap'][:] = np.nan
+    result = table.screen('value', limit=5)
+    assert 'marketCap' in result["skippedFilters"]
+    assert 'rank:marketCap' in result["skippedFilters"]
+    candidates = [table.symbols.tolist().index(s) for s in result["symbols"]]
+    adv = table.columns['adv'][candidates]
+    assert np.all(np.diff(adv) <= 0)